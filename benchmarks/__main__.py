@@ -0,0 +1,64 @@
+"""
+Benchmarks of docopt-parser
+Run from the root of the repository. Writes the results as JSON, timings are in seconds.
+
+Usage:
+  benchmarks [options] [BENCHMARK...]
+  benchmarks --list
+
+Options:
+  --repeat=N       Runs per benchmark and doc [default: 20]
+  --slow-repeat=N  Runs of benchmarks that start a process [default: 3]
+  --generated=N    Number of help texts generated from tests/lang.py [default: 100]
+  --seed=N         Seed of the generated help texts [default: 0]
+  --output=FILE    Write the results to FILE instead of stdout
+  --list           List the benchmarks
+  BENCHMARK        Only run the benchmarks whose name starts with BENCHMARK
+"""
+import json
+import logging
+import sys
+import typing as T
+import docopt
+
+from benchmarks import corpus, suite
+
+Params = T.TypedDict('Params', {
+  '--repeat': str, '--slow-repeat': str, '--generated': str, '--seed': str, '--output': T.Optional[str],
+  '--list': bool, 'BENCHMARK': T.List[str]
+})
+
+
+def main():
+  params = T.cast(Params, docopt.docopt(__doc__))
+  if params['--list']:
+    sys.stdout.write(''.join(f'{benchmark.name}\n' for benchmark in suite.benchmarks))
+    return
+  try:
+    repeat, slow_repeat, generated, seed = (
+      int(params[name]) for name in ('--repeat', '--slow-repeat', '--generated', '--seed')  # type: ignore
+    )
+  except ValueError as e:
+    sys.stderr.write(f'{e}\n')
+    sys.exit(2)
+  # Warnings about the help texts are not what is being measured
+  log = logging.getLogger('docopt_parser')
+  log.addHandler(logging.NullHandler())
+  log.propagate = False
+  docs = corpus.fixed_corpus() + corpus.generated_corpus(generated, seed)
+
+  def progress(result: T.Dict[str, T.Any]):
+    timing = result['error'] if 'error' in result else f'{result["median"] * 1000:.3f}ms'
+    sys.stderr.write(f'{result["benchmark"]:<24} {result["doc"]:<20} {timing}\n')
+  results = suite.run(docs, repeat, slow_repeat, params['BENCHMARK'], progress)
+  results['meta'].update({'generated': generated, 'seed': seed})
+  if params['--output']:
+    with open(params['--output'], 'w') as h:
+      json.dump(results, h, indent=2)
+  else:
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,53 @@
+import os
+import typing as T
+
+corpus_dir = os.path.join(os.path.dirname(__file__), 'corpus')
+# Generated docs are grouped by their length, the size tiers are (name, maximum length)
+tiers = [('small', 100), ('medium', 300), ('large', None)]
+
+
+class Doc(T.NamedTuple):
+  # One or more help texts that are benchmarked together. Generated docs are benchmarked per tier,
+  # a single doc of the generator is too small to be timed on its own
+  name: str
+  tier: str
+  texts: T.List[str]
+
+
+def fixed_corpus() -> T.List[Doc]:
+  # Help texts shaped like the ones of real world programs
+  docs: T.List[Doc] = []
+  for filename in sorted(os.listdir(corpus_dir)):
+    if filename.endswith('.txt'):
+      with open(os.path.join(corpus_dir, filename)) as h:
+        docs.append(Doc(filename[:-len('.txt')], 'corpus', [h.read()]))
+  return docs
+
+
+def generated_texts(count: int, seed: int) -> T.List[str]:
+  # The same texts for the same count, seed and version of hypothesis
+  from hypothesis import HealthCheck, Phase, given, settings, seed as use_seed
+  from tests.lang import DocoptAst
+  texts: T.List[str] = []
+
+  @use_seed(seed)
+  @settings(
+    max_examples=count, database=None, phases=[Phase.generate], suppress_health_check=list(HealthCheck), deadline=None
+  )
+  @given(DocoptAst.asts)
+  def collect(ast: DocoptAst):
+    texts.append(str(ast))
+  collect()
+  return texts
+
+
+def generated_corpus(count: int, seed: int) -> T.List[Doc]:
+  texts = generated_texts(count, seed)
+  docs: T.List[Doc] = []
+  smaller = 0
+  for tier, maximum in tiers:
+    in_tier = [text for text in texts if smaller < len(text) and (maximum is None or len(text) <= maximum)]
+    if in_tier:
+      docs.append(Doc(f'generated-{tier}', tier, in_tier))
+    smaller = maximum or 0
+  return docs
@@ -0,0 +1,136 @@
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import typing as T
+
+from benchmarks.corpus import Doc
+from docopt_parser import base, dumps_binary, get_prog, leaves, loads_binary, parse, usage
+from docopt_parser.util import marks, post_processors
+from docopt_parser.util.version import package_version
+
+Setup = T.Callable[[str], T.Any]
+Run = T.Callable[[T.Any], T.Any]
+
+
+class Benchmark(T.NamedTuple):
+  name: str
+  # Prepares the input of run() for one text, the time it takes is not measured
+  setup: Setup
+  run: Run
+  # Benchmarks that start a process run fewer times and only on the fixed corpus
+  slow: bool = False
+
+
+def parse_raw(text: str) -> T.Tuple[base.Group, T.List[leaves.Option], marks.SourceText]:
+  # What docopt_parser.parse() hands to the post-processors
+  source = marks.SourceText(text)
+  options = leaves.documented_options.parse_strict(source)  # type: ignore
+  documented_options = list(options)
+  root = usage.usage(options).parse_strict(source)  # type: ignore
+  options.release_parsers()
+  return root, documented_options, source
+
+
+def parsed(text: str) -> base.Node:
+  # A fresh AST for post-processors that change it, decoding is a lot faster than parsing
+  return loads_binary(dumps_binary(parse(text)))
+
+
+def parse_docopt(text: str):
+  # What docopt 0.6.2 does with the help text before it looks at argv
+  import docopt
+  options = docopt.parse_defaults(text)
+  return docopt.parse_pattern(docopt.formal_usage(docopt.printable_usage(text)), options)
+
+
+def run_cli(text: str):
+  subprocess.run(
+    [sys.executable, '-m', 'docopt_parser', 'ast', '--jsonl'], input=text, text=True, check=True,
+    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+  )
+
+
+def same(text: str) -> str:
+  return text
+
+
+benchmarks = [
+  Benchmark('parse[combinator]', same, lambda text: parse(text, 'combinator')),
+  Benchmark('parse[fast]', same, lambda text: parse(text, 'fast')),
+  Benchmark('parse[packrat]', same, lambda text: parse(text, packrat=True)),
+  Benchmark('get_prog', same, get_prog),
+  Benchmark('post_process_ast', parse_raw, lambda raw: post_processors.post_process_ast(*raw)),
+  # The phases of post_process_ast() that work on the AST as the usage parser returns it
+  Benchmark('populate_shortcuts', parse_raw, lambda raw: post_processors.populate_shortcuts(*raw)),
+  Benchmark(
+    'convert_root_to_optional_on_empty_lines', parse_raw,
+    lambda raw: post_processors.convert_root_to_optional_on_empty_lines(raw[0])
+  ),
+  Benchmark('mark_multiple', parsed, post_processors.mark_multiple),
+  Benchmark('merge_identical_leaves', parsed, post_processors.merge_identical_leaves),
+  Benchmark('merge_identical_groups', parsed, post_processors.merge_identical_groups),
+  Benchmark('collapse_groups', parsed, post_processors.collapse_groups),
+  Benchmark('cli', same, run_cli, slow=True),
+  # The docopt the CLI is built with, for comparison
+  Benchmark('docopt.parse_pattern', same, parse_docopt),
+]
+
+
+def measure(benchmark: Benchmark, doc: Doc, repeat: int) -> T.Dict[str, T.Any]:
+  # Every run processes all texts of the doc, only the time spent in benchmark.run() counts.
+  # Texts the benchmark fails on are left out and counted in "failed"
+  result: T.Dict[str, T.Any] = {'benchmark': benchmark.name, 'doc': doc.name, 'tier': doc.tier}
+  texts: T.List[str] = []
+  errors: T.List[str] = []
+  for text in doc.texts:
+    try:
+      benchmark.run(benchmark.setup(text))
+      texts.append(text)
+    except Exception as e:
+      errors.append(f'{type(e).__name__}: {e}')
+  result.update({'texts': len(texts), 'size': sum(map(len, texts)), 'failed': len(errors)})
+  if not texts:
+    return {**result, 'error': errors[0]}
+  times: T.List[float] = []
+  for _ in range(repeat):
+    elapsed = 0.0
+    for text in texts:
+      arg = benchmark.setup(text)
+      start = time.perf_counter()
+      benchmark.run(arg)
+      elapsed += time.perf_counter() - start
+    times.append(elapsed)
+  return {
+    **result, 'runs': len(times), 'min': min(times), 'median': statistics.median(times),
+    'mean': statistics.fmean(times), 'max': max(times),
+  }
+
+
+def run(
+  docs: T.List[Doc], repeat: int, slow_repeat: int, names: "T.List[str] | None" = None,
+  progress: "T.Callable[[T.Dict[str, T.Any]], None] | None" = None
+) -> T.Dict[str, T.Any]:
+  selected = [b for b in benchmarks if not names or any(b.name.startswith(name) for name in names)]
+  results: T.List[T.Dict[str, T.Any]] = []
+  for benchmark in selected:
+    for doc in docs:
+      if benchmark.slow and doc.tier != 'corpus':
+        continue
+      result = measure(benchmark, doc, slow_repeat if benchmark.slow else repeat)
+      results.append(result)
+      if progress is not None:
+        progress(result)
+  return {
+    'meta': {
+      'docopt_parser': package_version(),
+      'python': platform.python_version(),
+      'implementation': platform.python_implementation(),
+      'platform': platform.platform(),
+      'repeat': repeat,
+      'slow_repeat': slow_repeat,
+      'unit': 'seconds',
+    },
+    'results': results,
+  }
@@ -1,17 +1,60 @@
 """
 docopt-parser - A parsing library for the docopt helptext
 """
-import re
+import importlib
+import typing as T
+
+if T.TYPE_CHECKING:
+  from docopt_parser.base import Group, Leaf, Node
+  from docopt_parser.groups import Choice, Optional, Repeatable, Sequence
+  from docopt_parser.leaves import Argument, ArgumentSeparator, Command, OptionsShortcut, Option
+  from docopt_parser.session import ParseSession
+  from docopt_parser.util import (
+    DocoptError, DocoptParseError, LineNumber, Location, LocInfo, Marked, MarkedTuple, Range, RangeTuple
+  )
+  from docopt_parser.util.cache import CacheInfo, ParseCache
+  from docopt_parser.util.stats import ParseStats
+  from docopt_parser.util.profile import ParserProfile
+  from docopt_parser.util.serialize import dump_json, dumps_json, dumps_binary, loads_binary
+  from docopt_parser.util.post_processors import merge_identical_leaves, merge_identical_groups, collapse_groups
+
+# The exports are imported on first use (see __getattr__), importing docopt_parser does not import or build
+# the parsers, the caches or the serializers
+lazy_exports = {
+  **dict.fromkeys(['Group', 'Leaf', 'Node'], 'docopt_parser.base'),
+  **dict.fromkeys(['Choice', 'Optional', 'Repeatable', 'Sequence'], 'docopt_parser.groups'),
+  **dict.fromkeys(['Argument', 'ArgumentSeparator', 'Command', 'OptionsShortcut', 'Option'], 'docopt_parser.leaves'),
+  'ParseSession': 'docopt_parser.session',
+  **dict.fromkeys([
+    'DocoptError', 'DocoptParseError', 'LineNumber', 'Location', 'LocInfo', 'Marked', 'MarkedTuple', 'Range',
+    'RangeTuple'
+  ], 'docopt_parser.util'),
+  **dict.fromkeys(['CacheInfo', 'ParseCache'], 'docopt_parser.util.cache'),
+  'ParseStats': 'docopt_parser.util.stats',
+  'ParserProfile': 'docopt_parser.util.profile',
+  **dict.fromkeys(['dump_json', 'dumps_json', 'dumps_binary', 'loads_binary'], 'docopt_parser.util.serialize'),
+  **dict.fromkeys(
+    ['merge_identical_leaves', 'merge_identical_groups', 'collapse_groups'], 'docopt_parser.util.post_processors'
+  ),
+}
+
+
+def __getattr__(name: str) -> T.Any:
+  module = lazy_exports.get(name)
+  if module is None:
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+  value = getattr(importlib.import_module(module), name)
+  globals()[name] = value
+  return value
+
+
+def __dir__() -> T.List[str]:
+  return sorted({*globals(), *lazy_exports})
 
-from docopt_parser.base import Group, Leaf, Node
-from docopt_parser.groups import Choice, Optional, Repeatable, Sequence
-from docopt_parser.leaves import Argument, ArgumentSeparator, Command, OptionsShortcut, Option
-from docopt_parser.util import DocoptError, DocoptParseError, \
-  LineNumber, Location, LocInfo, Marked, MarkedTuple, Range, RangeTuple
-from docopt_parser.util.post_processors import merge_identical_leaves, merge_identical_groups, collapse_groups
 
 __all__ = [
-  'parse', 'get_prog', 'DocoptError', 'DocoptParseError',
+  'parse', 'get_prog', 'dump_json', 'dumps_json', 'dumps_binary', 'loads_binary', 'DocoptError', 'DocoptParseError',
+  'CacheInfo', 'ParseCache', 'ParseSession', 'ParseStats', 'ParserProfile',
   'Group', 'Leaf', 'Node',
   'Choice', 'Optional', 'Repeatable', 'Sequence',
   'Argument', 'ArgumentSeparator', 'Command', 'OptionsShortcut', 'Option',
@@ -20,32 +63,84 @@ __all__ = [
 ]
 
 
-def parse(text: str) -> Node:
+def parse(
+  text: str, engine: T.Literal['combinator', 'fast'] = 'combinator', cache: "ParseCache | None" = None,
+  positions: bool = True, stats: "ParseStats | None" = None, packrat: bool = False
+) -> "Node":
+  import logging
+  import re
   import parsec as P
-  from docopt_parser import usage, leaves
-  from docopt_parser.util import post_processors, errors, marks
+  from docopt_parser import leaves
+  from docopt_parser.util import post_processors, errors, marks, parsers
+  from docopt_parser.util.stats import run_phase
+  if engine not in ('combinator', 'fast'):
+    raise ValueError(f'Unknown parsing engine "{engine}"')
+  if stats is not None:
+    stats.engine = engine
+  recorder: "RecordingHandler | None" = None
+  if cache is not None:
+    from docopt_parser.util.cache import RecordingHandler, replay
+    entry = cache.get(text, positions)
+    if entry is not None:
+      if stats is not None:
+        stats.cached = True
+      # A hit warns about the same things as the parse that filled the cache
+      replay(entry.records)
+      return entry.root
+    recorder = RecordingHandler()
+    logging.getLogger(__name__).addHandler(recorder)
+  # Without stats the phases are called directly, timing them is not free
+  phase = stats.phase if stats is not None else run_phase
+  # Nodes are marked with offsets into the text, see marks.SourceText
+  text = marks.SourceText.wrap(text, positions)
+  if packrat:
+    # Repeated attempts of the memoized rules at the same index are looked up, see parsers.memo()
+    text.packrat = parsers.Packrat()
   try:
-    options = leaves.documented_options.parse_strict(text)  # type: ignore
-    documented_options = options.copy()
-    root = usage.usage(options).parse_strict(text)  # type: ignore
-    root = post_processors.post_process_ast(root, documented_options, text)
+    if engine == 'fast':
+      from docopt_parser import fast
+      # Falls back to the combinator engine for anything it does not handle, including all syntax errors
+      options = phase('documented_options', fast.documented_options, text)
+      documented_options = options.copy()
+      root = phase('usage', fast.usage, text, options)
+    else:
+      from docopt_parser import usage
+      options = phase('documented_options', leaves.documented_options.parse_strict, text)  # type: ignore
+      documented_options = options.copy()
+      root = phase('usage', lambda: usage.usage(options).parse_strict(text))  # type: ignore
+    options.release_parsers()
+    root = post_processors.post_process_ast(root, documented_options, text, stats)
+    if cache is not None:
+      cache.put(text, root, positions, recorder.records if recorder is not None else ())
     return root
   except errors.DocoptParseError as e:
+    if isinstance(e.mark, marks.Range) and not positions:
+      # Errors are the exception, parse again to find out where it happened
+      parse(str(text), engine)
     if e.mark is not None:
       raise errors.DocoptError(e.mark.show(text, e.message), e.exit_code) from e
     else:
       raise errors.DocoptError(e.message, e.exit_code) from e
   except P.ParseError as e:
-    (line, col) = e.loc_info(e.text, e.index)  # type: ignore
+    (line, col) = text.loc_info(e.index)  # type: ignore
     loc = marks.Location((line, col))
     err = re.sub(f'{line}:{col}$', str(loc), str(e))
     raise errors.DocoptError(loc.show(text, err)) from e
+  finally:
+    if recorder is not None:
+      logging.getLogger(__name__).removeHandler(recorder)
+    if text.packrat is not None:
+      if stats is not None:
+        stats.packrat = text.packrat.rates()
+      text.packrat = None
 
 
-def get_prog(text: str) -> Marked[str]:
+def get_prog(text: str) -> "Marked[str]":
+  import re
   import parsec as P
   from docopt_parser import usage
   from docopt_parser.util import errors, marks
+  text = marks.SourceText.wrap(text)
   try:
     return usage.prog_in_usage.parse_strict(text)  # type: ignore
   except errors.DocoptParseError as e:
@@ -54,7 +149,7 @@ def get_prog(text: str) -> Marked[str]:
     else:
       raise errors.DocoptError(e.message, e.exit_code) from e
   except P.ParseError as e:
-    (line, col) = e.loc_info(e.text, e.index)  # type: ignore
+    (line, col) = text.loc_info(e.index)  # type: ignore
     loc = marks.Location((line, col))
     err = re.sub(f'{line}:{col}$', str(loc), str(e))
     raise errors.DocoptError(loc.show(text, err)) from e
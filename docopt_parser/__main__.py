@@ -3,45 +3,227 @@ import logging
 import os
 import sys
 import typing as T
-import docopt
-import termcolor
-import yaml
-import importlib.metadata
 
-from docopt_parser import DocoptError, parse, __doc__ as pkg_doc, \
-  __name__ as root_name
-from docopt_parser.util.post_processors import collapse_groups, \
-  merge_identical_groups, merge_identical_leaves
+from docopt_parser import DocoptError, __doc__ as pkg_doc, __name__ as root_name
+from docopt_parser.util.pipeline import cached_parse_ast, dump_yaml, parse_ast
 
+if T.TYPE_CHECKING:
+  from docopt_parser import Node
+  from docopt_parser.util.cache import DiskCache
+  from docopt_parser.util.stats import ParseStats
+
+# docopt, termcolor, yaml, the cache and the post-processors are imported when they are used,
+# most invocations need only some of them
 log = logging.getLogger(root_name)
 
 __doc__: str = pkg_doc + """
 Usage:
-  docopt-parser [-y] ast
+  docopt-parser [-y | --json | --jsonl] [--stats] [--packrat] [--profile] [--speedscope=FILE]
+                [--cache-dir=DIR] [--cache-size=BYTES] [--workers=N] ast [FILE...]
+  docopt-parser [--cache-dir=DIR] [--cache-size=BYTES] serve [--socket=PATH] [--workers=N] [--max-pending=N]
   docopt-parser -h
   docopt-parser --version
 
 Options:
-  -y --yaml  Output the AST in YAML format
-  --help -h  Show this help screen
-  --version  Show the docopt-parser version
+  -y --yaml           Output the AST in YAML format
+  --json              Output the AST in JSON format
+  --jsonl             Output the AST as JSON on a single line
+  --stats             Write the time spent in each phase of the parse and the size of the AST to stderr.
+                      With FILE they are added to the JSON lines as "parse_stats"
+  --packrat           Memoize the rules the parser tries repeatedly at the same position, see --stats for hit rates
+  --profile           Write the calls, failures, backtracked characters and time of each named parser to stderr.
+                      Not available with FILE
+  --speedscope=FILE   Write a profile of the named parsers to FILE, open it with https://www.speedscope.app
+  FILE                Parse the files and write one JSON line per file instead of parsing stdin.
+                      @FILE reads the paths to parse from FILE, one per line
+  --cache-dir=DIR     Cache parsed ASTs in DIR, defaults to $DOCOPT_PARSER_CACHE_DIR
+  --cache-size=BYTES  Maximum size of the cache directory [default: 67108864]
+  --socket=PATH       Listen on a Unix socket instead of reading requests from stdin
+  --workers=N         Number of worker processes, defaults to the number of CPUs
+  --max-pending=N     Maximum number of requests being processed at a time [default: 64]
+  --help -h           Show this help screen
+  --version           Show the docopt-parser version
 """
-Params = T.TypedDict('Params', {'--yaml': bool, 'ast': bool})
+Params = T.TypedDict('Params', {
+  '--yaml': bool, '--json': bool, '--jsonl': bool, '--stats': bool, '--packrat': bool, '--profile': bool,
+  '--speedscope': T.Optional[str], '--cache-dir': T.Optional[str], '--cache-size': str, 'ast': bool,
+  'FILE': T.List[str], 'serve': bool, '--socket': T.Optional[str], '--workers': T.Optional[str], '--max-pending': str
+})
+
+def profiled_parse_ast(
+  text: str, stats: "ParseStats | None", packrat: bool, table: bool, speedscope: "str | None"
+) -> "Node":
+  # The cache is not used, there would be nothing to profile on a hit
+  import json
+  from docopt_parser.util.profile import ParserProfile
+  profile = ParserProfile()
+  try:
+    with profile:
+      return parse_ast(text, stats, packrat)
+  finally:
+    if table:
+      sys.stderr.write(profile.table())
+    if speedscope:
+      try:
+        with open(speedscope, 'w') as h:
+          json.dump(profile.speedscope(), h)
+      except OSError as e:
+        raise DocoptError(f'Unable to write {speedscope}: {e.strerror}', 2)
+
+def int_param(params: Params, name: str, minimum: int = 0) -> int:
+  try:
+    value = int(T.cast(str, params[name]))  # type: ignore
+    if value < minimum:
+      raise ValueError()
+    return value
+  except ValueError:
+    raise DocoptError(f'Invalid value for {name} "{params[name]}"', 2)  # type: ignore
+
+def open_cache(cache_dir: str, cache_size: int) -> "DiskCache":
+  from docopt_parser.util.cache import DiskCache
+  try:
+    return DiskCache(cache_dir, cache_size)
+  except ValueError as e:
+    raise DocoptError(str(e), 2)
 
 def docopt_parser(params: Params):
   try:
+    cache_dir = params['--cache-dir'] or os.environ.get('DOCOPT_PARSER_CACHE_DIR')
+    cache_size = int_param(params, '--cache-size', 1)
+    if params['serve']:
+      serve(params, cache_dir, cache_size)
+      return
+    if params['FILE']:
+      if params['--profile'] or params['--speedscope']:
+        raise DocoptError('--profile and --speedscope are not available with FILE', 2)
+      sys.exit(batch(params, cache_dir, cache_size))
     text = sys.stdin.read()
-    ast = parse(text)
-    ast = merge_identical_leaves(ast, ignore_option_args=True)
-    ast = merge_identical_groups(ast)
-    ast = collapse_groups(ast)
+    stats: "ParseStats | None" = None
+    if params['--stats']:
+      from docopt_parser.util.stats import ParseStats
+      stats = ParseStats()
+    if params['--profile'] or params['--speedscope']:
+      ast = profiled_parse_ast(text, stats, params['--packrat'], params['--profile'], params['--speedscope'])
+    elif cache_dir:
+      cache = open_cache(cache_dir, cache_size)
+      ast = cached_parse_ast(text, cache, stats, params['--packrat'])
+    else:
+      ast = parse_ast(text, stats, params['--packrat'])
+    if stats is not None:
+      sys.stderr.write(repr(stats) + '\n')
     if params['ast']:
-      sys.stdout.write(
-        yaml.dump(ast.dict, sort_keys=False) if params['--yaml'] else repr(ast) + '\n')
+      if params['--yaml']:
+        sys.stdout.write(dump_yaml(ast))
+      elif params['--json'] or params['--jsonl']:
+        from docopt_parser.util.serialize import dump_json
+        dump_json(ast, sys.stdout, indent=2 if params['--json'] else None)
+        sys.stdout.write('\n')
+      else:
+        sys.stdout.write(repr(ast) + '\n')
   except DocoptError as err:
     log.error(str(err))
     sys.exit(err.exit_code)
 
+def batch(params: Params, cache_dir: "str | None", cache_size: int) -> int:
+  # Parses every file once per distinct content, the results are written in the order of the files
+  import concurrent.futures
+  import hashlib
+  import json
+  from docopt_parser.server import Response, handle_request, handle_requests, init_worker, internal_error
+  paths: T.List[str] = []
+  for arg in params['FILE']:
+    if arg.startswith('@'):
+      try:
+        with open(arg[1:]) as listfile:
+          paths.extend(line.strip() for line in listfile if line.strip())
+      except OSError as e:
+        raise DocoptError(f'Unable to read {arg[1:]}: {e.strerror}', 2)
+    else:
+      paths.append(arg)
+  format = 'yaml' if params['--yaml'] else 'dict'
+  requests: T.Dict[str, T.Dict[str, T.Any]] = {}
+  # The key of the request of each file, or the response if it could not be read
+  files: T.List[T.Tuple[str, "str | Response"]] = []
+  for path in paths:
+    try:
+      if path == '-':
+        text = sys.stdin.read()
+      else:
+        with open(path) as h:
+          text = h.read()
+    except OSError as e:
+      files.append((path, {'error': f'Unable to read {path}: {e.strerror}', 'exit_code': 2}))
+      continue
+    except UnicodeDecodeError as e:
+      files.append((path, {'error': f'Unable to read {path}: {e}', 'exit_code': 2}))
+      continue
+    key = hashlib.sha256(text.encode()).hexdigest()
+    requests.setdefault(key, {
+      'text': text, 'format': format, 'parse_stats': params['--stats'], 'packrat': params['--packrat']
+    })
+    files.append((path, key))
+
+  workers = int_param(params, '--workers', 1) if params['--workers'] else (os.cpu_count() or 1)
+  workers = min(workers, len(requests))
+  if cache_dir:
+    open_cache(cache_dir, cache_size)
+  pool: "concurrent.futures.ProcessPoolExecutor | None" = None
+  if workers > 1:
+    pool = concurrent.futures.ProcessPoolExecutor(workers, initializer=init_worker, initargs=(cache_dir, cache_size))
+    chunksize = max(1, len(requests) // (workers * 4))
+    values = list(requests.values())
+    chunks = [values[i:i + chunksize] for i in range(0, len(values), chunksize)]
+    futures = [pool.submit(handle_requests, chunk) for chunk in chunks]
+
+    def chunk_results() -> T.Iterator[Response]:
+      for chunk, future in zip(chunks, futures):
+        try:
+          yield from future.result()
+        except Exception as e:
+          # e.g. a worker died, the files of the chunk fail but the others are still written
+          error = {'error': f'Unable to parse: {type(e).__name__}: {e}', 'exit_code': internal_error}
+          yield from (dict(error) for _ in chunk)
+    results = chunk_results()
+  else:
+    init_worker(cache_dir, cache_size)
+    results = map(handle_request, requests.values())
+  responses: T.Dict[str, T.Dict[str, T.Any]] = {}
+  keys = iter(requests.keys())
+  exit_code = 0
+  try:
+    for path, key in files:
+      if isinstance(key, dict):
+        response = key
+      else:
+        while key not in responses:
+          responses[next(keys)] = next(results)
+        response = responses[key]
+      exit_code = max(exit_code, response.get('exit_code', 0))
+      sys.stdout.write(json.dumps({'file': path, **response}) + '\n')
+      sys.stdout.flush()
+  finally:
+    if pool is not None:
+      pool.shutdown(cancel_futures=True)
+  return exit_code
+
+def serve(params: Params, cache_dir: "str | None", cache_size: int):
+  import asyncio
+  from docopt_parser.server import Server
+  workers = int_param(params, '--workers', 1) if params['--workers'] else (os.cpu_count() or 1)
+  if cache_dir:
+    # Every worker opens the cache, report a bad directory once instead of failing each of them
+    open_cache(cache_dir, cache_size)
+  server = Server(workers, int_param(params, '--max-pending', 1), cache_dir, cache_size)
+  try:
+    if params['--socket']:
+      asyncio.run(server.serve_unix(params['--socket']))
+    else:
+      asyncio.run(server.serve_stdio())
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.close()
+
 
 def setup_logging():
   level_colors = {
@@ -52,6 +234,9 @@ def setup_logging():
   class ColorFormatter(logging.Formatter):
 
     def format(self, record: logging.LogRecord):
+      import termcolor
+      # Color a copy, other handlers (see cache.RecordingHandler) should see the original message
+      record = logging.makeLogRecord(record.__dict__)
       record.msg = termcolor.colored(str(record.msg), level_colors.get(record.levelno, None))  # type: ignore
       return super().format(record)
 
@@ -63,12 +248,10 @@ def setup_logging():
 
 
 def main():
+  import docopt
+  from docopt_parser.util.version import package_version
   setup_logging()
-  try:
-    version = 'v' + importlib.metadata.version('docopt-parser')
-  except importlib.metadata.PackageNotFoundError:
-    version = 'v0.0.0-dev'
-  params = T.cast(Params, docopt.docopt(__doc__, version=version))
+  params = T.cast(Params, docopt.docopt(__doc__, version='v' + package_version()))
   docopt_parser(params)
 
 
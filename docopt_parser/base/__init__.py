@@ -1,4 +1,4 @@
-from docopt_parser.base.node import Node, DictGenerator, IterVal
+from docopt_parser.base.node import Node, DictGenerator, FieldGenerator, FieldVal, IterVal
 from docopt_parser.base.group import Group
 from docopt_parser.base.leaf import Leaf, ident
-__all__ = ['Node', 'Group', 'Leaf', 'ident', 'DictGenerator', 'IterVal']
+__all__ = ['Node', 'Group', 'Leaf', 'ident', 'DictGenerator', 'FieldGenerator', 'FieldVal', 'IterVal']
@@ -1,13 +1,42 @@
+import copy
 import typing as T
 from docopt_parser import base
 from docopt_parser.util import marks
 
 class Group(base.Node):
-  items: T.Sequence[base.Node]
+  __slots__ = ('_items',)
+  # A tuple so the items can only be changed through the setter, which invalidates base.Node.dict
+  _items: T.Tuple[base.Node, ...]
 
   def __init__(self, items: marks.MarkedTuple[T.Sequence[base.Node]]):
     super().__init__((items[0], items[2]))
-    self.items = list(items[1])
+    self._items = tuple(items[1])
+
+  @property
+  def items(self) -> T.Tuple[base.Node, ...]:
+    return self._items
+
+  @items.setter
+  def items(self, items: T.Sequence[base.Node]):
+    items = tuple(items)
+    old_items = self._items
+    if len(items) == len(old_items) and all(item is old for item, old in zip(items, old_items)):
+      # replace() assigns the items of every group, most of them stay the same
+      return
+    for item in old_items:
+      self.detach(item)
+    self._items = items
+    self.changed()
+
+  def __copy__(self) -> "Group":
+    new = T.cast(Group, super().__copy__())
+    new._items = self._items
+    return new
+
+  def __deepcopy__(self, memo: T.Dict[int, T.Any]) -> "Group":
+    new = T.cast(Group, super().__deepcopy__(memo))
+    new._items = tuple(copy.deepcopy(item, memo) for item in self._items)
+    return new
 
   _T = T.TypeVar('_T')
 
@@ -46,6 +75,6 @@ class Group(base.Node):
 {self.indent(self.items)}'''
 
 
-  def __iter__(self) -> base.DictGenerator:
-    yield from super().__iter__()
-    yield 'item', [item.dict for item in self.items]
+  def fields(self) -> base.FieldGenerator:
+    yield from super().fields()
+    yield 'item', list(self.items)
@@ -1,3 +1,4 @@
+import sys
 import typing as T
 import parsec as P
 
@@ -18,16 +19,27 @@ def ident(
   return p ^ P.fail_with('identifier')  # type: ignore
 
 class Leaf(base.Node):
+  __slots__ = ('ident', '_multiple')
   ident: str
-  _multiple: bool = False
+  _multiple: bool
 
   def __init__(self, ident: marks.MarkedTuple[str]):
     super().__init__((ident[0], ident[2]))
-    self.ident = ident[1]
+    # The same few idents are repeated across the usage section and across parsed ASTs
+    self.ident = sys.intern(ident[1])
+    self._multiple = False
+
+  def __copy__(self) -> "Leaf":
+    new = T.cast(Leaf, super().__copy__())
+    new.ident = self.ident
+    new._multiple = self._multiple
+    return new
 
   # Intentionally not specifying a getter, it's an internal variable
   def set_multiple(self, val: bool):
-    self._multiple = val
+    if self._multiple != val:
+      self._multiple = val
+      self.changed()
 
   @property
   def _multiple_suffix(self) -> str:
@@ -43,8 +55,8 @@ class Leaf(base.Node):
   def __repr__(self):
     return f'{str(type(self).__name__)}{self._multiple_suffix}: {self.ident}'
 
-  def __iter__(self):  # type: ignore
-    yield from super().__iter__()
+  def fields(self):  # type: ignore
+    yield from super().fields()
     yield 'ident', self.ident
 
   _T = T.TypeVar('_T')
@@ -1,5 +1,6 @@
 import typing as T
 import abc
+import copy
 
 from docopt_parser.util import marks
 
@@ -8,16 +9,37 @@ IterVal = T.Union[
   T.List["IterVal"], T.Dict[str, "IterVal"]
 ]
 DictGenerator = T.Generator[T.Tuple[str, IterVal], None, None]
+# The same as IterVal, except that nodes are not converted to dicts yet
+FieldVal = T.Union[IterVal, "Node", T.List["Node"]]
+FieldGenerator = T.Generator[T.Tuple[str, FieldVal], None, None]
 
 class Node(abc.ABC):
+  # ASTs are kept around in large numbers, all nodes use __slots__ instead of a __dict__
+  __slots__ = ('mark', '_dict', '_parents')
   mark: marks.Range
-  _previous_dict: "T.Dict[str, IterVal] | None" = None
+  # dict is memoized until the node or one of the nodes in it changes
+  _dict: "T.Dict[str, IterVal] | None"
+  # The nodes whose memoized dict contains the one of this node, by id(). Nodes can be shared between several
+  # parents (see merge_identical_groups()), a change is passed on to all of them
+  _parents: "T.Dict[int, Node] | None"
 
   def __init__(self, range: marks.RangeTuple):
     super().__init__()
     self.mark = marks.Range(range)
+    self._dict = None
+    self._parents = None
 
   def __iter__(self) -> DictGenerator:
+    for key, value in self.fields():
+      if isinstance(value, Node):
+        yield key, self.child_dict(value)
+      elif isinstance(value, list) and len(value) > 0 and isinstance(value[0], Node):
+        yield key, [self.child_dict(item) for item in T.cast(T.List[Node], value)]
+      else:
+        yield key, T.cast(IterVal, value)
+
+  def fields(self) -> FieldGenerator:
+    # The key/value pairs of the dict representation, see dict and util.serialize
     yield 'type', str(type(self).__name__).lower()
 
   def indent(self, child: "Node | T.Sequence[Node]", lvl: int = 1) -> str:
@@ -31,10 +53,56 @@ class Node(abc.ABC):
 
   @property
   def dict(self) -> "T.Dict[str, IterVal]":
-    new_dict = dict(self)
-    if self._previous_dict is None or new_dict != self._previous_dict:
-      self._previous_dict = new_dict
-    return self._previous_dict
+    # The same dict is returned until the node changes and is part of the dicts of its parents,
+    # copy.deepcopy() it before making changes to it
+    if self._dict is None:
+      self._dict = dict(self)
+    return self._dict
+
+  def child_dict(self, child: "Node") -> "T.Dict[str, IterVal]":
+    # The dict of a node that is part of the dict of this one, changes to child are passed on to this node
+    if child._parents is None:
+      child._parents = {}
+    child._parents[id(self)] = self
+    return child.dict
+
+  def detach(self, child: "Node"):
+    # child is no longer part of this node, its changes do not concern this node anymore
+    if child._parents is not None:
+      child._parents.pop(id(self), None)
+
+  def changed(self):
+    # Invalidates the memoized dict of this node and of the nodes that contain it,
+    # call it whenever a change to the node shows in its dict
+    self._dict = None
+    parents = self._parents
+    if parents:
+      self._parents = None
+      for parent in parents.values():
+        parent.changed()
+
+  def __getstate__(self) -> T.Tuple[None, T.Dict[str, T.Any]]:
+    # The memoized dict is only valid in this process, leave it out when pickling or copying
+    _, state = super().__getstate__()  # type: ignore
+    return None, {**state, '_dict': None, '_parents': None}
+
+  def __copy__(self) -> "Node":
+    # copy.copy() would go through __reduce_ex__, the subclasses copy their own slots
+    new = object.__new__(type(self))
+    new.mark = self.mark
+    new._dict = None
+    new._parents = None
+    return new
+
+  def __deepcopy__(self, memo: T.Dict[int, T.Any]) -> "Node":
+    # Like __copy__, the subclasses copy the nodes they refer to. Going through __reduce_ex__ would take several
+    # times as many stack frames for every level of nesting
+    new = memo[id(self)] = copy.copy(self)
+    return new
+
+  def shift(self, source: marks.SourceText, delta: int):
+    # Moves the node delta characters into source, its items are left alone
+    self.mark = self.mark.shift(source, delta)
 
   _T = T.TypeVar('_T')
 
@@ -0,0 +1,8 @@
+from docopt_parser.fast.tokens import Token, TokenType, Unsupported, tokenize
+from docopt_parser.fast.usage import UsageParser, usage
+from docopt_parser.fast.options import OptionsScanner, documented_options
+
+__all__ = [
+  'Token', 'TokenType', 'Unsupported', 'tokenize',
+  'UsageParser', 'usage', 'OptionsScanner', 'documented_options',
+]
@@ -0,0 +1,146 @@
+import re
+import typing as T
+
+from docopt_parser import leaves
+from docopt_parser.fast.tokens import Unsupported
+from docopt_parser.util import errors, marks
+
+_T = T.TypeVar('_T')
+
+section_title_re = re.compile(r'[^\n]*options:', re.I)
+options_re = re.compile(r'options:', re.I)
+title_end_re = re.compile(r'[ \t]*(?:\n(?: +|\t))?')
+long_name_re = re.compile(r'--(?:[^|()\[\] \t\n\r\b\f\x1B\x07\0=,.]|\.(?!\.\.))+')
+short_name_re = re.compile(r'-(?:[^|()\[\] \t\n\r\b\f\x1B\x07\0.]|\.(?!\.\.))')
+argument_re = re.compile(r'[ =](<[^>]+>|[^ ,-][^ ,]*)')
+separator_re = re.compile(r', (?=-)| (?=-)')
+eol_re = re.compile(r'[ \t]*(?:\n|\Z)')
+whitespaces_re = re.compile(r'[ \t]*')
+doc_separator_re = re.compile(r' {2,}')
+# option_documentation ends where either a [default: ] or the terminator starts
+doc_end_re = re.compile(r'\[default: ([^\n\]]*)\]|\n(?:\n|\Z| +-|\t-)', re.I)
+next_documented_option_re = re.compile(r'\n(?: +|\t)-')
+next_documented_option_indent_re = re.compile(r'\n(?: +|\t)?')
+
+OptionLine = T.Tuple[marks.MarkedTuple[str], "marks.MarkedTuple[str] | None"]
+
+
+def documented_options(text: str) -> leaves.OptionRegistry:
+  try:
+    return OptionsScanner(text).documented_options()
+  except Unsupported:
+    return leaves.documented_options.parse_strict(text)  # type: ignore
+
+
+class OptionsScanner(object):
+  # Scans the options sections a line at a time with the regular expressions above.
+  # The resulting definitions and errors mirror the combinators in options.py
+  text: marks.SourceText
+  options: leaves.OptionRegistry
+
+  def __init__(self, text: str):
+    self.text = marks.SourceText.wrap(text)
+    self.options = leaves.OptionRegistry()
+
+  def documented_options(self) -> leaves.OptionRegistry:
+    text = self.text
+    pos = 0
+    while pos < len(text):
+      title = options_re.search(text, pos)
+      if title is None:
+        break
+      pos = max(pos, text.rfind('\n', 0, title.start()) + 1)
+      pos = T.cast(re.Match[str], section_title_re.match(text, pos)).end()
+      pos = T.cast(re.Match[str], title_end_re.match(text, pos)).end()
+      while text.startswith('-', pos):
+        pos = self.documented_option(pos)
+        if next_documented_option_re.match(text, pos) is None:
+          break
+        pos = T.cast(re.Match[str], next_documented_option_indent_re.match(text, pos)).end()
+      if pos < len(text):
+        if text[pos] != '\n':
+          raise Unsupported(f'Unexpected text after documented option at {pos}')
+        pos += 1
+    return self.options
+
+  def mark(self, start: int, elm: _T, end: int) -> marks.MarkedTuple[_T]:
+    return (self.text.position(start), elm, self.text.position(end))
+
+  def option_line(self, pos: int) -> T.Tuple[OptionLine, int]:
+    text = self.text
+    name = long_name_re.match(text, pos)
+    if name is None:
+      if text.startswith('--', pos):
+        raise Unsupported(f'Invalid long option at {pos}')
+      name = short_name_re.match(text, pos)
+      if name is None:
+        raise Unsupported(f'Invalid short option at {pos}')
+    pos = name.end()
+    arg = argument_re.match(text, pos)
+    if arg is None and text.startswith('=', pos):
+      raise Unsupported(f'Argument expected at {pos}')
+    name_mark = self.mark(name.start(), name.group(), name.end())
+    if arg is None:
+      return (name_mark, None), pos
+    return (name_mark, self.mark(arg.start(1), arg.group(1), arg.end(1))), arg.end()
+
+  def documented_option(self, pos: int) -> int:
+    text = self.text
+    short_alias: "marks.MarkedTuple[str] | None" = None
+    opts: T.List[OptionLine] = []
+    opt_def: "OptionLine | None" = None
+    while True:
+      opt, pos = self.option_line(pos)
+      if opt[0][1].startswith('--'):
+        # The last long option is the definition
+        opt_def = opt
+      else:
+        if opt_def is None:
+          # In the absence of long options, the short option is the definition
+          opt_def = opt
+        if short_alias is not None:
+          raise errors.DocoptParseError(
+            f'An option may only have one short option alias (previously defined at {short_alias})',
+            marks.Marked(opt[0]))
+        short_alias = opt[0]
+      opts.append(opt)
+      separator = separator_re.match(text, pos)
+      if separator is None:
+        break
+      pos = separator.end()
+    opt_def = T.cast(OptionLine, opt_def)
+    opts.remove(opt_def)
+
+    _doc: "marks.MarkedTuple[str | None] | None" = None
+    _default: "marks.MarkedTuple[str | None] | None" = None
+    if eol_re.match(text, pos) is not None:
+      # Consume trailing whitespaces
+      pos = T.cast(re.Match[str], whitespaces_re.match(text, pos)).end()
+    else:
+      spaces = doc_separator_re.match(text, pos)
+      if spaces is None:
+        raise Unsupported(f'Expected at least 2 spaces at {pos}')
+      doc_start = pos = spaces.end()
+      end = doc_end_re.search(text, pos)
+      if end is not None and end.group(1) is not None:
+        # [default: ] is the first thing that ends the documentation
+        _default = self.mark(end.start(), end.group(1) or None, end.end())
+        end = doc_end_re.search(text, end.end())
+      pos = end.start() if end is not None else len(text)
+      _doc = self.mark(doc_start, text[doc_start:pos], pos)
+
+    def_arg = opt_def[1]
+    if def_arg is None:
+      def_arg = next((o[1] for o in opts if o[1] is not None), None)
+    definition = leaves.Option(opt_def[0], def_arg, None, short_alias, _default, _doc)  # type: ignore
+    self.add(definition, definition)
+    for name, arg in opts:
+      self.add(leaves.Option(name, arg, definition), definition)
+    return pos
+
+  def add(self, option: leaves.Option, definition: leaves.Option):
+    previous_def = self.options.get_definition(option.ident)
+    if previous_def is not None and previous_def.ident == option.ident:
+      raise errors.DocoptParseError(
+        f'{definition.ident} has already been specified at {previous_def.mark.start}', definition.mark)
+    self.options.add(option)
@@ -0,0 +1,60 @@
+import enum
+import re
+import typing as T
+
+
+class Unsupported(Exception):
+  # Raised whenever the fast engine encounters input it does not handle itself.
+  # This includes every syntax error, the combinator engine is then used to
+  # parse the text again and produce the exact same result or error message.
+  pass
+
+class TokenType(enum.Enum):
+  WHITESPACE = 'whitespace'
+  ELLIPSIS = 'ellipsis'
+  EITHER = '|'
+  GROUP_START = '('
+  GROUP_END = ')'
+  OPTIONAL_START = '['
+  OPTIONAL_END = ']'
+  WRAPPED_ARG = '<arg>'
+  WORD = 'word'
+
+class Token(T.NamedTuple):
+  type: TokenType
+  start: int
+  end: int
+
+# These mirror parsers.non_symbol_chars, a word is everything that is not a
+# symbol and does not start an ellipsis
+word_re = re.compile(r'(?:[^|()\[\] \t\n\r\b\f\x1B\x07\0.]|\.(?!\.\.))+')
+wrapped_arg_re = re.compile(r'<[^>]+>')
+token_re = re.compile(r'''
+  (?P<WHITESPACE>[ \t]+)
+| (?P<ELLIPSIS>\.\.\.)
+| (?P<EITHER>\|)
+| (?P<GROUP_START>\()
+| (?P<GROUP_END>\))
+| (?P<OPTIONAL_START>\[)
+| (?P<OPTIONAL_END>\])
+| (?P<WRAPPED_ARG><[^>]+>)
+| (?P<WORD>(?:[^|()\[\] \t\n\r\b\f\x1B\x07\0.]|\.(?!\.\.))+)
+''', re.X)
+
+
+def tokenize(text: str, start: int, end: int) -> T.List[Token]:
+  # Tokenize text[start:end], which must not contain any newlines
+  tokens: T.List[Token] = []
+  pos = start
+  while pos < end:
+    m = token_re.match(text, pos, end)
+    if m is None:
+      # Control characters terminate a sequence and can only ever be a syntax error
+      raise Unsupported(f'Unexpected character at {pos}')
+    kind = TokenType[T.cast(str, m.lastgroup)]
+    if kind is TokenType.WORD and text[pos] == '<' and wrapped_arg_re.match(text, pos) is not None:
+      # <arg> spanning multiple lines
+      raise Unsupported(f'Multiline argument at {pos}')
+    tokens.append(Token(kind, pos, m.end()))
+    pos = m.end()
+  return tokens
@@ -0,0 +1,288 @@
+import re
+import typing as T
+
+from docopt_parser import base, groups, leaves
+from docopt_parser.fast.tokens import Token, TokenType, Unsupported, tokenize, word_re, wrapped_arg_re
+from docopt_parser.util import marks
+
+_T = T.TypeVar('_T')
+
+usage_re = re.compile(r'usage:', re.I)
+section_title_re = re.compile(r'[^\n]*usage:', re.I)
+indent_re = re.compile(r' +|\t')
+whitespaces_re = re.compile(r'[ \t]*')
+prog_re = re.compile(r'[^ \t\n]+')
+# parsers.non_symbol_chars and leaves.option.long_illegal as plain characters
+non_symbol_chars = '|()[] \t\n\r\b\f\x1B\x07\0'
+sequence_terminators = (
+  TokenType.EITHER, TokenType.GROUP_END, TokenType.OPTIONAL_END
+)
+
+
+def usage(text: str, options: leaves.OptionRegistry) -> base.Node:
+  try:
+    return UsageParser(text, options.copy()).usage()
+  except Unsupported:
+    # The combinators are only imported and built when they are needed
+    from docopt_parser import usage as combinator_usage
+    return combinator_usage.usage(options).parse_strict(text)  # type: ignore
+
+
+class UsageParser(object):
+  # Recursive descent parser for the usage section.
+  # The grammar and the resulting AST mirror the combinators in usage.py, groups.py and leaves/*.py
+  text: marks.SourceText
+  options: leaves.OptionRegistry
+  prog: str
+  tokens: T.List[Token]
+  index: int
+  line_end: int
+
+  def __init__(self, text: str, options: leaves.OptionRegistry):
+    self.text = marks.SourceText.wrap(text)
+    self.options = options
+    self.prog = ''
+    self.tokens = []
+    self.index = 0
+    self.line_end = 0
+
+  def usage(self) -> base.Node:
+    text = self.text
+    title = usage_re.search(text)
+    if title is None:
+      raise Unsupported('No usage section')
+    section_start = text.rfind('\n', 0, title.start()) + 1
+    start = self.loc(section_start)
+    pos = T.cast(re.Match[str], section_title_re.match(text, section_start)).end()
+    if text.startswith('\n', pos):
+      indent = indent_re.match(text, pos + 1)
+      if indent is not None:
+        pos = indent.end()
+    pos = whitespaces_re.match(text, pos).end()  # type: ignore
+    prog = prog_re.match(text, pos)
+    if prog is None:
+      raise Unsupported('No program name')
+    prog_name = self.prog = prog.group()
+
+    lines: T.List[base.Node] = []
+    while True:
+      if not text.startswith(prog_name, pos):
+        raise Unsupported('Usage line does not start with the program name')
+      pos += len(prog_name)
+      line, pos = self.usage_line(pos)
+      lines.append(line)
+      eol = whitespaces_re.match(text, pos).end()  # type: ignore
+      if not text.startswith('\n', eol):
+        break
+      indent = indent_re.match(text, eol + 1)
+      if indent is None:
+        break
+      pos = indent.end()
+    end = self.loc(pos)
+    pos = whitespaces_re.match(text, pos).end()  # type: ignore
+    if pos < len(text) and (text[pos] != '\n' or usage_re.search(text, pos + 1) is not None):
+      raise Unsupported('Trailing text after the usage section')
+    return groups.Choice((start, lines, end))
+
+  def usage_line(self, pos: int) -> T.Tuple[base.Node, int]:
+    line_end = self.text.find('\n', pos)
+    if line_end == -1:
+      line_end = len(self.text)
+    self.line_end = line_end
+    self.tokens = tokenize(self.text, pos, line_end)
+    self.index = 0
+    if len(self.tokens) == 0 or (len(self.tokens) == 1 and self.peek() is TokenType.WHITESPACE):
+      return groups.Choice((self.loc(pos), [], self.loc(line_end))), line_end
+    self.expect(TokenType.WHITESPACE)
+    node = self.expr()
+    if self.peek() is not None:
+      raise Unsupported(f'Unexpected {self.peek()} at {self.pos}')
+    return node, self.pos
+
+  def loc(self, pos: int) -> marks.LocInfo:
+    return self.text.position(pos)
+
+  def mark(self, start: int, elm: _T, end: int) -> marks.MarkedTuple[_T]:
+    return (self.text.position(start), elm, self.text.position(end))
+
+  @property
+  def pos(self) -> int:
+    if self.index < len(self.tokens):
+      return self.tokens[self.index].start
+    return self.line_end
+
+  def peek(self, offset: int = 0) -> "TokenType | None":
+    if self.index + offset < len(self.tokens):
+      return self.tokens[self.index + offset].type
+    return None
+
+  def expect(self, type: TokenType) -> Token:
+    if self.peek() is not type:
+      raise Unsupported(f'Expected {type} at {self.pos}')
+    self.index += 1
+    return self.tokens[self.index - 1]
+
+  def skip_whitespaces(self):
+    if self.peek() is TokenType.WHITESPACE:
+      self.index += 1
+
+  def seek(self, pos: int):
+    # Move to the token starting at pos after having parsed parts of the line by hand
+    while self.index < len(self.tokens) and self.tokens[self.index].start < pos:
+      self.index += 1
+    if pos != self.pos:
+      raise Unsupported(f'Parsing ended inside a token at {pos}')
+
+  def expr(self) -> base.Node:
+    start = self.pos
+    nodes = [self.sequence()]
+    while self.peek() is TokenType.EITHER:
+      self.index += 1
+      self.skip_whitespaces()
+      nodes.append(self.sequence())
+    if len(nodes) == 1:
+      return nodes[0]
+    return groups.Choice(self.mark(start, nodes, self.pos))
+
+  def sequence(self) -> base.Node:
+    start = self.pos
+    nodes: T.List[base.Node] = []
+    while (kind := self.peek()) is not None and kind not in sequence_terminators:
+      atoms = self.atom()
+      repeat = None
+      if self.peek() is TokenType.ELLIPSIS:
+        repeat = self.expect(TokenType.ELLIPSIS)
+      elif self.peek() is TokenType.WHITESPACE and self.peek(1) is TokenType.ELLIPSIS:
+        self.index += 1
+        repeat = self.expect(TokenType.ELLIPSIS)
+      if repeat is not None:
+        # Same as in groups.sequence, the start of the last atom is the start of the repeatable
+        atoms = [groups.Repeatable((atoms[-1].mark.to_range_tuple()[0], atoms, self.loc(repeat.end)))]
+      nodes += atoms
+      if self.peek() is not TokenType.WHITESPACE:
+        break
+      self.index += 1
+    if len(nodes) == 1:
+      return nodes[0]
+    return groups.Sequence(self.mark(start, nodes, self.pos))
+
+  def atom(self) -> T.List[base.Node]:
+    token = self.tokens[self.index]
+    if token.type is TokenType.GROUP_START:
+      self.index += 1
+      self.skip_whitespaces()
+      node = self.expr()
+      end = self.expect(TokenType.GROUP_END).end
+      return [groups.Group(self.mark(token.start, [node], end))]
+    if token.type is TokenType.OPTIONAL_START:
+      self.index += 1
+      self.skip_whitespaces()
+      node = self.expr()
+      end = self.expect(TokenType.OPTIONAL_END).end
+      # Strip the implicit <Sequence>, see groups.optional
+      items = node.items if isinstance(node, groups.Sequence) else [node]
+      return [groups.Optional(self.mark(token.start, items, end))]
+    value = self.text[token.start:token.end]
+    if token.type is TokenType.WRAPPED_ARG:
+      self.index += 1
+      return [leaves.Argument(self.mark(token.start, value, token.end))]
+    if token.type is not TokenType.WORD:
+      raise Unsupported(f'Unexpected {token.type} at {token.start}')
+    if value.startswith('options'):
+      if value != 'options':
+        raise Unsupported(f'Text following options shortcut at {token.start}')
+      self.index += 1
+      return [leaves.OptionsShortcut(self.mark(token.start, value, token.end))]
+    if value == '--':
+      self.index += 1
+      return [leaves.ArgumentSeparator(self.mark(token.start, value, token.end))]
+    if value.startswith('-') and len(value) > 1:
+      return T.cast(T.List[base.Node], self.option(token))
+    self.index += 1
+    if value.isupper():
+      return [leaves.Argument(self.mark(token.start, value, token.end))]
+    return [leaves.Command(self.mark(token.start, value, token.end))]
+
+  def option(self, token: Token) -> T.List[leaves.Option]:
+    # Mirrors leaves.option(), see leaves.OptionRegistry for how options are matched
+    opt, pos = self.first_option(token.start, token.end)
+    self.options.add(opt)
+    opts = [opt]
+    # multiple short options can be specified like "-abc".
+    while not opt.argname:
+      next_opt = self.shortlist_option(pos)
+      if next_opt is None:
+        break
+      opt, pos = next_opt
+      opts.append(opt)
+      if opt not in self.options:
+        self.options.add(opt)
+    self.seek(pos)
+    return opts
+
+  def first_option(self, pos: int, end: int) -> T.Tuple[leaves.Option, int]:
+    text = self.text
+    o = self.options.match(text, pos)
+    if o is not None:
+      name_end = pos + len(o.ident)
+      if name_end > end:
+        raise Unsupported(f'Option {o.ident} extends past its token at {pos}')
+      is_long = o.ident.startswith('--')
+      name = self.mark(pos, o.ident, name_end)
+      if o.argname:
+        if text.startswith((' ', '='), name_end):
+          arg_pos = name_end + 1
+        elif is_long:
+          raise Unsupported(f'{o.ident} expects an argument')
+        else:
+          arg_pos = name_end
+        next_arg = self.option_argument(arg_pos)
+        if next_arg is None:
+          raise Unsupported(f'{o.ident} expects an argument')
+        arg, arg_end = next_arg
+        return leaves.Option(name, arg, o.definition), arg_end
+      if text.startswith('=', name_end):
+        raise Unsupported(f'{o.ident} does not expect an argument')
+      return leaves.Option(name, None, o.definition), name_end
+    if text.startswith('--', pos) and pos + 2 < end and text[pos + 2] != '=':
+      # Undocumented long option, see usage_long_option
+      name_end = text.find('=', pos + 2, end)
+      if name_end == -1:
+        name_end = end
+      name = self.mark(pos, text[pos:name_end], name_end)
+      next_arg = self.option_argument(name_end + 1) if name_end != end else None
+      if next_arg is None:
+        return leaves.Option(name, None), name_end
+      arg, arg_end = next_arg
+      return leaves.Option(name, arg), arg_end
+    # Undocumented short option, see usage_short_option
+    name = self.mark(pos, text[pos:pos + 2], pos + 2)
+    return leaves.Option(name, None, short_alias=name), pos + 2
+
+  def shortlist_option(self, pos: int) -> "T.Tuple[leaves.Option, int] | None":
+    text = self.text
+    o = self.options.match_shortlist(text, pos)
+    if o is not None:
+      # Mirrors Option.atom_parser_shortlist, which uses the bare character as the ident
+      name = self.mark(pos, o.ident[1], pos + 1)
+      if o.argname:
+        next_arg = self.option_argument(pos + 2 if text.startswith((' ', '='), pos + 1) else pos + 1)
+        if next_arg is None:
+          return None
+        arg, arg_end = next_arg
+        return leaves.Option(name, arg, o.definition), arg_end
+      return leaves.Option(name, None, o.definition), pos + 1
+    # Undocumented short option, see usage_shortlist_option
+    if pos < len(text) and text[pos] not in non_symbol_chars and not text.startswith('...', pos):
+      name = self.mark(pos, '-' + text[pos], pos + 1)
+      return leaves.Option(name, None, short_alias=name), pos + 1
+    return None
+
+  def option_argument(self, pos: int) -> "T.Tuple[marks.MarkedTuple[str], int] | None":
+    # See leaves.option.option_argument
+    match = wrapped_arg_re.match(self.text, pos) if self.text.startswith('<', pos) else None
+    if match is None:
+      match = word_re.match(self.text, pos)
+    if match is None:
+      return None
+    return self.mark(pos, match.group(), match.end()), match.end()
@@ -1,13 +1,22 @@
+import typing as T
 from docopt_parser.leaves.argument import Argument, argument, wrapped_arg, arg_letters
 from docopt_parser.leaves.argumentseparator import ArgumentSeparator, arg_separator
 from docopt_parser.leaves.command import Command, command
 from docopt_parser.leaves.options_shortcut import OptionsShortcut, options_shortcut
-from docopt_parser.leaves.option import Option, option, long_illegal, short_illegal
-from docopt_parser.options import documented_options
+from docopt_parser.leaves.option import Option, OptionRegistry, option, long_illegal, short_illegal
 
 __all__ = [
   'Argument', 'argument', 'wrapped_arg', 'arg_letters',
   'ArgumentSeparator', 'arg_separator', 'Command', 'command',
   'documented_options', 'OptionsShortcut', 'options_shortcut',
-  'Option', 'option', 'long_illegal', 'short_illegal'
+  'Option', 'OptionRegistry', 'option', 'long_illegal', 'short_illegal'
 ]
+
+
+def __getattr__(name: str) -> T.Any:
+  # The parser of the options sections is imported when the combinator engine first uses it
+  if name == 'documented_options':
+    from docopt_parser.options import documented_options
+    globals()[name] = documented_options
+    return documented_options
+  raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -4,6 +4,8 @@ from docopt_parser import base
 from docopt_parser.util import helpers, marks, parsers
 
 class Argument(base.Leaf):
+  __slots__ = ()
+
   @property
   def default(self) -> T.List[str] | None:
     if self._multiple:
@@ -11,14 +13,22 @@ class Argument(base.Leaf):
     else:
       return None
 
-  def __iter__(self):  # type: ignore
-    yield from super().__iter__()
+  def fields(self):  # type: ignore
+    yield from super().fields()
     yield 'default', self.default
 
-wrapped_arg = (parsers.char('<') + base.ident(parsers.char('>')) + parsers.char('>')) \
-  .desc('<arg>').parsecmap(helpers.join_string).mark()
+@parsers.lazy
+def wrapped_arg() -> "P.Parser[marks.MarkedTuple[str]]":
+  return parsers.mark(
+    (parsers.char('<') + base.ident(parsers.char('>')) + parsers.char('>')).desc('<arg>').parsecmap(helpers.join_string)
+  )
 
-arg_letters = base.ident(illegal=parsers.non_symbol_chars).parsecmap(helpers.join_string).mark()
+@parsers.lazy
+def arg_letters() -> "P.Parser[marks.MarkedTuple[str]]":
+  # Parsed up to three times at the same index: by uppercase_arg to look at it, for real, and by command
+  return parsers.memo(
+    'arg_letters', parsers.mark(base.ident(illegal=parsers.non_symbol_chars).parsecmap(helpers.join_string))
+  )
 
 @P.generate('ARG')
 def uppercase_arg() -> helpers.GeneratorParser[marks.MarkedTuple[str]]:
@@ -29,4 +39,6 @@ def uppercase_arg() -> helpers.GeneratorParser[marks.MarkedTuple[str]]:
     yield P.fail_with('Not an argument')  # type: ignore
   return (((0, 0), '', (0, 0)))  # Will never return, this is just to make the typechecker happy
 
-argument = (wrapped_arg ^ uppercase_arg).desc('argument').parsecmap(lambda n: Argument(n))
+@parsers.lazy
+def argument() -> "P.Parser[Argument]":
+  return (wrapped_arg ^ uppercase_arg).desc('argument').parsecmap(lambda n: Argument(n))
@@ -5,6 +5,8 @@ from docopt_parser import base
 from docopt_parser.util import parsers
 
 class ArgumentSeparator(base.Leaf):
+  __slots__ = ()
+
   @property
   def default(self) -> "T.Literal[0] | T.Literal[False]":
     if self._multiple:
@@ -12,9 +14,11 @@ class ArgumentSeparator(base.Leaf):
     else:
       return False
 
-  def __iter__(self):  # type: ignore
-    yield from super().__iter__()
+  def fields(self):  # type: ignore
+    yield from super().fields()
     yield 'default', self.default
 
-arg_separator = P.unit(parsers.string('--') << P.lookahead(parsers.non_symbol_chars)).mark() \
-  .parsecmap(lambda n: ArgumentSeparator(n))
+@parsers.lazy
+def arg_separator() -> "P.Parser[ArgumentSeparator]":
+  return parsers.mark(P.unit(parsers.string('--') << P.lookahead(parsers.non_symbol_chars))) \
+    .parsecmap(lambda n: ArgumentSeparator(n))
@@ -1,9 +1,13 @@
 import typing as T
+import parsec as P
 
 from docopt_parser import base
+from docopt_parser.leaves.argument import arg_letters
 from docopt_parser.util import parsers
 
 class Command(base.Leaf):
+  __slots__ = ()
+
   @property
   def default(self) -> "T.Literal[0] | T.Literal[False]":
     if self._multiple:
@@ -11,10 +15,11 @@ class Command(base.Leaf):
     else:
       return False
 
-  def __iter__(self):  # type: ignore
-    yield from super().__iter__()
+  def fields(self):  # type: ignore
+    yield from super().fields()
     yield 'default', self.default
 
-command = base.ident(
-  parsers.non_symbol_chars, starts_with=parsers.char(illegal=parsers.non_symbol_chars)
-).mark().parsecmap(lambda n: Command(n))
+@parsers.lazy
+def command() -> "P.Parser[Command]":
+  # The same letters as an uppercase ARG, argument is tried first and has parsed them already
+  return arg_letters.parsecmap(lambda n: Command(n))
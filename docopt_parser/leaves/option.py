@@ -1,4 +1,5 @@
-from functools import reduce
+import copy
+import sys
 import typing as T
 import parsec as P
 
@@ -6,31 +7,51 @@ from docopt_parser import base, leaves
 from docopt_parser.util import helpers, marks, parsers
 
 class Option(base.Leaf):
-  definition: "Option"
+  __slots__ = (
+    '_definition', '__argname', '__short_alias', '__default', '__doc', '__is_definition',
+    '_atom_parser', '_atom_parser_shortlist'
+  )
+  _definition: "Option"
   __argname: "marks.Marked[str] | None"
-  __short_alias: "marks.Marked[str] | None"
-  __default: "marks.Marked[str] | None"
-  __doc: "marks.Marked[str] | None"
+  # Only the text of these is ever used, there is no need to keep their marks around
+  __short_alias: "str | None"
+  __default: "str | None"
+  __doc: "str | None"
   __is_definition: bool
+  _atom_parser: "P.Parser[Option] | None"
+  _atom_parser_shortlist: "P.Parser[Option] | None"
 
   def __init__(self, name: marks.MarkedTuple[str], argname: "marks.MarkedTuple[str] | None",
                definition: "Option | None" = None,
                short_alias: "marks.MarkedTuple[str] | None" = None,
                default: "marks.MarkedTuple[str] | None" = None, doc: "marks.MarkedTuple[str] | None" = None):
     super().__init__(name)
-    self.__argname = marks.Marked(argname) if argname else None
-    self.definition = definition or self
+    self.__argname = marks.Marked((argname[0], sys.intern(argname[1]), argname[2])) if argname else None
+    self._definition = definition or self
     self.__is_definition = definition is None
-    self.__short_alias = marks.Marked(short_alias) if short_alias else None
-    self.__default = marks.Marked(default) if default else None
-    self.__doc = marks.Marked(doc) if doc else None
+    self.__short_alias = short_alias[1] if short_alias else None
+    self.__default = default[1] if default else None
+    self.__doc = doc[1] if doc else None
+    self._atom_parser = None
+    self._atom_parser_shortlist = None
+
+  @property
+  def definition(self) -> "Option":
+    return self._definition
+
+  @definition.setter
+  def definition(self, definition: "Option"):
+    if definition is not self._definition:
+      self.detach(self._definition)
+      self._definition = definition
+      self.changed()
 
   @property
   def default(self) -> "T.List[str] | str | None | T.Literal[0] | T.Literal[False]":
     if self.argname and self._multiple:
-      return self.definition.__default.elm.split(' ') if self.definition.__default else []
+      return self.definition.__default.split(' ') if self.definition.__default else []
     elif self.argname:
-      return self.definition.__default.elm if self.definition.__default else None
+      return self.definition.__default
     elif self._multiple:
       return 0
     else:
@@ -38,11 +59,11 @@ class Option(base.Leaf):
 
   @property
   def doc(self):
-    return self.definition.__doc.elm if self.definition.__doc else None
+    return self.definition.__doc
 
   @property
   def short_alias(self):
-    return self.definition.__short_alias.elm if self.definition.__short_alias else None
+    return self.definition.__short_alias
 
   @property
   def argname(self):
@@ -53,14 +74,37 @@ class Option(base.Leaf):
     if not self.__is_definition:
       self.definition.set_multiple(val)
 
+  def __copy__(self) -> "Option":
+    new = T.cast(Option, super().__copy__())
+    new._definition = self._definition
+    new.__argname = self.__argname
+    new.__short_alias = self.__short_alias
+    new.__default = self.__default
+    new.__doc = self.__doc
+    new.__is_definition = self.__is_definition
+    # The memoized parsers are closures over this option, see __getstate__
+    new._atom_parser = None
+    new._atom_parser_shortlist = None
+    return new
+
+  def __deepcopy__(self, memo: T.Dict[int, T.Any]) -> "Option":
+    new = T.cast(Option, super().__deepcopy__(memo))
+    new._definition = copy.deepcopy(self._definition, memo)
+    return new
+
+  def shift(self, source: marks.SourceText, delta: int):
+    super().shift(source, delta)
+    if self.__argname is not None:
+      self.__argname = self.__argname.shift(source, delta)
+
   def __repr__(self):
     arg_suffix = ' ' + self.argname.elm if self.argname else ''
     return f'{self.ident}{self._multiple_suffix}{arg_suffix}'
 
-  def __iter__(self):  # type: ignore
-    yield from super().__iter__()
+  def fields(self):  # type: ignore
+    yield from super().fields()
     if not self.__is_definition:
-      yield 'definition', self.definition.dict
+      yield 'definition', self.definition
     else:
       if self.default:
         yield 'default', self.default
@@ -75,15 +119,31 @@ class Option(base.Leaf):
   def __eq__(self, other: T.Any) -> bool:
     return isinstance(other, Option) and self.definition.ident == other.definition.ident
 
+  def __getstate__(self) -> T.Tuple[None, T.Dict[str, T.Any]]:
+    # The memoized parsers are closures, leave them out when pickling or copying
+    _, state = super().__getstate__()  # type: ignore
+    return None, {**state, '_atom_parser': None, '_atom_parser_shortlist': None}
+
+  @property
+  def atom_parser(self) -> "P.Parser[Option]":
+    if self._atom_parser is None:
+      self._atom_parser = self.build_atom_parser()
+    return self._atom_parser
+
   @property
-  def atom_parser(self):
+  def atom_parser_shortlist(self) -> "P.Parser[Option] | None":
+    if self._atom_parser_shortlist is None and not self.ident.startswith('--'):
+      self._atom_parser_shortlist = self.build_atom_parser_shortlist()
+    return self._atom_parser_shortlist
+
+  def build_atom_parser(self) -> "P.Parser[Option]":
     if self.ident.startswith('--'):
       # The lookahead is to ensure that we don't consume a prefix of another option
       # e.g. --ab matching --abc
-      name_p = P.unit(parsers.string(self.ident) << P.lookahead(long_illegal)).mark()
+      name_p = parsers.mark(P.unit(parsers.string(self.ident) << P.lookahead(long_illegal)))
       arg_p = parsers.char(' =') >> option_argument
     else:
-      name_p = parsers.string(self.ident).mark()
+      name_p = parsers.mark(parsers.string(self.ident))
       arg_p = P.optional(parsers.char(' =')) >> option_argument
     if self.argname:
       return (name_p + arg_p.desc('argument')).parsecmap(lambda n: Option(*n, self.definition))
@@ -94,63 +154,157 @@ class Option(base.Leaf):
         )
       ).parsecmap(lambda n: Option(n, None, self.definition))
 
-  @property
-  def atom_parser_shortlist(self):
-    if self.ident.startswith('--'):
-      return None
-    name_p = parsers.string(self.ident[1]).mark()
+  def build_atom_parser_shortlist(self) -> "P.Parser[Option]":
+    name_p = parsers.mark(parsers.string(self.ident[1]))
     if self.argname:
       arg_p = P.optional(parsers.char(' =')) >> option_argument
       return (name_p + arg_p).parsecmap(lambda n: Option(*n, self.definition))
     else:
       return name_p.parsecmap(lambda n: Option(n, None, self.definition))
 
-long_illegal = parsers.non_symbol_chars | parsers.char('=')
+@parsers.lazy
+def long_illegal() -> "P.Parser[T.Any]":
+  return parsers.non_symbol_chars | parsers.char('=')
 
-option_argument = (leaves.wrapped_arg ^ leaves.arg_letters).desc('option argument')
+@parsers.lazy
+def option_argument() -> "P.Parser[marks.MarkedTuple[str]]":
+  return (leaves.wrapped_arg ^ leaves.arg_letters).desc('option argument')
 
-usage_long_option = (
-  P.unit(
-    parsers.string('--') + base.ident(long_illegal)
-  ).parsecmap(helpers.join_string).mark() + P.optional(parsers.char('=') >> option_argument)
-).desc('long option (--long)').parsecmap(lambda n: Option(*n))
+@parsers.lazy
+def usage_long_option() -> "P.Parser[Option]":
+  return (
+    parsers.mark(P.unit(
+      parsers.string('--') + base.ident(long_illegal)
+    ).parsecmap(helpers.join_string)) + P.optional(parsers.char('=') >> option_argument)
+  ).desc('long option (--long)').parsecmap(lambda n: Option(*n))
 
 short_illegal = parsers.non_symbol_chars
 
-usage_short_option = (
-  (P.unit(parsers.char('-') + parsers.char(illegal=short_illegal))).parsecmap(helpers.join_string).mark()
-).desc('short option (-a)').parsecmap(lambda n: Option(n, None, short_alias=n))
+@parsers.lazy
+def usage_short_option() -> "P.Parser[Option]":
+  return parsers.mark(
+    P.unit(parsers.char('-') + parsers.char(illegal=short_illegal)).parsecmap(helpers.join_string)
+  ).desc('short option (-a)').parsecmap(lambda n: Option(n, None, short_alias=n))
+
+@parsers.lazy
+def usage_shortlist_option() -> "P.Parser[Option]":
+  # Usage parser without the leading "-" to allow parsing "-abc" style option specs
+  # Prefix the parse result with a "-" in order to forward the proper identifier to Short()
+  return parsers.mark(
+    parsers.char(illegal=short_illegal).parsecmap(lambda n: '-' + n[0])
+  ).desc('short option (-a)').parsecmap(lambda n: Option(n, None, short_alias=n))
+
+@parsers.lazy
+def undocumented_option() -> "P.Parser[Option]":
+  return usage_long_option | usage_short_option
+
+# long_illegal as plain characters, no option ident extends past them
+long_illegal_chars = '|()[] \t\n\r\b\f\x1B\x07\0='
+
+class OptionRegistry(object):
+  # The options encountered while parsing, in order of registration.
+  # Matching an option is the same as trying Option.atom_parser/atom_parser_shortlist of every
+  # registered option in reverse order of registration, i.e. the last registered option that matches wins
+  _options: T.List[Option]
+  # ident -> (registration index, last registered option with that ident)
+  _last_by_ident: T.Dict[str, T.Tuple[int, Option]]
+  # short option character -> last registered short option with that character
+  _last_by_short_char: T.Dict[str, Option]
+  # ident -> definition of the first registered option with that ident
+  _definitions: T.Dict[str, Option]
+  _definition_idents: T.Set[str]
+
+  def __init__(self, options: T.Iterable[Option] = ()):
+    self._options = []
+    self._last_by_ident = {}
+    self._last_by_short_char = {}
+    self._definitions = {}
+    self._definition_idents = set()
+    for option in options:
+      self.add(option)
+
+  def add(self, option: Option):
+    self._last_by_ident[option.ident] = (len(self._options), option)
+    if not option.ident.startswith('--'):
+      self._last_by_short_char[option.ident[1:2]] = option
+    self._definitions.setdefault(option.ident, option.definition)
+    self._definition_idents.add(option.definition.ident)
+    self._options.append(option)
+
+  def copy(self) -> "OptionRegistry":
+    return OptionRegistry(self._options)
+
+  def release_parsers(self):
+    # The memoized parsers are only needed while parsing, don't let them live on with the AST
+    for option in self._options:
+      option._atom_parser = None
+      option._atom_parser_shortlist = None
+
+  def __iter__(self) -> T.Iterator[Option]:
+    return iter(self._options)
+
+  def __len__(self) -> int:
+    return len(self._options)
+
+  def __contains__(self, option: Option) -> bool:
+    # Same as "option in list", options are equal when their definitions have the same ident
+    return option.definition.ident in self._definition_idents
+
+  def get_definition(self, ident: str) -> "Option | None":
+    return self._definitions.get(ident)
+
+  def get_short_option(self, char: str) -> "Option | None":
+    return self._last_by_short_char.get(char)
+
+  def match(self, text: str, index: int) -> "Option | None":
+    if not text.startswith('-', index):
+      return None
+    best: "T.Tuple[int, Option] | None" = None
+    end = index + 2
+    while end <= len(text):
+      entry = self._last_by_ident.get(text[index:end])
+      if entry is not None and (best is None or entry[0] > best[0]):
+        # The lookahead in Option.atom_parser ensures --ab does not match --abc
+        if not entry[1].ident.startswith('--') or end == len(text) \
+           or text[end] in long_illegal_chars or text.startswith('...', end):
+          best = entry
+      if not text.startswith('--', index) or end == len(text) or text[end] in long_illegal_chars:
+        break
+      end += 1
+    return best[1] if best is not None else None
+
+  def match_shortlist(self, text: str, index: int) -> "Option | None":
+    if index >= len(text):
+      return None
+    return self.get_short_option(text[index])
+
+def option(options: OptionRegistry):
+  @P.Parser  # type: ignore
+  def option_choice(text: str, i: int = 0) -> "P.Value[Option]":
+    o = options.match(text, i)
+    return (o.atom_parser if o is not None else undocumented_option)(text, i)
 
-# Usage parser without the leading "-" to allow parsing "-abc" style option specs
-# Prefix the parse result with a "-" in order to forward the proper identifier to Short()
-usage_shortlist_option = (
-  parsers.char(illegal=short_illegal)
-).parsecmap(lambda n: '-' + n[0]).mark().desc('short option (-a)').parsecmap(lambda n: Option(n, None, short_alias=n))
+  @P.Parser  # type: ignore
+  def shortlist_choice(text: str, i: int = 0) -> "P.Value[Option]":
+    o = options.match_shortlist(text, i)
+    return (o.atom_parser_shortlist if o is not None else usage_shortlist_option)(text, i)
 
+  optional_shortlist_choice = P.optional(shortlist_choice)
 
-def option(options: T.List[Option]):
   @P.generate('option')
   def p() -> helpers.GeneratorParser[T.List[leaves.Option]]:
-    opt = yield reduce(
-      lambda mem, p: p | mem,
-      [o.atom_parser for o in options],
-      usage_long_option | usage_short_option
-    )
-    options.append(opt)
+    opt = yield option_choice
+    options.add(opt)
     opts = [opt]
     # multiple short options can be specified like "-abc".
     # Keep parsing if the previously parsed option does not have an argument
     while not opt.argname:
-      # Recalculate this parser, the definitions change every iteration
-      opt = (yield P.optional(reduce(
-        lambda mem, p: p | mem if p else mem,
-        [o.atom_parser_shortlist for o in options],
-        usage_shortlist_option
-      )))
+      # shortlist_choice looks the option up on every call, options the loop added are matched as well
+      opt = yield optional_shortlist_choice
       if opt is None:
         break
       opts.append(opt)
       if opt not in options:
-        options.append(opt)
+        options.add(opt)
     return opts
   return p
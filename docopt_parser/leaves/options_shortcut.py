@@ -1,8 +1,12 @@
+import parsec as P
+
 from docopt_parser import base
 from docopt_parser.util import parsers
 
 class OptionsShortcut(base.Leaf):
-  pass
+  __slots__ = ()
 
-options_shortcut = parsers.string('options').mark()\
-  .desc('options shortcut').parsecmap(lambda n: OptionsShortcut(n))
+@parsers.lazy
+def options_shortcut() -> "P.Parser[OptionsShortcut]":
+  return parsers.mark(parsers.string('options'))\
+    .desc('options shortcut').parsecmap(lambda n: OptionsShortcut(n))
@@ -8,26 +8,26 @@ from docopt_parser.util import errors, helpers, marks, parsers
 
 @P.generate('short option (-s)')
 def option_line_short() -> helpers.GeneratorParser[T.Tuple[marks.MarkedTuple[str], "marks.MarkedTuple[str] | None"]]:
-  argspec = (parsers.char(' =') >> documented_option_argument).desc('argument')
-  name = yield (parsers.char('-') + parsers.char(illegal=leaves.short_illegal)).parsecmap(helpers.join_string).mark()
-  if (yield P.optional(P.lookahead(parsers.char('=')))) is not None:
+  name = yield parsers.mark(
+    (parsers.char('-') + parsers.char(illegal=leaves.short_illegal)).parsecmap(helpers.join_string)
+  )
+  if (yield has_argument) is not None:
     # Definitely an argument, make sure we fail with "argument expected"
     arg = yield argspec
   else:
-    arg = yield P.optional(argspec)
+    arg = yield optional_argspec
   return (name, arg)
 
 @P.generate('long option (--long)')
 def option_line_long() -> helpers.GeneratorParser[T.Tuple[marks.MarkedTuple[str], "marks.MarkedTuple[str] | None"]]:
-  argspec = (parsers.char(' =') >> documented_option_argument).desc('argument')
-  name = yield (
+  name = yield parsers.mark((
     parsers.string('--') + base.ident(leaves.long_illegal | parsers.char(','))
-  ).parsecmap(helpers.join_string).mark()
-  if (yield P.optional(P.lookahead(parsers.char('=')))) is not None:
+  ).parsecmap(helpers.join_string))
+  if (yield has_argument) is not None:
     # Definitely an argument, make sure we fail with "argument expected"
     arg = yield argspec
   else:
-    arg = yield P.optional(argspec)
+    arg = yield optional_argspec
   return (name, arg)
 
 next_documented_option = parsers.nl + parsers.indent + parsers.char('-')
@@ -35,28 +35,39 @@ terminator = (parsers.nl + parsers.nl) ^ (parsers.nl + P.eof()) ^ next_documente
 default = (
   P.regex(r'\[default: ', re.IGNORECASE) + P.many(parsers.char(illegal='\n]')) + parsers.char(']')  # type: ignore
 ).desc('[default: ]')
-default_value = default.parsecmap(lambda n: n[0][1]).parsecmap(helpers.join_string).mark()
-option_documentation = P.many1(
+default_value = parsers.mark(default.parsecmap(lambda n: n[0][1]).parsecmap(helpers.join_string))
+# Parsed twice, once by default_lookahead and once for real
+option_documentation = parsers.memo('option_documentation', P.many1(
   parsers.char(illegal=default ^ terminator)
-).desc('option documentation').parsecmap(helpers.join_string)
+).desc('option documentation').parsecmap(helpers.join_string))
 documented_option_argument = (
-  leaves.wrapped_arg ^ base.ident(parsers.char(' ,'), starts_with=parsers.char(illegal=parsers.char(' ,-'))).mark()
+  leaves.wrapped_arg
+  ^ parsers.mark(base.ident(parsers.char(' ,'), starts_with=parsers.char(illegal=parsers.char(' ,-'))))
 ).desc('argument')
+argspec = (parsers.char(' =') >> documented_option_argument).desc('argument')
+optional_argspec = P.optional(argspec)
+has_argument = P.optional(P.lookahead(parsers.char('=')))
+option_line = option_line_long | option_line_short
+option_separator = P.unit(
+  P.optional((parsers.string(', ') | parsers.char(' ')) >> P.lookahead(parsers.char('-')))
+)
+at_eol = P.optional(P.lookahead(parsers.eol))
+has_documentation = P.optional(P.lookahead(parsers.char(illegal='\n')))
+doc_separator = (parsers.char(' ') + P.many1(parsers.char(' '))) ^ P.fail_with('at least 2 spaces')  # type: ignore
+default_lookahead = P.lookahead(P.optional(option_documentation) >> P.optional(default_value))
+documentation = parsers.mark(P.optional(
+  P.optional(option_documentation) + P.optional(default) + P.optional(option_documentation)
+).parsecmap(helpers.join_string))
 
 
-def get_option_definition(name: str, options: T.List[leaves.Option]) -> "leaves.Option | None":
-  for o in options:
-    if o.ident == name:
-      return o.definition
-
-def documented_option(options: T.List[leaves.Option]):
+def documented_option(options: leaves.OptionRegistry):
   @P.generate('documented option')
   def p() -> helpers.GeneratorParser[None]:
     short_alias: "marks.MarkedTuple[str] | None" = None
     opts: T.List[T.Tuple[marks.MarkedTuple[str], "marks.MarkedTuple[str] | None"]] = []
     opt_def: "T.Tuple[marks.MarkedTuple[str], marks.MarkedTuple[str] | None] | None" = None
     while True:
-      opt = yield option_line_long | option_line_short
+      opt = yield option_line
       if opt[0][1].startswith('--'):
         # The last long option is the definition
         opt_def = opt
@@ -70,9 +81,7 @@ def documented_option(options: T.List[leaves.Option]):
             marks.Marked(opt[0]))
         short_alias = opt[0]
       opts.append(opt)
-      next_opt = yield P.unit(
-        P.optional((parsers.string(', ') | parsers.char(' ')) >> P.lookahead(parsers.char('-')))
-      )
+      next_opt = yield option_separator
       if next_opt is None:
         break
     opt_def = T.cast(T.Tuple[marks.MarkedTuple[str], "marks.MarkedTuple[str] | None"], opt_def)
@@ -80,51 +89,58 @@ def documented_option(options: T.List[leaves.Option]):
 
     _doc: "marks.MarkedTuple[str] | None" = None
     _default: "marks.MarkedTuple[str] | None" = None
-    if (yield P.optional(P.lookahead(parsers.eol))) is not None:
+    if (yield at_eol) is not None:
       # Consume trailing whitespaces
       yield parsers.whitespaces
-    elif (yield P.optional(P.lookahead(parsers.char(illegal='\n')))) is not None:
-      yield (parsers.char(' ') + P.many1(parsers.char(' '))) ^ P.fail_with('at least 2 spaces')  # type: ignore
-      _default = yield P.lookahead(P.optional(option_documentation) >> P.optional(default_value))
-      _doc = yield P.optional(
-        P.optional(option_documentation) + P.optional(default) + P.optional(option_documentation)
-      ).parsecmap(helpers.join_string).mark()
+    elif (yield has_documentation) is not None:
+      yield doc_separator
+      _default = yield default_lookahead
+      _doc = yield documentation
 
     def_arg = opt_def[1]
     if def_arg is None:
       def_arg = next((o[1] for o in opts if o[1] is not None), None)
     definition = leaves.Option(opt_def[0], def_arg, None, short_alias, _default, _doc)
-    previous_def = get_option_definition(definition.ident, options)
+    previous_def = options.get_definition(definition.ident)
     if previous_def and previous_def.ident == definition.ident:
       raise errors.DocoptParseError(
         f'{definition.ident} has already been specified at {previous_def.mark.start}', definition.mark)
-    options.append(definition)
+    options.add(definition)
 
     for name, arg in opts:
       opt = leaves.Option(name, arg, definition)
-      previous_def = get_option_definition(opt.ident, options)
+      previous_def = options.get_definition(opt.ident)
       if previous_def and previous_def.ident == opt.ident:
         raise errors.DocoptParseError(
           f'{definition.ident} has already been specified at {previous_def.mark.start}', definition.mark)
-      options.append(opt)
+      options.add(opt)
   return p
 
 
+section_title = P.regex(r'[^\n]*options:', re.I)  # type: ignore
+non_option_section_text = P.optional(parsers.text(section_title))
+skip_non_option_section_text = P.optional(non_option_section_text)
+at_eof = P.optional(P.eof().result(True))
+section_start = parsers.whitespaces >> P.optional(parsers.nl + parsers.indent)
+starts_option = P.lookahead(P.optional(parsers.char('-')))
+more_options = P.lookahead(P.optional(next_documented_option))
+option_indent = parsers.nl + P.optional(parsers.indent)
+section_end = P.eof() | parsers.nl
+
 @P.generate('option sections')
-def documented_options() -> helpers.GeneratorParser[T.List[leaves.Option]]:
-  section_title = P.regex(r'[^\n]*options:', re.I)  # type: ignore
-  non_option_section_text = P.optional(parsers.text(section_title))
-  options: T.List[leaves.Option] = []
-  while (yield P.optional(P.eof().result(True))) is None:
-    if (yield P.optional(non_option_section_text)) is not None:
+def documented_options() -> helpers.GeneratorParser[leaves.OptionRegistry]:
+  options = leaves.OptionRegistry()
+  option = documented_option(options)
+  while (yield at_eof) is None:
+    if (yield skip_non_option_section_text) is not None:
       # skip anything non-option related
       continue
     yield section_title
-    yield parsers.whitespaces >> P.optional(parsers.nl + parsers.indent)
-    while (yield P.lookahead(P.optional(parsers.char('-')))) is not None:
-      yield documented_option(options)
-      if (yield P.lookahead(P.optional(next_documented_option))) is None:
+    yield section_start
+    while (yield starts_option) is not None:
+      yield option
+      if (yield more_options) is None:
         break
-      yield parsers.nl + P.optional(parsers.indent)
-    yield P.eof() | parsers.nl
+      yield option_indent
+    yield section_end
   return options
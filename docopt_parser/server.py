@@ -0,0 +1,255 @@
+import asyncio
+import collections
+import concurrent.futures
+import concurrent.futures.process
+import json
+import logging
+import os
+import signal
+import sys
+import time
+import typing as T
+
+from docopt_parser import DocoptError, __name__ as root_name
+from docopt_parser.util.cache import DiskCache, RecordingHandler
+from docopt_parser.util.pipeline import cached_parse_ast, dump_yaml, parse_ast
+from docopt_parser.util.stats import ParseStats
+
+log = logging.getLogger(root_name)
+
+Request = T.Dict[str, T.Any]
+Response = T.Dict[str, T.Any]
+Readline = T.Callable[[], T.Awaitable[bytes]]
+Write = T.Callable[[bytes], T.Awaitable[None]]
+
+# The number of latencies the percentiles in the stats are computed from
+latency_window = 1000
+formats = ('dict', 'yaml', 'repr')
+# The exit code of requests that failed because of a bug or a crashed worker rather than the text (EX_SOFTWARE)
+internal_error = 70
+
+worker_cache: "DiskCache | None" = None
+
+
+def init_worker(cache_dir: "str | None", cache_size: int):
+  # The pool initializer, the CLI checks the cache directory before it starts the workers.
+  # A worker that fails to start would be mistaken for one that crashed while parsing
+  global worker_cache
+  if cache_dir:
+    try:
+      worker_cache = DiskCache(cache_dir, cache_size)
+    except ValueError as e:
+      log.warning(f'Parsing without a cache: {e}')
+  # Warnings are part of the response, don't print them as well
+  log.handlers = [logging.NullHandler()]
+
+
+def handle_request(request: Request) -> Response:
+  # Runs in a worker process, the response only contains plain values so it can be sent back
+  text = request.get('text')
+  format = request.get('format', 'dict')
+  if not isinstance(text, str):
+    return {'error': 'The request has no "text" string', 'exit_code': 2}
+  if format not in formats:
+    return {'error': f'Unknown format "{format}", use one of {", ".join(formats)}', 'exit_code': 2}
+  stats = ParseStats() if request.get('parse_stats') else None
+  packrat = bool(request.get('packrat'))
+  recorder = RecordingHandler()
+  log.addHandler(recorder)
+  try:
+    if worker_cache is not None:
+      ast = cached_parse_ast(text, worker_cache, stats, packrat)
+    else:
+      ast = parse_ast(text, stats, packrat)
+    if format == 'dict':
+      response: Response = {'ast': ast.dict}
+    elif format == 'yaml':
+      response = {'ast': dump_yaml(ast)}
+    else:
+      response = {'ast': repr(ast)}
+  except DocoptError as err:
+    response = {'error': str(err), 'exit_code': err.exit_code}
+  except Exception as err:
+    # e.g. a RecursionError on deeply nested groups, it must not take down the other requests
+    response = {'error': f'Unable to parse: {type(err).__name__}: {err}', 'exit_code': internal_error}
+  finally:
+    log.removeHandler(recorder)
+  response['warnings'] = [message for _, _, message in recorder.records]
+  if stats is not None:
+    response['parse_stats'] = stats.dict
+  return response
+
+
+def handle_requests(requests: T.List[Request]) -> T.List[Response]:
+  # A chunk of the requests of a batch
+  return [handle_request(request) for request in requests]
+
+
+class Server(object):
+  # Answers newline-delimited JSON requests, one JSON response per line:
+  #   {"id": 1, "text": "Usage: ...", "format": "dict"} -> {"id": 1, "ast": {...}, "warnings": [...]}
+  #                                                     -> {"id": 1, "error": "...", "exit_code": 1, "warnings": []}
+  #   {"id": 2, "type": "stats"}                        -> {"id": 2, "stats": {...}}
+  # Requests with "parse_stats": true get the time spent in each phase of the parse, see ParseStats,
+  # "packrat": true memoizes the rules that are tried repeatedly, see parsers.memo()
+  # The id is copied from the request, responses are written as soon as they are ready and may be out of order.
+  # Parsing happens in a pool of worker processes, at most max_pending requests are accepted at a time.
+  # The pool is replaced when one of its workers dies
+  workers: int
+  max_pending: int
+  make_pool: T.Callable[[], concurrent.futures.Executor]
+  pool: concurrent.futures.Executor
+  requests: int
+  errors: int
+  in_flight: int
+  total_latency: float
+  max_latency: float
+  latencies: T.Deque[float]
+  started: float
+  pending: "asyncio.Semaphore | None"
+
+  def __init__(
+    self, workers: int, max_pending: int, cache_dir: "str | None" = None, cache_size: int = 0,
+    make_pool: "T.Callable[[], concurrent.futures.Executor] | None" = None
+  ):
+    self.workers = workers
+    self.max_pending = max_pending
+    self.make_pool = make_pool or (lambda: concurrent.futures.ProcessPoolExecutor(
+      workers, initializer=init_worker, initargs=(cache_dir, cache_size)
+    ))
+    self.pool = self.make_pool()
+    self.requests = 0
+    self.errors = 0
+    self.in_flight = 0
+    self.total_latency = 0.0
+    self.max_latency = 0.0
+    self.latencies = collections.deque(maxlen=latency_window)
+    self.started = time.monotonic()
+    self.pending = None
+
+  def stats(self) -> T.Dict[str, T.Any]:
+    uptime = time.monotonic() - self.started
+    latencies = sorted(self.latencies)
+
+    def percentile(p: float) -> "float | None":
+      return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else None
+    return {
+      'requests': self.requests,
+      'errors': self.errors,
+      'in_flight': self.in_flight,
+      'workers': self.workers,
+      'uptime': uptime,
+      'throughput': self.requests / uptime if uptime > 0 else 0.0,
+      'latency': {
+        'mean': self.total_latency / self.requests if self.requests else None,
+        'p50': percentile(0.5),
+        'p99': percentile(0.99),
+        'max': self.max_latency if self.requests else None,
+      },
+    }
+
+  async def respond(self, line: bytes) -> Response:
+    start = time.perf_counter()
+    request_id = None
+    try:
+      request = json.loads(line)
+      if not isinstance(request, dict):
+        raise ValueError('Requests must be JSON objects')
+      request = T.cast(Request, request)
+      request_id = request.get('id')
+      if request.get('type', 'ast') == 'stats':
+        return {'id': request_id, 'stats': self.stats()}
+      if request.get('type', 'ast') != 'ast':
+        raise ValueError(f'Unknown request type "{request["type"]}"')
+      response = await self.run(request)
+    except ValueError as e:
+      response = {'error': f'Invalid request: {e}', 'exit_code': 2}
+    latency = time.perf_counter() - start
+    self.requests += 1
+    self.errors += 'error' in response
+    self.total_latency += latency
+    self.max_latency = max(self.max_latency, latency)
+    self.latencies.append(latency)
+    return {'id': request_id, **response}
+
+  async def run(self, request: Request) -> Response:
+    pool = self.pool
+    self.in_flight += 1
+    try:
+      return await asyncio.get_running_loop().run_in_executor(pool, handle_request, request)
+    except concurrent.futures.process.BrokenProcessPool as e:
+      # Every request in flight fails with the pool, only the first one replaces it
+      if self.pool is pool:
+        pool.shutdown(wait=False)
+        self.pool = self.make_pool()
+      return {'error': f'The worker parsing the request died: {e}', 'exit_code': internal_error}
+    except Exception as e:
+      return {'error': f'Unable to parse: {type(e).__name__}: {e}', 'exit_code': internal_error}
+    finally:
+      self.in_flight -= 1
+
+  async def handle(self, readline: Readline, write: Write):
+    # Serves the requests of one stream until it ends
+    if self.pending is None:
+      self.pending = asyncio.Semaphore(self.max_pending)
+    pending = self.pending
+    tasks: T.Set[asyncio.Task[None]] = set()
+
+    async def answer(line: bytes):
+      try:
+        await write(json.dumps(await self.respond(line)).encode() + b'\n')
+      finally:
+        pending.release()
+
+    while line := await readline():
+      if not line.strip():
+        continue
+      await pending.acquire()
+      task = asyncio.create_task(answer(line))
+      tasks.add(task)
+      task.add_done_callback(tasks.discard)
+    if tasks:
+      await asyncio.gather(*tasks)
+
+  async def serve_stdio(self):
+    loop = asyncio.get_running_loop()
+    # A thread instead of connect_read_pipe(), stdin may just as well be a regular file
+    reader = concurrent.futures.ThreadPoolExecutor(1)
+
+    async def readline() -> bytes:
+      return await loop.run_in_executor(reader, sys.stdin.buffer.readline)
+
+    async def write(data: bytes):
+      sys.stdout.buffer.write(data)
+      sys.stdout.buffer.flush()
+    try:
+      await self.handle(readline, write)
+    finally:
+      reader.shutdown()
+
+  async def serve_unix(self, path: str):
+    async def connected(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+      async def write(data: bytes):
+        writer.write(data)
+        await writer.drain()
+      try:
+        await self.handle(reader.readline, write)
+      finally:
+        writer.close()
+    server = await asyncio.start_unix_server(connected, path)
+    log.info(f'Listening on {path}')
+    # Stop serving on SIGTERM as well, the socket file should not outlive the server
+    task = asyncio.current_task()
+    assert task is not None
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    try:
+      async with server:
+        await server.serve_forever()
+    except asyncio.CancelledError:
+      pass
+    finally:
+      if os.path.exists(path):
+        os.unlink(path)
+
+  def close(self):
+    self.pool.shutdown()
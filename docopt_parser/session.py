@@ -0,0 +1,210 @@
+import copy
+import typing as T
+import parsec as P
+
+from docopt_parser import base, fast, groups, leaves, usage
+from docopt_parser.fast.options import options_re
+from docopt_parser.util import errors, marks, post_processors
+
+# Everything about a registered option that matching it in the usage section depends on
+OptionSignature = T.Tuple[str, bool, str]
+LineKey = T.Tuple[str, str, T.Tuple[OptionSignature, ...]]
+
+
+def option_signature(option: leaves.Option) -> OptionSignature:
+  return (option.ident, option.argname is not None, option.definition.ident)
+
+
+def clone(node: base.Node, memo: T.Dict[int, base.Node], source: marks.SourceText, delta: int) -> base.Node:
+  # copy.deepcopy() for the nodes of a usage line that also moves them delta characters into source.
+  # Nodes outside of the line are looked up in memo
+  new = memo.get(id(node))
+  if new is None:
+    new = memo[id(node)] = copy.copy(node)
+    new.shift(source, delta)
+    if isinstance(new, base.Group):
+      new.items = [clone(item, memo, source, delta) for item in new.items]
+    elif isinstance(new, leaves.Option):
+      new.definition = T.cast(leaves.Option, clone(new.definition, memo, source, delta))
+  return new
+
+
+def clone_options(options: T.List[leaves.Option], source: marks.SourceText, delta: int) -> T.List[leaves.Option]:
+  memo: T.Dict[int, base.Node] = {}
+  return [T.cast(leaves.Option, clone(option, memo, source, delta)) for option in options]
+
+
+class CachedLine(T.NamedTuple):
+  # A usage line as it was parsed, before post-processing.
+  # The nodes refer to the definitions of registered options outside of the line, references has their indexes in
+  # the registry. When the line is reused they are swapped out for the options at the same index
+  node: base.Node
+  added: T.List[leaves.Option]
+  references: T.List[T.Tuple[leaves.Option, int]]
+  start: int
+  end: int
+
+
+class ParseSession(object):
+  # Parses a help text that is edited over time, e.g. in an editor.
+  # parse() returns the same AST as docopt_parser.parse() would for the current text. Parts of the text that did not
+  # change since the previous parse are not parsed again:
+  # - The documented options, when the text from the first options section onwards is the same
+  # - Usage lines, when their text and the options registered before them are the same
+  # Anything out of the ordinary is handed to docopt_parser.parse()
+  text: marks.SourceText
+  engine: T.Literal['combinator', 'fast']
+  # What the last call to parse() reused and parsed
+  reused_options: bool
+  reused_lines: int
+  parsed_lines: int
+  _options_signature: T.Tuple[OptionSignature, ...]
+  # The text the documented options were parsed from, where it started and the registered options
+  _options: T.Tuple[str, int, T.List[leaves.Option]]
+  _lines: T.Dict[LineKey, CachedLine]
+
+  def __init__(self, text: str = '', engine: T.Literal['combinator', 'fast'] = 'combinator'):
+    if engine not in ('combinator', 'fast'):
+      raise ValueError(f'Unknown parsing engine "{engine}"')
+    self.text = marks.SourceText(text)
+    self.engine = engine
+    self.reused_options = False
+    self.reused_lines = 0
+    self.parsed_lines = 0
+    self._options_signature = ()
+    self._options = ('', 0, [])
+    self._lines = {}
+
+  def edit(self, range: "marks.RangeTuple | T.Tuple[int, int]", replacement: str):
+    # Replaces the text in range, given as offsets or (line, col) locations, with replacement
+    start, end = (pos if isinstance(pos, int) else self.text.offset(pos) for pos in range)
+    if not 0 <= start <= end <= len(self.text):
+      raise ValueError(f'Invalid range {start}-{end} for a text of length {len(self.text)}')
+    self.text = marks.SourceText(self.text[:start] + replacement + self.text[end:])
+
+  def parse(self) -> base.Node:
+    from docopt_parser import parse
+    text = self.text
+    self.reused_options = False
+    self.reused_lines = 0
+    self.parsed_lines = 0
+    try:
+      options = self.documented_options()
+      documented_options = options.copy()
+      root = self.usage(options)
+      options.release_parsers()
+    except (fast.Unsupported, errors.DocoptParseError, P.ParseError):
+      # Produces the error message, or the AST when only the section parser of the fast engine gave up
+      return parse(text, self.engine)
+    return post_processors.post_process_ast(root, documented_options, text)
+
+  def documented_options(self) -> leaves.OptionRegistry:
+    text = self.text
+    # Everything before the line of the first options section title is skipped by the options parser
+    title = options_re.search(text)
+    start = len(text) if title is None else text.rfind('\n', 0, title.start()) + 1
+    options_text, options_start, options = self._options
+    if text[start:] != options_text:
+      if self.engine == 'fast':
+        registry = fast.documented_options(text)
+      else:
+        registry = leaves.documented_options.parse_strict(text)  # type: ignore
+      options_text, options_start, options = text[start:], start, list(registry)
+      self._options = (options_text, options_start, clone_options(options, text, 0))
+      return registry
+    self.reused_options = True
+    return leaves.OptionRegistry(clone_options(options, text, start - options_start))
+
+  def usage(self, options: leaves.OptionRegistry) -> base.Node:
+    signature = tuple(map(option_signature, options))
+    if signature != self._options_signature:
+      # The usage lines are matched against every documented option, none of them can be reused
+      self._options_signature = signature
+      self._lines = {}
+    parser = SessionUsageParser(self, options)
+    root = parser.usage()
+    self._lines = parser.lines
+    return root
+
+
+class SessionUsageParser(fast.UsageParser):
+  # Splits the usage section like the fast engine and parses the usage lines that are not in the cache of the session
+  session: ParseSession
+  lines: T.Dict[LineKey, CachedLine]
+  line_parser: "P.Parser[base.Node] | None"
+  # The registered options in order, their indexes and the signatures of the ones the usage lines registered
+  registry: T.List[leaves.Option]
+  indexes: T.Dict[int, int]
+  signature: T.Tuple[OptionSignature, ...]
+
+  def __init__(self, session: ParseSession, options: leaves.OptionRegistry):
+    super().__init__(session.text, options)
+    self.session = session
+    self.lines = {}
+    if session.engine == 'combinator':
+      # The program name has already been consumed
+      self.line_parser = usage.usage_line('', groups.grammar(options).expr)
+    else:
+      self.line_parser = None
+    self.registry = list(options)
+    self.indexes = {id(o): i for i, o in enumerate(self.registry)}
+    self.signature = ()
+
+  def usage_line(self, pos: int) -> T.Tuple[base.Node, int]:
+    line_end = self.text.find('\n', pos)
+    line_end = len(self.text) if line_end == -1 else line_end + 1
+    line = self.text[pos:line_end]
+    key = (self.prog, line, self.signature)
+    # Wrapped arguments can span lines, whether "<" starts one depends on the text after the line
+    cacheable = '<' not in line or line.rfind('<') < line.rfind('>')
+    cached = (self.session._lines.get(key) or self.lines.get(key)) if cacheable else None
+    if cached is None:
+      node, end = self.parse_line(pos)
+      added = list(self.options)[len(self.registry):]
+      self.register(added)
+      cached = self.cache_line(node, added, pos, end) if cacheable else None
+      if cached is not None:
+        self.lines[key] = cached
+      self.session.parsed_lines += 1
+      return node, end
+    # The registries have the same signature, the options at the same index take each others place
+    memo = {id(option): self.registry[index] for option, index in cached.references}
+    delta = pos - cached.start
+    node = clone(cached.node, memo, self.text, delta)
+    added = [T.cast(leaves.Option, clone(option, memo, self.text, delta)) for option in cached.added]
+    for option in added:
+      self.options.add(option)
+    self.register(added)
+    self.lines[key] = cached
+    self.session.reused_lines += 1
+    return node, cached.end + delta
+
+  def register(self, added: T.List[leaves.Option]):
+    for option in added:
+      self.indexes[id(option)] = len(self.registry)
+      self.registry.append(option)
+    self.signature += tuple(map(option_signature, added))
+
+  def cache_line(self, node: base.Node, added: T.List[leaves.Option], pos: int, end: int) -> "CachedLine | None":
+    nodes: T.Dict[int, base.Node] = {id(o): o for o in added}
+    node.walk(lambda n: nodes.setdefault(id(n), n))
+    # The copy keeps referring to the registered options of this parse
+    references: T.Dict[int, T.Tuple[leaves.Option, int]] = {}
+    for n in nodes.values():
+      if isinstance(n, leaves.Option) and id(n.definition) not in nodes:
+        if id(n.definition) not in self.indexes:
+          return None
+        references[id(n.definition)] = (n.definition, self.indexes[id(n.definition)])
+    memo: T.Dict[int, base.Node] = {key: option for key, (option, _) in references.items()}
+    return CachedLine(
+      clone(node, memo, self.text, 0), [T.cast(leaves.Option, clone(o, memo, self.text, 0)) for o in added],
+      list(references.values()), pos, end
+    )
+
+  def parse_line(self, pos: int) -> T.Tuple[base.Node, int]:
+    if self.line_parser is None:
+      return super().usage_line(pos)
+    res = self.line_parser(self.text, pos)
+    if not res.status or self.text.find('\n', pos, res.index) != -1:
+      raise fast.Unsupported('Usage line spans multiple lines or does not parse')
+    return res.value, res.index
@@ -7,11 +7,10 @@ from docopt_parser.util import helpers, parsers, marks
 
 section_title = P.regex(r'[^\n]*usage:', re.I)  # type: ignore
 non_usage_section_text = P.optional(parsers.text(section_title))
-prog = (
+prog = parsers.mark(
   base.ident(illegal=(parsers.whitespaces1 | parsers.eol))
-  .desc('a program name').parsecmap(helpers.join_string).mark()
-  .parsecmap(lambda n: marks.Marked(n))
-)
+  .desc('a program name').parsecmap(helpers.join_string)
+).parsecmap(lambda n: marks.Marked(n))
 prog_in_usage = (
   non_usage_section_text >> section_title
   >> P.optional(parsers.nl + parsers.indent) >> parsers.whitespaces
@@ -19,7 +18,12 @@ prog_in_usage = (
 )
 
 
-def usage(options: T.List[leaves.Option]):
+def usage(options: leaves.OptionRegistry):
+  expr = groups.grammar(options).expr
+  # Parsed twice for every line, once to look for more lines and once for real
+  next_line = parsers.memo('next_line', parsers.eol + parsers.indent)
+  more_lines = P.lookahead(P.optional(next_line))
+
   @P.generate('usage section')
   def p() -> helpers.GeneratorParser[groups.Choice]:
 
@@ -29,11 +33,11 @@ def usage(options: T.List[leaves.Option]):
     yield P.optional(parsers.nl + parsers.indent)
     prog_name = yield parsers.whitespaces >> P.lookahead(prog)
 
-    next_line = parsers.eol + parsers.indent
+    line = usage_line(prog_name.elm, expr)
     lines: T.List[groups.Choice] = []
     while True:
-      lines.append((yield usage_line(prog_name.elm, options)))
-      if (yield P.lookahead(P.optional(next_line))) is None:
+      lines.append((yield line))
+      if (yield more_lines) is None:
         break
       yield next_line
     end = yield parsers.location
@@ -43,12 +47,12 @@ def usage(options: T.List[leaves.Option]):
   return p
 
 
-def usage_line(prog: str, options: T.List[leaves.Option]):
+empty_usage_line = (
+  P.lookahead(parsers.eol)
+  >> parsers.mark(parsers.whitespaces.parsecmap(lambda _: [])).parsecmap(lambda n: groups.Choice(n))
+)
+
+def usage_line(prog: str, expr: "P.Parser[base.Node]"):
   return parsers.string(prog) >> (
-    (
-      P.lookahead(parsers.eol) >> parsers.whitespaces
-      .parsecmap(lambda _: []).mark().parsecmap(lambda n: groups.Choice(n))
-    ) | (
-      parsers.whitespaces1 >> groups.expr(options)
-    )
+    empty_usage_line | (parsers.whitespaces1 >> expr)
   ) << P.lookahead(parsers.eol)
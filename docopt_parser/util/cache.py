@@ -0,0 +1,228 @@
+from collections import OrderedDict
+import copy
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+import typing as T
+import zlib
+
+from docopt_parser.util.version import package_version
+
+if T.TYPE_CHECKING:
+  from docopt_parser import base
+
+# The serializers (and with them parsec) are imported when the disk cache is used, computing keys needs neither
+
+log = logging.getLogger(__name__)
+
+# A message logged while parsing: logger name, level and message
+Record = T.Tuple[str, int, str]
+# Length of the JSON encoded records that precede the AST in a DiskCache entry
+records_header = struct.Struct('<I')
+
+
+class RecordingHandler(logging.Handler):
+  # Collects the warnings emitted while parsing so they can be replayed on a cache hit
+  def __init__(self):
+    super().__init__(logging.WARNING)
+    self.records: T.List[Record] = []
+
+  def emit(self, record: logging.LogRecord):
+    self.records.append((record.name, record.levelno, record.getMessage()))
+
+
+def replay(records: T.Iterable[Record]):
+  # Logs the warnings of a cached parse again
+  for name, level, message in records:
+    logging.getLogger(name).log(level, message)
+
+
+class CacheEntry(T.NamedTuple):
+  root: "base.Node"
+  # The warnings logged while parsing, see replay()
+  records: T.List[Record]
+
+class CacheInfo(T.NamedTuple):
+  hits: int
+  misses: int
+  evictions: int
+  maxsize: int
+  currsize: int
+
+class ParseCache(object):
+  # LRU cache of post-processed ASTs, keyed by the text and the library version.
+  # The post processors mutate nodes in place, so the cache only ever hands out deep copies of its entries
+  maxsize: int
+  hits: int
+  misses: int
+  evictions: int
+  _entries: "OrderedDict[str, CacheEntry]"
+
+  def __init__(self, maxsize: int = 128):
+    if maxsize < 1:
+      raise ValueError('The maximum size of a parse cache must be at least 1')
+    self.maxsize = maxsize
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  @staticmethod
+  def key(text: str, positions: bool = True) -> str:
+    return hashlib.sha256(f'{package_version()}\0{positions:d}\0{text}'.encode()).hexdigest()
+
+  def get(self, text: str, positions: bool = True) -> "CacheEntry | None":
+    key = self.key(text, positions)
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        self.misses += 1
+        return None
+      self._entries.move_to_end(key)
+      self.hits += 1
+    return CacheEntry(copy.deepcopy(entry.root), entry.records)
+
+  def put(self, text: str, root: "base.Node", positions: bool = True, records: T.Sequence[Record] = ()):
+    key = self.key(text, positions)
+    snapshot = CacheEntry(copy.deepcopy(root), list(records))
+    with self._lock:
+      self._entries[key] = snapshot
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.maxsize:
+        self._entries.popitem(last=False)
+        self.evictions += 1
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self.hits = 0
+      self.misses = 0
+      self.evictions = 0
+
+  def info(self) -> CacheInfo:
+    with self._lock:
+      return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._entries))
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+class DiskCache(object):
+  # Size bounded cache of ASTs and the messages logged while parsing them in a directory, keyed like ParseCache.
+  # ASTs are stored with dumps_binary() rather than pickled, the directory may be shared with other users.
+  # Entries are written to a temporary file and then renamed, so concurrent processes can share the directory.
+  # Eviction removes the least recently used entries (by mtime) once the total size exceeds max_bytes.
+  # The cache is best-effort, entries that cannot be read are misses and failed writes are logged and dropped
+  suffix = '.ast'
+  temp_prefix = '.tmp-'
+  # Temporary files that have not been renamed after this many seconds were left behind by a writer that crashed
+  temp_seconds = 60.0
+  directory: str
+  max_bytes: int
+
+  def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024):
+    if max_bytes < 1:
+      raise ValueError('The maximum size of a disk cache must be at least 1 byte')
+    self.directory = directory
+    self.max_bytes = max_bytes
+    try:
+      os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+      raise ValueError(f'Unable to use {directory} as the cache directory: {e.strerror}') from e
+    if not os.access(directory, os.W_OK | os.X_OK):
+      raise ValueError(f'Unable to use {directory} as the cache directory: It is not writable')
+
+  def path(self, text: str) -> str:
+    return os.path.join(self.directory, ParseCache.key(text) + self.suffix)
+
+  def get(self, text: str) -> "CacheEntry | None":
+    path = self.path(text)
+    try:
+      with open(path, 'rb') as fh:
+        data = zlib.decompress(fh.read())
+      size, = records_header.unpack_from(data)
+      start = records_header.size
+      records = [
+        (str(name), int(level), str(message))
+        for name, level, message in json.loads(data[start:start + size].decode())
+      ]
+      from docopt_parser.util.serialize import loads_binary
+      entry = CacheEntry(loads_binary(memoryview(data)[start + size:]), records)
+    except OSError:
+      # Missing, or e.g. written by another user with a umask that does not allow reading it
+      return None
+    except (ValueError, TypeError, zlib.error, struct.error):
+      # Truncated or written by an incompatible version, treat it as a miss
+      self._remove(path)
+      return None
+    try:
+      os.utime(path)
+    except OSError:
+      pass
+    return entry
+
+  def put(self, text: str, root: "base.Node", records: T.Sequence[Record] = ()):
+    from docopt_parser.util.serialize import dumps_binary
+    encoded_records = json.dumps(list(records)).encode()
+    data = zlib.compress(records_header.pack(len(encoded_records)) + encoded_records + dumps_binary(root))
+    tmp_path: "str | None" = None
+    try:
+      fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=self.temp_prefix)
+      with os.fdopen(fd, 'wb') as fh:
+        fh.write(data)
+      os.replace(tmp_path, self.path(text))
+      self.evict()
+    except BaseException as e:
+      if tmp_path is not None:
+        self._remove(tmp_path)
+      if not isinstance(e, OSError):
+        raise
+      # e.g. the disk is full or the directory was removed, the AST has been parsed all the same
+      log.warning(f'Unable to write to the cache directory {self.directory}: {e.strerror}')
+
+  def entries(self) -> T.List[T.Tuple[float, int, str]]:
+    # The cache entries and the temporary files left behind by crashed writers, which are older than any entry
+    # written since and are evicted first
+    entries: T.List[T.Tuple[float, int, str]] = []
+    stale = time.time() - self.temp_seconds
+    with os.scandir(self.directory) as it:
+      for entry in it:
+        is_temp = entry.name.startswith(self.temp_prefix)
+        if not is_temp and not entry.name.endswith(self.suffix):
+          continue
+        try:
+          stat = entry.stat()
+        except FileNotFoundError:
+          continue
+        if is_temp and stat.st_mtime > stale:
+          # Still being written
+          continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+  def evict(self):
+    entries = self.entries()
+    size = sum(entry[1] for entry in entries)
+    for _mtime, entry_size, path in sorted(entries):
+      if size <= self.max_bytes:
+        break
+      # Another process may already have removed it
+      self._remove(path)
+      size -= entry_size
+
+  def clear(self):
+    for _mtime, _size, path in self.entries():
+      self._remove(path)
+
+  @staticmethod
+  def _remove(path: str):
+    try:
+      os.unlink(path)
+    except OSError:
+      # Another process may already have removed it, or it belongs to another user
+      pass
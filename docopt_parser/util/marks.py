@@ -1,22 +1,126 @@
+from bisect import bisect_right
 from dataclasses import dataclass
+import re
 import typing as T
-from functools import total_ordering
+from functools import cached_property, total_ordering
 
 from docopt_parser.util import errors
 
+if T.TYPE_CHECKING:
+  from docopt_parser.util.parsers import Packrat
+
 _T = T.TypeVar('_T')
-LocInfo = T.Tuple[int, int]
+LocInfo = T.Union[T.Tuple[int, int], "Offset"]
 RangeTuple = T.Tuple[LocInfo, LocInfo]
 MarkedTuple = T.Tuple[LocInfo, _T, LocInfo]
 
+class SourceText(str):
+  # The text that is being parsed, indexed by the offset of each line.
+  # Converting between offsets and (line, col) is a binary search instead of a scan of the text.
+  # The parsers mark nodes with positions in the text, which are resolved to (line, col) only when needed.
+  # With positions=False no positions are tracked at all and everything is marked with the untracked position
+  positions: bool
+  # Results of the memoized rules while it is parsed with parse(text, packrat=True), see parsers.memo()
+  packrat: "Packrat | None" = None
+
+  def __new__(cls, text: str, positions: bool = True):
+    source = super().__new__(cls, text)
+    source.positions = positions
+    return source
+
+  @staticmethod
+  def wrap(text: "str | SourceText", positions: "bool | None" = None) -> "SourceText":
+    if isinstance(text, SourceText) and positions in (None, text.positions):
+      return text
+    return SourceText(text, positions is not False)
+
+  def __reduce__(self):
+    return (SourceText, (str(self), self.positions))
+
+  # The text is immutable, copies of ASTs share it
+  def __copy__(self):
+    return self
+
+  def __deepcopy__(self, memo: T.Dict[int, T.Any]):
+    return self
+
+  @cached_property
+  def line_offsets(self) -> T.List[int]:
+    return [0] + [m.end() for m in re.finditer('\n', self)]
+
+  @cached_property
+  def lines(self) -> T.List[str]:
+    return str(self).split('\n')
+
+  def position(self, index: int) -> LocInfo:
+    return Offset(self, index) if self.positions else untracked
+
+  def loc_info(self, index: int) -> T.Tuple[int, int]:
+    if index > len(self):
+      raise ValueError('Invalid index.')
+    line = bisect_right(self.line_offsets, index) - 1
+    return (line, index - self.line_offsets[line])
+
+  def offset(self, loc: LocInfo) -> int:
+    return self.line_offsets[loc[0]] + loc[1]
+
+class Offset(object):
+  # A position in a SourceText, usable wherever a LocInfo is expected.
+  # Resolves to (line, col) when indexed or compared
+  __slots__ = ('source', 'index')
+  source: SourceText
+  index: int
+
+  def __init__(self, source: SourceText, index: int):
+    self.source = source
+    self.index = index
+
+  def loc_info(self) -> T.Tuple[int, int]:
+    return self.source.loc_info(self.index)
+
+  def __getitem__(self, key: int) -> int:
+    return self.loc_info()[key]
+
+  def __iter__(self) -> T.Iterator[int]:
+    return iter(self.loc_info())
+
+  def __len__(self) -> int:
+    return 2
+
+  def __eq__(self, other: object) -> bool:
+    if isinstance(other, Offset) and other.source is self.source:
+      return self.index == other.index
+    return isinstance(other, (Offset, tuple)) and self.loc_info() == tuple(other)  # type: ignore
+
+  def __hash__(self) -> int:
+    return hash(self.loc_info())
+
+  def __repr__(self):
+    return repr(self.loc_info())
+
+# The position of everything that is parsed with positions=False
+untracked: LocInfo = (0, 0)
+
+def split_lines(text: T.List[str] | str) -> T.List[str]:
+  if isinstance(text, list):
+    return text
+  if isinstance(text, SourceText):
+    return text.lines
+  return text.split('\n')
+
 class ByteCount(int):
+  __slots__ = ()
 
   def show(self, text: T.List[str] | str, message: str | None = None):
-    lines = text if isinstance(text, list) else text.split('\n')
+    if isinstance(text, SourceText):
+      return self.to_location(text).show(text, message)
+    lines = split_lines(text)
     return self.to_location(lines).show(lines, message)
 
   def to_location(self, text: T.List[str] | str) -> "Location":
-    lines = text if isinstance(text, list) else text.split('\n')
+    if isinstance(text, SourceText) and self <= len(text):
+      return Location(text.loc_info(self))
+    lines = split_lines(text)
     count = self
     for line_no, line in enumerate(lines):
       length = len(line) + 1
@@ -27,6 +131,8 @@ class ByteCount(int):
 
 # All text editors use 1 indexed lines, so we simply subclass int for linenumbers
 class LineNumber(int):
+  __slots__ = ()
+
   def __str__(self):
     return str(self + 1)
 
@@ -34,7 +140,7 @@ class LineNumber(int):
     return str(self + 1)
 
   def show(self, text: "T.List[str] | str"):
-    lines = text if isinstance(text, list) else text.split('\n')
+    lines = split_lines(text)
     return f'{(self + 1):02d} {lines[self]}'
 
   @property
@@ -44,11 +150,15 @@ class LineNumber(int):
 @total_ordering
 @dataclass(frozen=True, init=False, eq=False, repr=False)
 class Location:
+  # The mark classes are frozen and have no __dict__, __reduce__ recreates them through the constructor
+  __slots__ = ('line', 'col')
   line: LineNumber
   col: int
 
   def __init__(self, loc: LocInfo):
     super().__init__()
+    if isinstance(loc, Offset):
+      loc = loc.loc_info()
     object.__setattr__(self, 'line', LineNumber(loc[0]))
     object.__setattr__(self, 'col', loc[1])
 
@@ -63,11 +173,16 @@ class Location:
   def __repr__(self):
     return f'{self.line}:{self.col}'
 
+  def __reduce__(self):
+    return (Location, ((int(self.line), self.col),))
+
   def to_tuple(self):
     return (self.line, self.col)
 
   def to_bytecount(self, text: "T.List[str] | str") -> int:
-    lines = text if isinstance(text, list) else text.split('\n')
+    if isinstance(text, SourceText):
+      return text.offset((self.line, self.col))
+    lines = split_lines(text)
     return sum(len(line) for line in lines[0:self.line]) + self.line + self.col
 
   def show(self, text: "T.List[str] | str", message: "str | None" = None):
@@ -75,45 +190,93 @@ class Location:
     col_offset = ' ' * (self.col + self.line.prefix_length)
     return f'{self.line.show(text)}\n{col_offset}^{message}'
 
+untracked_location = Location(untracked)
+
 @total_ordering
-@dataclass(frozen=True, eq=False)
+@dataclass(frozen=True, eq=False, repr=False, init=False)
 class Range:
-  start: Location
-  end: Location
+  # Ranges of positions in a SourceText keep the source and two offsets, start and end are resolved when accessed.
+  # Ranges of (line, col) tuples keep the resolved locations
+  __slots__ = ('_source', '_start', '_end')
+  _source: "SourceText | None"
+  _start: "int | Location"
+  _end: "int | Location"
 
   def __init__(self, range: RangeTuple):
     super().__init__()
-    object.__setattr__(self, 'start', Location(range[0]))
-    object.__setattr__(self, 'end', Location(range[1]))
+    start, end = range
+    if isinstance(start, Offset) and isinstance(end, Offset) and start.source is end.source:
+      object.__setattr__(self, '_source', start.source)
+      object.__setattr__(self, '_start', start.index)
+      object.__setattr__(self, '_end', end.index)
+    else:
+      object.__setattr__(self, '_source', None)
+      object.__setattr__(self, '_start', untracked_location if start is untracked else Location(start))
+      object.__setattr__(self, '_end', untracked_location if end is untracked else Location(end))
+
+  @property
+  def start(self) -> "Location":
+    if self._source is None:
+      return T.cast(Location, self._start)
+    return Location(self._source.loc_info(T.cast(int, self._start)))
+
+  @property
+  def end(self) -> "Location":
+    if self._source is None:
+      return T.cast(Location, self._end)
+    return Location(self._source.loc_info(T.cast(int, self._end)))
 
   def __eq__(self, other: object):
+    if isinstance(other, Range) and self._source is not None and other._source is self._source:
+      return self._start == other._start and self._end == other._end
     return isinstance(other, Range) and self.start == other.start and self.end == other.end
 
   def __lt__(self, other: object):
     if not isinstance(other, Range):
       raise Exception(f'Unable to compare <Location> with <{type(other)}>')
+    if self._source is not None and other._source is self._source:
+      return T.cast(T.Tuple[int, int], (self._start, self._end)) < (other._start, other._end)
     return self.start < other.start or (self.start == other.start and self.end < other.end)
 
   def __repr__(self):
     return f'{self.start}-{self.end}'
 
+  def __reduce__(self):
+    return (Range, (self.to_range_tuple(),))
+
   def to_bytecount(self, text: "T.List[str] | str") -> T.Tuple[int, int]:
-    lines = text if isinstance(text, list) else text.split('\n')
+    if self._source is not None and text is self._source:
+      return (T.cast(int, self._start), T.cast(int, self._end))
+    lines = text if isinstance(text, SourceText) else split_lines(text)
     return (self.start.to_bytecount(lines), self.end.to_bytecount(lines))
 
   def wrap_element(self, elm: _T) -> "Marked[_T]":
-    return Marked(((self.start.line, self.start.col), elm, (self.end.line, self.end.col)))
+    return Marked(self << elm)
 
   def to_range_tuple(self) -> RangeTuple:
-    return ((self.start.line, self.start.col), (self.end.line, self.end.col))
+    # Positions in a SourceText stay unresolved
+    if self._source is not None:
+      return (Offset(self._source, T.cast(int, self._start)), Offset(self._source, T.cast(int, self._end)))
+    start, end = T.cast(Location, self._start), T.cast(Location, self._end)
+    return ((int(start.line), start.col), (int(end.line), end.col))
 
   def __lshift__(self, other: _T) -> MarkedTuple[_T]:
     # Returns a MarkedTuple with other as the element
-    return ((self.start.line, self.start.col), other, (self.end.line, self.end.col))
+    start, end = self.to_range_tuple()
+    return (start, other, end)
+
+  def shift(self, source: SourceText, delta: int) -> "Range":
+    # The same range, delta characters further into source. Used when reusing nodes parsed from an earlier text
+    return Range(self._shifted_range_tuple(source, delta))
+
+  def _shifted_range_tuple(self, source: SourceText, delta: int) -> RangeTuple:
+    if self._source is None:
+      raise ValueError('Only ranges in a SourceText can be shifted')
+    return (Offset(source, T.cast(int, self._start) + delta), Offset(source, T.cast(int, self._end) + delta))
 
 
   def show(self, text: str, message: "str | None" = None):
-    lines = text.split('\n')
+    lines = split_lines(text)
     start = Location((self.start.line, self.start.col))
     end = Location((self.end.line, self.end.col))
     # If "end" is at column 0 on a new line,
@@ -138,10 +301,29 @@ class Range:
       end_col_offset = ' ' * (end.col + end.line.prefix_length)
       return f'{start_col_offset}V\n{all_lines}\n{end_col_offset}^'
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False, repr=False, init=False)
 class Marked(Range, T.Generic[_T]):
+  __slots__ = ('elm',)
   elm: _T
 
   def __init__(self, mark: MarkedTuple[_T]):
     super().__init__((mark[0], mark[2]))
     object.__setattr__(self, 'elm', mark[1])
+
+  def __eq__(self, other: object):
+    # Same as the __eq__ a dataclass would generate
+    if type(other) is not type(self):
+      return NotImplemented
+    return super().__eq__(other) and self.elm == T.cast(Marked[_T], other).elm
+
+  __hash__ = None  # type: ignore
+
+  def __repr__(self):
+    return f'Marked(start={self.start!r}, end={self.end!r}, elm={self.elm!r})'
+
+  def __reduce__(self):
+    return (Marked, (self << self.elm,))
+
+  def shift(self, source: SourceText, delta: int) -> "Marked[_T]":
+    start, end = self._shifted_range_tuple(source, delta)
+    return Marked((start, self.elm, end))
@@ -4,7 +4,61 @@ import parsec as P
 from docopt_parser.util import helpers
 from docopt_parser.util import errors, marks
 
-any_char = P.regex(r'.|\n').desc('any char')  # type: ignore
+_T = T.TypeVar('_T')
+
+def lazy(build: T.Callable[[], "P.Parser[_T]"]) -> "P.Parser[_T]":
+  '''Builds the parser returned by build() when it is first used.
+  Keeps module level parsers from being built when docopt_parser is imported'''
+  built: "P.Parser[_T] | None" = None
+
+  @P.Parser  # type: ignore
+  def lazy_parser(text: str, index: int = 0) -> "P.Value[_T]":
+    nonlocal built
+    if built is None:
+      built = build()
+      # Later calls go straight to the built parser
+      lazy_parser.fn = built.fn
+    return built(text, index)
+  return lazy_parser
+
+class Packrat(object):
+  '''Results of the parsers made with memo() by rule and index, repeated attempts at the same index are looked up.
+  Rules are memoized by name, a memoized parser must only depend on the text'''
+  results: T.Dict[T.Tuple[str, int], "P.Value[T.Any]"]
+  hits: T.Dict[str, int]
+  misses: T.Dict[str, int]
+
+  def __init__(self):
+    self.results = {}
+    self.hits = {}
+    self.misses = {}
+
+  def rates(self) -> T.Dict[str, T.Tuple[int, int]]:
+    # (hits, calls) per rule
+    return {rule: (self.hits.get(rule, 0), self.hits.get(rule, 0) + misses) for rule, misses in self.misses.items()}
+
+def memo(rule: str, p: "P.Parser[_T]") -> "P.Parser[_T]":
+  '''Memoizes p when the text is parsed with a Packrat (see marks.SourceText), p is called directly otherwise.
+  Only for parsers whose results are immutable, the same result is handed out for every attempt'''
+  @P.Parser  # type: ignore
+  def memo_parser(text: str, index: int = 0) -> "P.Value[_T]":
+    packrat: "Packrat | None" = getattr(text, 'packrat', None)
+    if packrat is None:
+      return p(text, index)
+    key = (rule, index)
+    res = packrat.results.get(key)
+    if res is None:
+      res = packrat.results[key] = p(text, index)
+      packrat.misses[rule] = packrat.misses.get(rule, 0) + 1
+    else:
+      packrat.hits[rule] = packrat.hits.get(rule, 0) + 1
+    return res
+  return memo_parser
+
+@lazy
+def any_char() -> "P.Parser[str]":
+  return P.regex(r'.|\n').desc('any char')  # type: ignore
+
 def char(legal: "str | P.Parser[str]" = any_char, illegal: "P.Parser[T.Any] | str | None" = None) -> "P.Parser[str]":
   if isinstance(legal, str):
     desc = ''
@@ -28,8 +82,23 @@ def char(legal: "str | P.Parser[str]" = any_char, illegal: "P.Parser[T.Any] | st
   else:
     return a
 
+def loc_info(text: str, index: int) -> marks.LocInfo:
+  if isinstance(text, marks.SourceText):
+    return text.position(index)
+  return P.ParseError.loc_info(text, index)  # type: ignore
+
+def mark(p: "P.Parser[_T]") -> "P.Parser[marks.MarkedTuple[_T]]":
+  '''Marks the result of p with its location, positions in a SourceText are resolved lazily'''
+  @P.Parser  # type: ignore
+  def mark_parser(text: str, index: int = 0) -> "P.Value[marks.MarkedTuple[_T]]":
+    res = p(text, index)
+    if not res.status:
+      return res
+    return P.Value.success(res.index, (loc_info(text, index), res.value, loc_info(text, res.index)))  # type: ignore
+  return mark_parser
+
 def text(illegal: "P.Parser[T.Any] | str | None"):
-  return P.many1(char(illegal=illegal)).desc('Text').parsecmap(helpers.join_string).mark()
+  return mark(P.many1(char(illegal=illegal)).desc('Text').parsecmap(helpers.join_string))
 
 def string(s: str) -> "P.Parser[str]":
   '''Parses a string.'''
@@ -45,7 +114,7 @@ def string(s: str) -> "P.Parser[str]":
 @P.Parser  # type: ignore
 def location(text: str, index: int = 0) -> "P.Value[marks.LocInfo]":
   '''Returns the current location of the parser'''
-  return P.Value.success(index, P.ParseError.loc_info(text, index))  # type: ignore
+  return P.Value.success(index, loc_info(text, index))  # type: ignore
 
 def throw(message: str) -> "P.Parser[None]":
   @P.Parser  # type: ignore
@@ -54,19 +123,42 @@ def throw(message: str) -> "P.Parser[None]":
     raise errors.DocoptParseError(message, marks.ByteCount(index))
   return throw_parser
 
-nl = char('\n')
-whitespaces1 = P.many1(char(' \t', nl)).parsecmap(helpers.join_string).desc('<whitespace>')
-whitespaces = P.optional(whitespaces1)
-eol = (whitespaces + (nl | P.eof())).desc('<end of line>')
-indent = (P.many1(char(' ')) | char('\t')).parsecmap(helpers.join_string).desc('<indent> (spaces or tabs)')
-either = char('|').desc('<pipe> (|)')
-ellipsis = string('...').desc('ellipsis (...)')
-# \t -> Tab
-# \n -> Newline
-# \r -> Carriage return
-# \b -> Backspace
-# \f -> Form feed
-# \x1B -> ESC
-# \x07 -> BEL
-# \0 -> NUL
-non_symbol_chars = char('|()[] \t\n\r\b\f\x1B\x07\0') | P.eof() | ellipsis
+@lazy
+def nl() -> "P.Parser[str]":
+  return char('\n')
+
+@lazy
+def whitespaces1() -> "P.Parser[str]":
+  return P.many1(char(' \t', nl)).parsecmap(helpers.join_string).desc('<whitespace>')
+
+@lazy
+def whitespaces() -> "P.Parser[str | None]":
+  return P.optional(whitespaces1)
+
+@lazy
+def eol() -> "P.Parser[T.Any]":
+  return (whitespaces + (nl | P.eof())).desc('<end of line>')
+
+@lazy
+def indent() -> "P.Parser[str]":
+  return (P.many1(char(' ')) | char('\t')).parsecmap(helpers.join_string).desc('<indent> (spaces or tabs)')
+
+@lazy
+def either() -> "P.Parser[str]":
+  return char('|').desc('<pipe> (|)')
+
+@lazy
+def ellipsis() -> "P.Parser[str]":
+  return string('...').desc('ellipsis (...)')
+
+@lazy
+def non_symbol_chars() -> "P.Parser[T.Any]":
+  # \t -> Tab
+  # \n -> Newline
+  # \r -> Carriage return
+  # \b -> Backspace
+  # \f -> Form feed
+  # \x1B -> ESC
+  # \x07 -> BEL
+  # \0 -> NUL
+  return char('|()[] \t\n\r\b\f\x1B\x07\0') | P.eof() | ellipsis
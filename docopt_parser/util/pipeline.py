@@ -0,0 +1,50 @@
+import logging
+import typing as T
+
+from docopt_parser import parse, __name__ as root_name
+
+if T.TYPE_CHECKING:
+  from docopt_parser import Node
+  from docopt_parser.util.cache import DiskCache
+  from docopt_parser.util.stats import ParseStats
+
+# What the CLI and the server do with a text: parse it, post-process the AST the same way and cache it.
+# yaml, the cache and the post-processors are imported when they are used
+log = logging.getLogger(root_name)
+
+
+def dump_yaml(ast: "Node") -> str:
+  import yaml
+  # The C implementation is a lot faster, it is only available when PyYAML was built with libyaml
+  dumper = getattr(yaml, 'CDumper', yaml.Dumper)
+  return yaml.dump(ast.dict, sort_keys=False, Dumper=dumper)
+
+
+def parse_ast(text: str, stats: "ParseStats | None" = None, packrat: bool = False) -> "Node":
+  from docopt_parser.util.post_processors import collapse_groups, merge_identical_groups, merge_identical_leaves
+  from docopt_parser.util.stats import run_phase
+  phase = stats.phase if stats is not None else run_phase
+  ast = parse(text, stats=stats, packrat=packrat)
+  ast = phase('merge_identical_leaves(ignore_option_args)', merge_identical_leaves, ast, True)
+  ast = phase('merge_identical_groups', merge_identical_groups, ast)
+  return phase('collapse_groups', collapse_groups, ast)
+
+
+def cached_parse_ast(
+  text: str, cache: "DiskCache", stats: "ParseStats | None" = None, packrat: bool = False
+) -> "Node":
+  from docopt_parser.util.cache import RecordingHandler, replay
+  entry = cache.get(text)
+  if entry is not None:
+    if stats is not None:
+      stats.cached = True
+    replay(entry.records)
+    return entry.root
+  recorder = RecordingHandler()
+  log.addHandler(recorder)
+  try:
+    ast = parse_ast(text, stats, packrat)
+  finally:
+    log.removeHandler(recorder)
+  cache.put(text, ast, recorder.records)
+  return ast
@@ -3,29 +3,35 @@ from ordered_set import OrderedSet
 import logging
 
 from docopt_parser import base, leaves, groups
-from docopt_parser.util.marks import Range
+from docopt_parser.util import marks
+from docopt_parser.util.stats import run_phase
+
+if T.TYPE_CHECKING:
+  from docopt_parser.util.stats import ParseStats
 
 log = logging.getLogger(__name__)
 TNode = T.TypeVar('TNode', bound=base.Node)
 
 
-def post_process_ast(root: base.Group, documented_options: T.List[leaves.Option], text: str):
+def post_process_ast(
+  root: base.Group, documented_options: T.Iterable[leaves.Option], text: str, stats: "ParseStats | None" = None
+):
   # TODO:
   # Find unreachable lines, e.g.:
   #   Usage:
   #     prog ARG
   #     prog cmd <--
   # TODO: Merge nested Repeatables with only one child
-  populate_shortcuts(root, documented_options, text)
-  # print(new_root)
-  new_root = convert_root_to_optional_on_empty_lines(root)
-  new_root = collapse_groups(new_root)
-  mark_multiple(new_root)
-  merge_identical_leaves(new_root)
+  phase = stats.phase if stats is not None else run_phase
+  phase('populate_shortcuts', populate_shortcuts, root, documented_options, text)
+  new_root = phase('convert_root_to_optional_on_empty_lines', convert_root_to_optional_on_empty_lines, root)
+  new_root = phase('collapse_groups', collapse_groups, new_root)
+  phase('mark_multiple', mark_multiple, new_root)
+  phase('merge_identical_leaves', merge_identical_leaves, new_root)
   return new_root
 
 
-def populate_shortcuts(root: base.Group, documented_options: T.List[leaves.Option], text: str) -> None:
+def populate_shortcuts(root: base.Group, documented_options: T.Iterable[leaves.Option], text: str) -> None:
   # Option shortcuts contain to all documented options except the ones
   # that are explicitly mentioned in the usage section
 
@@ -47,7 +53,11 @@ def populate_shortcuts(root: base.Group, documented_options: T.List[leaves.Optio
 
   unused_options = OrderedSet((o.definition for o in documented_options)) - OrderedSet(root.reduce(get_opts, []))
   for option in unused_options:
-    log.warning(option.mark.show(text, f'{option.ident} is not referenced from the usage section'))
+    message = f'{option.ident} is not referenced from the usage section'
+    if isinstance(text, marks.SourceText) and not text.positions:
+      log.warning(message)
+    else:
+      log.warning(option.mark.show(text, message))
 
 
 def convert_root_to_optional_on_empty_lines(root: base.Group) -> base.Group:
@@ -76,156 +86,109 @@ def convert_root_to_optional_on_empty_lines(root: base.Group) -> base.Group:
 
 
 def collapse_groups(root: base.Node) -> base.Node:
-  changed = True
+  # Normalizes the groups in a single post-order traversal where every node is visited once:
+  #   (A) -> A
+  #   A [] B () -> A B
+  #   A (B) C -> A B C      (choices and sequences with one item)
+  #   A (B C) -> A B C
+  #   [A [B [C]]] -> [A B C]
+  #   A|(B|C) -> A|B|C
+  #   (A...)... -> A...
+  #   A|A -> A
+  # Nested groups of the same type are left in place until the outermost one is known and then
+  # flattened in one go, so no item is copied more than once.
+  # Choices are deduplicated at that point as well, which is when applying the rules above
+  # repeatedly would do it, and dissolved if only one item remains
   root_mark = root.mark
-
-  # A [] B () -> A B
-  def remove_empty_groups(node: TNode) -> "TNode | None":
-    nonlocal changed
-    if isinstance(node, base.Group) and len(node.items) == 0:
-      changed = True
-      # print(inspect.stack()[0].function)
-      return None
+  mergeable = (groups.Choice, groups.Sequence, groups.Optional)
+
+  def flatten(node: base.Group, items: T.List[base.Node]):
+    for item in node.items:
+      if type(item) is type(node):
+        flatten(item, items)
+      else:
+        items.append(item)
+
+  def finalize(node: base.Node) -> base.Node:
+    if not isinstance(node, mergeable):
+      return node
+    items: T.List[base.Node] = []
+    flatten(node, items)
+    if isinstance(node, groups.Choice):
+      items = remove_same_choice(items)
+      if len(items) == 1:
+        items[0].mark = node.mark
+        return items[0]
+    node.items = items
     return node
 
-  # A (B) C -> A B C
-  def remove_intermediate_groups_with_one_item(node: base.Node) -> base.Node:
-    nonlocal changed
-    if isinstance(node, (groups.Choice, groups.Sequence)) and len(node.items) == 1:
-      changed = True
-      # print(inspect.stack()[0].function)
-      node.items[0].mark = node.mark
+  def normalize(node: base.Node) -> "base.Node | None":
+    if not isinstance(node, base.Group):
+      return node
+    items = [item for item in map(normalize, node.items) if item is not None]
+    if len(items) == 0:
+      return None
+    if isinstance(node, (groups.Group, groups.Choice, groups.Sequence)) and len(items) == 1:
+      items[0].mark = node.mark
+      return items[0]
+    if isinstance(node, mergeable):
+      # Nested groups of the same type are merged into this one by finalize()
+      node.items = [item if type(item) is type(node) else finalize(item) for item in items]
+    else:
+      node.items = list(map(finalize, items))
+    if isinstance(node, groups.Repeatable) and isinstance(node.items[0], groups.Repeatable):
       return node.items[0]
     return node
 
-  # A (B C) -> A B C
-  def merge_nested_sequences(node: base.Node):
-    nonlocal changed
-    if isinstance(node, groups.Sequence):
-      new_items: T.List[base.Node] = []
-      for item in node.items:
-        if isinstance(item, groups.Sequence):
-          changed = True
-          new_items += item.items
-        else:
-          new_items.append(item)
-      node.items = new_items
-
-  # [A [B [C]]] -> [A B C]
-  def merge_nested_optionals(node: base.Node):
-    nonlocal changed
-    if isinstance(node, groups.Optional):
-      new_items: T.List[base.Node] = []
-      for item in node.items:
-        if isinstance(item, groups.Optional):
-          changed = True
-          new_items += item.items
-        else:
-          new_items.append(item)
-      node.items = new_items
-
-  # (A) -> A
-  # Must run after remove_root_sequence_in_optionals so that [(a b c)] does not become [a b c]
-  def dissolve_groups(node: base.Node) -> base.Node:
-    nonlocal changed
-    if isinstance(node, groups.Group):
-      changed = True
-      # print(inspect.stack()[0].function)
-      assert len(node.items) == 1
-      node.items[0].mark = node.mark
-      return node.items[0]
-    return node
-
-  # (A B C) (D E F) -> A B C D E F
-  def merge_neighboring_sequences(node: base.Node):
-    nonlocal changed
-    new_items: T.List[base.Node] = []
-    if isinstance(node, groups.Sequence):
-      new_items: T.List[base.Node] = []
-      # Go through the list pairwise, have each element be "left" once
-      item_list = iter(node.items)
-      left = next(item_list, None)
-      while left is not None:
-        right = next(item_list, None)
-        if isinstance(left, groups.Sequence) and isinstance(right, groups.Sequence):
-          changed = True
-          left.items = list(left.items) + list(right.items)
-          left.mark = Range(((left.mark.start.line, left.mark.start.col), (right.mark.end.line, right.mark.end.col)))
-          # Skip the right Sequence in the next iteration, but repeat for the left Sequence
-          # so we can merge with another potential Sequence
-          right = left
-        new_items.append(left)
-        left = right
-      node.items = new_items
-
-  # A|(B|C) -> A|B|C
-  def merge_nested_choices(node: base.Node):
-    nonlocal changed
-    if isinstance(node, groups.Choice):
-      new_items: T.List[base.Node] = []
-      for item in node.items:
-        if isinstance(item, groups.Choice):
-          changed = True
-          new_items += item.items
-        else:
-          new_items.append(item)
-      node.items = new_items
-
-  # (A...)... -> A...
-  def remove_nested_repeatables(node: base.Node) -> base.Node:
-    nonlocal changed
-    if isinstance(node, (groups.Repeatable)):
-      if isinstance(node.items[0], (groups.Repeatable)):
-        changed = True
-        # print(inspect.stack()[0].function)
-        return node.items[0]
-    return node
-
-  # A|A -> A
-  def remove_same_choice(node: base.Node):
-    nonlocal changed
-    if isinstance(node, (groups.Choice)):
-      new_items: T.List[base.Node] = []
-      for item in node.items:
-        if not any([item == new_item for new_item in new_items]):
-          new_items.append(item)
-        else:
-          changed = True
-      node.items = new_items
-
-  new_root = root.replace(dissolve_groups)
-  if new_root is None:  # type: ignore
-    return groups.Sequence(root_mark << [])  # type: ignore
-  i = 0
-  # Run until nothing can be remove any longer
-  while changed:
-    changed = False
-    new_root = new_root.replace(remove_empty_groups)
-    if new_root is None:
-      return groups.Sequence(root_mark << [])  # type: ignore
-    new_root = new_root.replace(remove_intermediate_groups_with_one_item)
-    if new_root is None:  # type: ignore
-      return groups.Sequence(root_mark << [])  # type: ignore
-    new_root.walk(merge_nested_sequences)
-    new_root.walk(merge_nested_optionals)
-    new_root.walk(merge_neighboring_sequences)
-    new_root.walk(merge_nested_choices)
-    new_root = new_root.replace(remove_nested_repeatables)
-    if new_root is None:  # type: ignore
-      return groups.Sequence(root_mark << [])  # type: ignore
-    new_root.walk(remove_same_choice)
-    i += 1
-    if i > 100:
-      raise Exception(new_root)
-
-  return new_root
+  new_root = normalize(root)
+  if new_root is None:
+    return groups.Sequence(root_mark << [])
+  return finalize(new_root)
+
+
+NodeKey = T.Hashable
+
+def structural_key(node: base.Node) -> NodeKey:
+  # Nodes with the same key are interchangeable: leaves are keyed by their type and ident,
+  # options by the ident of their definition (see Option.__eq__) and groups by their type and the keys of their items.
+  # The items of a group are keyed by identity, so the key is only structural once identical subtrees are
+  # shared (see merge_identical_groups()). That keeps computing it O(len(node.items)) instead of O(subtree)
+  if isinstance(node, leaves.Option):
+    return (leaves.Option, node.definition.ident)
+  if isinstance(node, base.Leaf):
+    return (type(node), node.ident)
+  assert isinstance(node, base.Group)
+  return (type(node), tuple(child_key(item) for item in node.items))
+
+def child_key(node: base.Node) -> NodeKey:
+  return structural_key(node) if isinstance(node, base.Leaf) else id(node)
+
+def remove_same_choice(items: T.List[base.Node]) -> T.List[base.Node]:
+  # Keeps the first of the items with the same key
+  known_keys: T.Set[NodeKey] = set()
+  new_items: T.List[base.Node] = []
+  for item in items:
+    key = child_key(item)
+    if key not in known_keys:
+      known_keys.add(key)
+      new_items.append(item)
+  return new_items
 
 
 def mark_multiple(root: base.Node) -> None:
-  # Mark leaves that can be specified multiple times
-  marked_leaves: T.Set[base.Leaf] = set()
+  # Mark leaves that can be specified multiple times.
+  # Sets of leaves are int bitmasks, leaves with the same structural key share a bit
+  bit_indices: T.Dict[NodeKey, int] = {}
+  leaf_bits: T.Dict[int, int] = {}
+
+  def index_leaf(node: base.Node):
+    if isinstance(node, base.Leaf):
+      leaf_bits[id(node)] = 1 << bit_indices.setdefault(structural_key(node), len(bit_indices))
+  root.walk(index_leaf)
+  marked_leaves = 0
 
   def mark_from_repeatable(node: base.Node, multiple: bool = False):
+    nonlocal marked_leaves
     if isinstance(node, (base.Group)):
       for item in node.items:
         mark_from_repeatable(item, multiple or isinstance(node, groups.Repeatable))
@@ -233,54 +196,56 @@ def mark_multiple(root: base.Node) -> None:
       assert isinstance(node, (base.Leaf))
       if multiple:
         node.set_multiple(True)
-        marked_leaves.add(node)
+        marked_leaves |= leaf_bits[id(node)]
   mark_from_repeatable(root)
 
-  def mark_repeated(node: base.Node, possible_siblings: T.Set[base.Leaf]) -> T.Set[base.Leaf]:
+  def mark_repeated(node: base.Node, possible_siblings: int) -> int:
     # Mark nodes that are mentioned more than once on a path through the tree
+    nonlocal marked_leaves
     if isinstance(node, (groups.Choice)):
       # Siblings between choice do not affect each other. e.g. (a | a) does not mean a can be specified multiple times
-      new_siblings: T.Set[base.Leaf] = set()
+      new_siblings = 0
       for item in node.items:
         new_siblings |= mark_repeated(item, possible_siblings)
-      possible_siblings = possible_siblings.union(new_siblings)
+      possible_siblings |= new_siblings
     elif isinstance(node, (base.Group)):
       for item in node.items:
-        possible_siblings = possible_siblings.union(mark_repeated(item, possible_siblings))
+        possible_siblings |= mark_repeated(item, possible_siblings)
     else:
       assert isinstance(node, (base.Leaf))
-      if any([node == leaf for leaf in possible_siblings]):
+      leaf = leaf_bits[id(node)]
+      if possible_siblings & leaf:
         node.set_multiple(True)
-        marked_leaves.add(node)
-      # set.add(node) would mutate the set from parent calls
-      possible_siblings = possible_siblings.union(set([node]))
+        marked_leaves |= leaf
+      possible_siblings |= leaf
     return possible_siblings
-  mark_repeated(root, set())
+  mark_repeated(root, 0)
 
   def mark_identical_nodes(node: base.Node):
-    # For some reason we can't use "node in set()"
-    # Also the reason for the type ignore
-    if any([node == leaf for leaf in marked_leaves]):
-      node.set_multiple(True)  # type: ignore
-    return node
-  root.replace(mark_identical_nodes)
+    if isinstance(node, base.Leaf) and marked_leaves & leaf_bits[id(node)]:
+      node.set_multiple(True)
+  root.walk(mark_identical_nodes)
 
 
 def merge_identical_leaves(root: base.Node, ignore_option_args: bool = False) -> base.Node:
-  known_leaves: T.Set[base.Leaf] = set()
+  known_leaves: T.Dict[NodeKey, base.Leaf] = {}
+  merged = 0
 
   def merge(node: base.Node):
+    nonlocal merged
     if isinstance(node, base.Leaf):
-      for leaf in known_leaves:
-        if node == leaf:
-          if not ignore_option_args \
-            and isinstance(node, leaves.Option) and node.argname != leaf.argname:  # type: ignore
-            # Preserve argument names of options
-            return node
-          return leaf
-      known_leaves.add(node)
+      key = structural_key(node)
+      if not ignore_option_args and isinstance(node, leaves.Option) and node.argname is not None:
+        # Preserve argument names of options. Their locations are not tracked when parsing with positions=False,
+        # but every option has its own argname or shares the one of its definition
+        key = (key, id(node.argname))
+      leaf = known_leaves.setdefault(key, node)
+      if leaf is not node:
+        merged += 1
+      return leaf
     return node
   new_root = root.replace(merge)
+  log.debug(f'Merged {merged} identical leaves into {len(known_leaves)}')
   if new_root is None:  # type: ignore
     return groups.Sequence(root.mark << [])  # type: ignore
   else:
@@ -288,14 +253,13 @@ def merge_identical_leaves(root: base.Node, ignore_option_args: bool = False) ->
 
 
 def merge_identical_groups(root: base.Node) -> base.Node:
-  known_groups: T.Set[base.Group] = set()
+  # Hash-conses the groups, identical subtrees end up as the same object.
+  # replace() works bottom up, so the items of a group have already been merged when it is keyed
+  known_groups: T.Dict[NodeKey, base.Group] = {}
 
   def merge(node: base.Node) -> base.Node:
     if isinstance(node, base.Group):
-      for group in known_groups:
-        if type(node) == type(group) and node.items == group.items:
-          return group
-      known_groups.add(node)
+      return known_groups.setdefault(structural_key(node), node)
     return node
   new_root = root.replace(merge)
   if new_root is None:  # type: ignore
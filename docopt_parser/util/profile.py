@@ -0,0 +1,204 @@
+import time
+import typing as T
+import parsec as P
+
+# The name of a parser and whether it is a lookahead(), see ParserProfile.name()
+Name = T.Tuple[str, bool]
+# Longer names are cut short in ParserProfile.table()
+name_width = 60
+
+
+class ParserCounts(object):
+  __slots__ = ('calls', 'successes', 'failures', 'backtracked', 'seconds', 'self_seconds')
+  calls: int
+  successes: int
+  failures: int
+  # Characters the parser and the parsers it called got through before it failed, or that a lookahead() will
+  # parse again
+  backtracked: int
+  # Including the time spent in nested parsers, recursive calls are counted once
+  seconds: float
+  # Excluding the time spent in nested named parsers
+  self_seconds: float
+
+  def __init__(self):
+    self.calls = self.successes = self.failures = self.backtracked = 0
+    self.seconds = self.self_seconds = 0.0
+
+  @property
+  def dict(self) -> T.Dict[str, T.Any]:
+    return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+def closure_vars(fn: T.Callable[..., T.Any]) -> T.Dict[str, T.Any]:
+  return dict(zip(fn.__code__.co_freevars, (cell.cell_contents for cell in fn.__closure__ or ())))
+
+
+class ParserProfile(object):
+  # Counts the calls of the named parsers while the profile is active:
+  #   with ParserProfile() as profile:
+  #     parse(text)
+  #   sys.stderr.write(profile.table())
+  # Parsers are named by their .desc() or the function of @P.generate, the ^ (try_choice) and lookahead combinators
+  # are named after their operands. Calls of unnamed parsers count towards the named parser that called them.
+  # P.Parser.__call__ is replaced while the profile is active, only one thread can be profiled at a time
+  active: "T.ClassVar[ParserProfile | None]" = None
+  counts: T.Dict[str, ParserCounts]
+  # (open, name, time) in the order they happened, for speedscope()
+  events: T.List[T.Tuple[bool, str, float]]
+  started: float
+  stopped: float
+  names: T.Dict[T.Callable[..., T.Any], "Name | None"]
+  original_call: T.Callable[..., T.Any]
+
+  def __init__(self):
+    self.counts = {}
+    self.events = []
+    self.started = self.stopped = 0.0
+    self.names = {}
+
+  def __enter__(self) -> "ParserProfile":
+    if ParserProfile.active is not None:
+      raise RuntimeError('Another ParserProfile is already active')
+    ParserProfile.active = self
+    self.original_call = P.Parser.__call__
+    P.Parser.__call__ = self.profiled_call()  # type: ignore
+    self.started = time.perf_counter()
+    return self
+
+  def __exit__(self, *args: T.Any):
+    self.stopped = time.perf_counter()
+    P.Parser.__call__ = self.original_call  # type: ignore
+    ParserProfile.active = None
+    self.names.clear()
+
+  def profiled_call(self) -> T.Callable[[P.Parser, str, int], P.Value]:
+    counts = self.counts
+    events = self.events
+    names = self.names
+    clock = time.perf_counter
+    # For every named parser on the stack the seconds spent in the named parsers it called
+    # and the furthest index any of the parsers it called got to
+    stack: T.List[T.List[T.Any]] = []
+    # Named parsers on the stack, recursive calls are not timed twice
+    depth: T.Dict[str, int] = {}
+
+    def call(parser: P.Parser, text: str, index: int) -> P.Value:
+      fn = parser.fn
+      try:
+        named = names[fn]
+      except KeyError:
+        named = names[fn] = self.name(fn)
+      if named is None:
+        res = fn(text, index)
+        if stack and res.index > stack[-1][1]:
+          stack[-1][1] = res.index
+        return res
+      name, is_lookahead = named
+      parser_counts = counts.get(name)
+      if parser_counts is None:
+        parser_counts = counts[name] = ParserCounts()
+      outer = depth.get(name, 0)
+      depth[name] = outer + 1
+      frame = [0.0, index]
+      stack.append(frame)
+      start = clock()
+      events.append((True, name, start))
+      try:
+        res = fn(text, index)
+      finally:
+        end = clock()
+        events.append((False, name, end))
+        seconds = end - start
+        stack.pop()
+        parser_counts.self_seconds += seconds - frame[0]
+        if stack:
+          stack[-1][0] += seconds
+        if not outer:
+          parser_counts.seconds += seconds
+        depth[name] = outer
+        parser_counts.calls += 1
+      furthest = max(frame[1], res.index)
+      if res.status:
+        parser_counts.successes += 1
+      else:
+        parser_counts.failures += 1
+      if is_lookahead or not res.status:
+        parser_counts.backtracked += furthest - index
+      if stack and furthest > stack[-1][1]:
+        stack[-1][1] = furthest
+      return res
+    return call
+
+  def name(self, fn: T.Callable[..., T.Any]) -> "Name | None":
+    closure = closure_vars(fn)
+    if fn.__name__ == 'choice_parser':
+      # p.desc(description) is p | fail_with(description)
+      other = closure.get('other')
+      if isinstance(other, P.Parser) and other.fn.__name__ == '<lambda>':
+        message = closure_vars(other.fn).get('message')
+        if message is not None:
+          message = str(message)
+          generator = closure_vars(closure['self'].fn).get('fn') if closure['self'].fn.__name__ == 'generated' else None
+          if generator is not None and message == generator.__name__:
+            # @P.generate describes the parser with the name of its function, qualify it
+            return (generator.__qualname__.replace('.<locals>', ''), False)
+          # Descriptions of characters can contain control characters
+          return (message if message.isprintable() else repr(message)[1:-1], False)
+    elif fn.__name__ == 'try_choice_parser':
+      return (f'{self.label(closure["self"])} ^ {self.label(closure["other"])}', False)
+    elif fn.__name__ == 'lookahead_parser':
+      return (f'lookahead({self.label(closure["p"])})', True)
+    return None
+
+  def label(self, parser: P.Parser) -> str:
+    # The name of an operand of ^ or lookahead(), unnamed parsers are labeled by the parsec function that made them
+    if parser.fn.__name__ == 'lazy_parser':
+      # Parsers of docopt_parser.util.parsers.lazy() that have not been built yet
+      return closure_vars(parser.fn)['build'].__name__
+    named = self.name(parser.fn)
+    return named[0] if named is not None else parser.fn.__name__
+
+  def table(self, sort: str = 'self_seconds', limit: "int | None" = None) -> str:
+    # One line per named parser sorted by the ParserCounts attribute sort, largest first
+    rows = sorted(self.counts.items(), key=lambda item: getattr(item[1], sort), reverse=True)[:limit]
+    names = [name if len(name) <= name_width else name[:name_width - 3] + '...' for name, _ in rows]
+    width = max([len('parser')] + [len(name) for name in names])
+    lines = [
+      f'{"parser":<{width}} {"calls":>8} {"successes":>10} {"failures":>9} {"backtracked":>12} {"total":>11} '
+      f'{"self":>11}'
+    ]
+    for name, (_, counts) in zip(names, rows):
+      lines.append(
+        f'{name:<{width}} {counts.calls:>8} {counts.successes:>10} {counts.failures:>9} {counts.backtracked:>12} '
+        f'{counts.seconds * 1000:>9.3f}ms {counts.self_seconds * 1000:>9.3f}ms'
+      )
+    return '\n'.join(lines) + '\n'
+
+  @property
+  def dict(self) -> T.Dict[str, T.Dict[str, T.Any]]:
+    return {name: counts.dict for name, counts in self.counts.items()}
+
+  def speedscope(self, name: str = 'docopt-parser') -> T.Dict[str, T.Any]:
+    # An evented profile in the file format of https://www.speedscope.app, write it with json.dump()
+    frames: T.Dict[str, int] = {}
+    for _, frame, _ in self.events:
+      frames.setdefault(frame, len(frames))
+    return {
+      '$schema': 'https://www.speedscope.app/file-format-schema.json',
+      'exporter': 'docopt-parser',
+      'name': name,
+      'activeProfileIndex': 0,
+      'shared': {'frames': [{'name': frame} for frame in frames]},
+      'profiles': [{
+        'type': 'evented',
+        'name': name,
+        'unit': 'milliseconds',
+        'startValue': 0,
+        'endValue': (self.stopped - self.started) * 1000,
+        'events': [
+          {'type': 'O' if is_open else 'C', 'frame': frames[frame], 'at': (at - self.started) * 1000}
+          for is_open, frame, at in self.events
+        ],
+      }],
+    }
@@ -0,0 +1,314 @@
+import array
+import io
+import json
+import struct
+import sys
+import typing as T
+
+from docopt_parser import base, groups, leaves
+from docopt_parser.util import marks
+
+# The C implementation json.dumps() uses as well, when it is available
+encode_string = json.encoder.encode_basestring_ascii
+# Number of pieces buffered before they are written to the stream
+flush_threshold = 4096
+
+
+def dump_json(node: base.Node, fp: T.TextIO, indent: "int | None" = None) -> None:
+  # Writes the same JSON as json.dump(node.dict, fp, indent=indent).
+  # The AST is walked directly through Node.fields(), the nested dict is never built
+  step = ' ' * indent if indent is not None else None
+  chunks: T.List[str] = []
+
+  def write_node(node: base.Node, newline: "str | None"):
+    inner = newline + step if newline is not None and step is not None else None
+    separator = ', ' if inner is None else ',' + inner
+    chunks.append('{' if inner is None else '{' + inner)
+    first = True
+    for key, value in node.fields():
+      if not first:
+        chunks.append(separator)
+      first = False
+      chunks.append(encode_string(key) + ': ')
+      write_value(value, inner)
+    chunks.append('}' if newline is None else newline + '}')
+    if len(chunks) > flush_threshold:
+      fp.write(''.join(chunks))
+      chunks.clear()
+
+  def write_value(value: base.FieldVal, newline: "str | None"):
+    if isinstance(value, base.Node):
+      write_node(value, newline)
+    elif isinstance(value, list):
+      if len(value) == 0:
+        chunks.append('[]')
+        return
+      inner = newline + step if newline is not None and step is not None else None
+      chunks.append('[' if inner is None else '[' + inner)
+      for i, item in enumerate(value):
+        if i > 0:
+          chunks.append(', ' if inner is None else ',' + inner)
+        write_value(item, inner)
+      chunks.append(']' if newline is None else newline + ']')
+    elif isinstance(value, str):
+      chunks.append(encode_string(value))
+    elif value is True:
+      chunks.append('true')
+    elif value is False:
+      chunks.append('false')
+    elif value is None:
+      chunks.append('null')
+    else:
+      chunks.append(json.dumps(value))
+
+  write_node(node, '\n' if step is not None else None)
+  fp.write(''.join(chunks))
+
+
+def dumps_json(node: base.Node, indent: "int | None" = None) -> str:
+  fp = io.StringIO()
+  dump_json(node, fp, indent)
+  return fp.getvalue()
+
+
+# The binary encoding of ASTs, see dumps_binary(). Readers reject any other version
+binary_magic = b'DPAST\0'
+binary_version = 1
+# magic, version, flags, number of strings, number of nodes, number of words, size of the string data
+binary_header = struct.Struct('<6sHIIIII')
+# Marks are offsets into the source text (string 0), instead of (line, col) locations
+flag_offsets = 1
+
+# Node types by their type code. Codes are part of the format, new types go at the end
+binary_types: T.Tuple[T.Type[base.Node], ...] = (
+  groups.Choice, groups.Sequence, groups.Group, groups.Optional, groups.Repeatable,
+  leaves.Argument, leaves.ArgumentSeparator, leaves.Command, leaves.OptionsShortcut, leaves.Option,
+)
+# How each slot is encoded, slots that only hold memoized values are reset to the given value when loading
+SlotKind = T.Literal['range', 'nodes', 'node', 'str', 'optstr', 'bool', 'marked']
+slot_kinds: T.Dict[str, SlotKind] = {
+  'mark': 'range', '_items': 'nodes', 'ident': 'str', '_multiple': 'bool', '_definition': 'node',
+  '_Option__argname': 'marked', '_Option__short_alias': 'optstr', '_Option__default': 'optstr',
+  '_Option__doc': 'optstr', '_Option__is_definition': 'bool',
+}
+slot_resets: T.Dict[str, T.Any] = {
+  '_dict': None, '_parents': None, '_atom_parser': None, '_atom_parser_shortlist': None,
+}
+
+
+def slot_names(cls: type) -> T.List[str]:
+  # All slots of cls, private names mangled the way setattr() expects them
+  names: T.List[str] = []
+  for c in reversed(cls.__mro__):
+    for name in c.__dict__.get('__slots__', ()):
+      private = name.startswith('__') and not name.endswith('__')
+      names.append(f'_{c.__name__.lstrip("_")}{name}' if private else name)
+  return names
+
+
+def slot_schema(cls: type) -> T.Tuple[T.Tuple[T.Tuple[str, SlotKind], ...], T.Tuple[T.Tuple[str, T.Any], ...]]:
+  names = slot_names(cls)
+  unknown = [name for name in names if name not in slot_kinds and name not in slot_resets]
+  # Fails on import when a node gains a slot the encoding does not know about
+  assert not unknown, f'The binary encoding does not handle the slots {unknown} of {cls.__name__}'
+  return (
+    tuple((name, slot_kinds[name]) for name in names if name in slot_kinds),
+    tuple((name, slot_resets[name]) for name in names if name in slot_resets),
+  )
+
+
+binary_schemas = [slot_schema(cls) for cls in binary_types]
+binary_codes = {cls: code for code, cls in enumerate(binary_types)}
+# The loader sets slots through their descriptors, the same way object.__setattr__() would without the lookup.
+# Ranges are frozen, their slots can only be set like this
+binary_setters = [
+  [(getattr(cls, name).__set__, kind) for name, kind in schema]
+  for cls, (schema, _) in zip(binary_types, binary_schemas)
+]
+binary_resets = [
+  [(getattr(cls, name).__set__, value) for name, value in resets]
+  for cls, (_, resets) in zip(binary_types, binary_schemas)
+]
+set_range_source, set_range_start, set_range_end = (
+  getattr(marks.Range, name).__set__ for name in ('_source', '_start', '_end')
+)
+set_marked_elm = getattr(marks.Marked, 'elm').__set__
+untracked_location = marks.untracked_location
+
+
+def dumps_binary(node: base.Node) -> bytes:
+  # Encodes the AST in a compact binary format that loads_binary() reads back:
+  #   header | string offsets: u32 * (strings + 1) | node table: u32 * words | string data: utf-8
+  # The node table holds one record per node, a type code followed by the encoded slots. Nodes come after all the
+  # nodes they refer to and are referred to by their position in the table, nodes shared between several parents
+  # are stored once. All integers are little-endian
+  order: T.List[base.Node] = []
+  indexes: T.Dict[int, int] = {}
+
+  def collect(node: base.Node):
+    if id(node) in indexes:
+      return
+    if isinstance(node, base.Group):
+      for item in node.items:
+        collect(item)
+    elif isinstance(node, leaves.Option) and node.definition is not node:
+      collect(node.definition)
+    indexes[id(node)] = len(order)
+    order.append(node)
+  collect(node)
+
+  argnames = (getattr(n, '_Option__argname', None) for n in order)
+  ranges = [n.mark for n in order] + [argname for argname in argnames if argname is not None]
+  source = ranges[0]._source
+  offsets = source is not None and all(r._source is source for r in ranges)
+  strings: T.Dict[str, int] = {str(source): 0} if offsets else {}
+  words = array.array('I')
+
+  def string(value: str) -> int:
+    index = strings.get(value)
+    if index is None:
+      index = strings[value] = len(strings)
+    return index
+
+  def write_range(range: marks.Range):
+    if offsets:
+      words.extend((T.cast(int, range._start), T.cast(int, range._end)))
+    else:
+      start, end = range.start, range.end
+      words.extend((int(start.line), start.col, int(end.line), end.col))
+
+  for n in order:
+    code = binary_codes.get(type(n))
+    if code is None:
+      raise ValueError(f'Unable to encode nodes of type {type(n).__name__}')
+    words.append(code)
+    for name, kind in binary_schemas[code][0]:
+      value = getattr(n, name)
+      if kind == 'range':
+        write_range(value)
+      elif kind == 'nodes':
+        words.append(len(value))
+        words.extend(indexes[id(item)] for item in value)
+      elif kind == 'node':
+        words.append(indexes[id(value)])
+      elif kind == 'str':
+        words.append(string(value))
+      elif kind == 'optstr':
+        words.append(0 if value is None else string(value) + 1)
+      elif kind == 'bool':
+        words.append(1 if value else 0)
+      elif value is None:
+        words.append(0)
+      else:
+        words.append(string(value.elm) + 1)
+        write_range(value)
+
+  # Texts are not necessarily valid unicode, lone surrogates are kept as they are
+  encoded = [value.encode('utf-8', 'surrogatepass') for value in strings]
+  string_offsets = array.array('I', [0])
+  for value in encoded:
+    string_offsets.append(string_offsets[-1] + len(value))
+  header = binary_header.pack(
+    binary_magic, binary_version, flag_offsets if offsets else 0,
+    len(encoded), len(order), len(words), string_offsets[-1]
+  )
+  if sys.byteorder == 'big':
+    string_offsets.byteswap()
+    words.byteswap()
+  return b''.join([header, string_offsets.tobytes(), words.tobytes(), *encoded])
+
+
+def loads_binary(data: "bytes | bytearray | memoryview") -> base.Node:
+  # Reads an AST written by dumps_binary(). The tables are read in place, only the strings are decoded
+  view = memoryview(data).cast('B')
+  if len(view) < binary_header.size:
+    raise ValueError('Not a binary AST, the data is too short')
+  magic, version, flags, string_count, node_count, word_count, data_size = binary_header.unpack_from(view)
+  if magic != binary_magic:
+    raise ValueError('Not a binary AST')
+  if version != binary_version:
+    raise ValueError(f'Unsupported binary AST version {version}, expected {binary_version}')
+  pos = binary_header.size
+  end = pos + 4 * (string_count + 1 + word_count) + data_size
+  if len(view) != end or node_count == 0:
+    raise ValueError('Corrupt binary AST, the size does not match the header')
+  string_offsets = u32_array(view[pos:pos + 4 * (string_count + 1)])
+  pos += 4 * (string_count + 1)
+  words = u32_array(view[pos:pos + 4 * word_count])
+  pos += 4 * word_count
+  try:
+    strings = [
+      # The same few idents are repeated across the usage section and across parsed ASTs, see base.Leaf
+      sys.intern(str(view[pos + string_offsets[i]:pos + string_offsets[i + 1]], 'utf-8', 'surrogatepass'))
+      for i in range(string_count)
+    ]
+    return read_nodes(words, strings, node_count, flags)
+  except (IndexError, UnicodeDecodeError) as e:
+    raise ValueError(f'Corrupt binary AST: {e}') from e
+
+
+def u32_array(view: memoryview) -> "T.Sequence[int]":
+  if sys.byteorder == 'little':
+    return view.cast('I')
+  words = array.array('I', view)
+  words.byteswap()
+  return words
+
+
+def read_nodes(words: T.Sequence[int], strings: T.List[str], node_count: int, flags: int) -> base.Node:
+  source = marks.SourceText(strings[0]) if flags & flag_offsets else None
+  nodes: T.List[base.Node] = []
+  pos = 0
+
+  def read_range(cls: T.Type[marks.Range]) -> marks.Range:
+    # Ranges in a SourceText are filled in directly, marks.Range.__init__() would wrap the offsets first
+    nonlocal pos
+    range = object.__new__(cls)
+    if source is not None:
+      set_range_source(range, source)
+      set_range_start(range, words[pos])
+      set_range_end(range, words[pos + 1])
+      pos += 2
+      return range
+    start, end = (words[pos], words[pos + 1]), (words[pos + 2], words[pos + 3])
+    pos += 4
+    set_range_source(range, None)
+    set_range_start(range, untracked_location if start == marks.untracked else marks.Location(start))
+    set_range_end(range, untracked_location if end == marks.untracked else marks.Location(end))
+    return range
+
+  for _ in range(node_count):
+    code = words[pos]
+    pos += 1
+    node = object.__new__(binary_types[code])
+    # Added before the slots are read, definitions refer to themselves
+    nodes.append(node)
+    for set_slot, kind in binary_setters[code]:
+      if kind == 'range':
+        value = read_range(marks.Range)
+      elif kind == 'nodes':
+        count = words[pos]
+        value = tuple(nodes[i] for i in words[pos + 1:pos + 1 + count])
+        pos += 1 + count
+      else:
+        word = words[pos]
+        pos += 1
+        if kind == 'node':
+          value = nodes[word]
+        elif kind == 'str':
+          value = strings[word]
+        elif kind == 'optstr':
+          value = None if word == 0 else strings[word - 1]
+        elif kind == 'bool':
+          value = word == 1
+        elif word == 0:
+          value = None
+        else:
+          value = read_range(marks.Marked)
+          set_marked_elm(value, strings[word - 1])
+      set_slot(node, value)
+    for set_slot, value in binary_resets[code]:
+      set_slot(node, value)
+  if pos != len(words):
+    raise ValueError('Corrupt binary AST, the node table has trailing data')
+  return nodes[-1]
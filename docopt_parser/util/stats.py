@@ -0,0 +1,85 @@
+import time
+import typing as T
+
+from docopt_parser import base
+
+_T = T.TypeVar('_T')
+
+
+class Phase(T.NamedTuple):
+  name: str
+  seconds: float
+  # Number of distinct nodes in the AST before and after the phase, None for phases that do not work on an AST
+  nodes_before: "int | None"
+  nodes_after: "int | None"
+
+
+def count_nodes(root: base.Node) -> int:
+  # Nodes shared between several parents (see merge_identical_leaves()) are counted once
+  seen: T.Set[int] = set()
+  root.walk(lambda node: seen.add(id(node)))
+  return len(seen)
+
+
+def run_phase(name: str, fn: T.Callable[..., _T], *args: T.Any) -> _T:
+  # What ParseStats.phase() does when no stats are recorded
+  return fn(*args)
+
+
+class ParseStats(object):
+  # Filled in by parse(text, stats=ParseStats()) with the wall time of every phase of the parse.
+  # Phases that work on an AST also record its size before and after, counting the nodes is not part of the time
+  phases: T.List[Phase]
+  engine: "str | None"
+  # Whether the AST came from the cache, none of the phases ran in that case
+  cached: bool
+  # (hits, calls) of each memoized rule when parsing with parse(text, packrat=True)
+  packrat: T.Dict[str, T.Tuple[int, int]]
+
+  def __init__(self):
+    self.phases = []
+    self.engine = None
+    self.cached = False
+    self.packrat = {}
+
+  def phase(self, name: str, fn: T.Callable[..., _T], *args: T.Any) -> _T:
+    # Calls fn(*args) as the phase name. The AST is the first argument, post-processors that return None change it
+    # in place
+    root = args[0] if args and isinstance(args[0], base.Node) else None
+    nodes_before = count_nodes(root) if root is not None else None
+    start = time.perf_counter()
+    result = fn(*args)
+    seconds = time.perf_counter() - start
+    new_root = result if isinstance(result, base.Node) else root
+    self.phases.append(Phase(name, seconds, nodes_before, count_nodes(new_root) if new_root is not None else None))
+    return result
+
+  @property
+  def seconds(self) -> float:
+    return sum(phase.seconds for phase in self.phases)
+
+  @property
+  def dict(self) -> T.Dict[str, T.Any]:
+    return {
+      'engine': self.engine,
+      'cached': self.cached,
+      'seconds': self.seconds,
+      'phases': [phase._asdict() for phase in self.phases],
+      'packrat': {rule: {'hits': hits, 'calls': calls} for rule, (hits, calls) in self.packrat.items()},
+    }
+
+  def __repr__(self):
+    lines = [f'{"phase":<44} {"time":>10} {"nodes":>13}']
+    for phase in self.phases:
+      if phase.nodes_after is None:
+        nodes = ''
+      elif phase.nodes_before is None:
+        nodes = str(phase.nodes_after)
+      else:
+        nodes = f'{phase.nodes_before} -> {phase.nodes_after}'
+      lines.append(f'{phase.name:<44} {phase.seconds * 1000:>8.3f}ms {nodes:>13}')
+    total = 'cached' if self.cached else f'{self.seconds * 1000:>8.3f}ms'
+    lines.append(f'{"total (" + str(self.engine) + " engine)":<44} {total:>10}')
+    for rule, (hits, calls) in sorted(self.packrat.items()):
+      lines.append(f'{"packrat " + rule:<44} {hits:>6} hits of {calls} calls ({hits / calls:.0%})')
+    return '\n'.join(lines)
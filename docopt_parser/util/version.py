@@ -0,0 +1,13 @@
+import functools
+
+# Kept apart from util.helpers, which imports parsec. The CLI needs the version for --version and the caches for
+# their keys, neither of which parses anything
+
+
+@functools.cache
+def package_version() -> str:
+  import importlib.metadata
+  try:
+    return importlib.metadata.version('docopt-parser')
+  except importlib.metadata.PackageNotFoundError:
+    return '0.0.0-dev'
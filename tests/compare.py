@@ -0,0 +1,29 @@
+import typing as T
+
+from docopt_parser import base, leaves, parse, DocoptError
+
+# Comparisons of ASTs shared by the tests, e.g. of the engines or of the same text parsed in different ways
+
+
+def describe(node: base.Node, marks: bool = True) -> T.List[T.Any]:
+  # Everything that makes up the AST, including marks (unless marks=False) and option definitions
+  desc: T.List[T.Any] = [type(node).__name__, repr(node.mark) if marks else None]
+  if isinstance(node, base.Group):
+    desc.append([describe(item, marks) for item in node.items])
+  else:
+    assert isinstance(node, base.Leaf)
+    desc += [node.ident, repr(node)]
+    if isinstance(node, leaves.Option):
+      argname = node.argname if marks or node.argname is None else node.argname.elm
+      desc += [repr(argname), node.definition.ident, repr(node.definition.mark) if marks else None]
+  return desc
+
+def parse_with(text: str, engine: T.Literal['combinator', 'fast']):
+  try:
+    root = parse(text, engine=engine)
+    return describe(root), root.dict
+  except DocoptError as e:
+    return str(e)
+
+def assert_identical(text: str):
+  assert parse_with(text, 'fast') == parse_with(text, 'combinator')
@@ -0,0 +1,25 @@
+import json
+
+from benchmarks import corpus, suite
+from tests.compare import assert_identical
+
+
+def test_corpus():
+  docs = corpus.fixed_corpus()
+  assert len(docs) > 0
+  for doc in docs:
+    assert_identical(doc.texts[0])
+  assert [len(t) for t in corpus.generated_texts(10, 1)] == [len(t) for t in corpus.generated_texts(10, 1)]
+
+
+def test_run():
+  docs = corpus.fixed_corpus()[:1] + corpus.generated_corpus(10, 0)
+  results = json.loads(json.dumps(suite.run(docs, 2, 1)))
+  assert results['meta']['repeat'] == 2
+  by_name = {(r['benchmark'], r['doc']): r for r in results['results']}
+  assert {name for name, _ in by_name} == {b.name for b in suite.benchmarks}
+  # Only the fixed corpus is run through the CLI
+  assert [doc for name, doc in by_name if name == 'cli'] == [docs[0].name]
+  for result in results['results']:
+    assert 'error' not in result and result['failed'] == 0 or result['benchmark'] == 'docopt.parse_pattern'
+    assert 'error' in result or 0 < result['min'] <= result['median'] <= result['max']
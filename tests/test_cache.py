@@ -0,0 +1,132 @@
+import logging
+import os
+import pickle
+import typing as T
+import zlib
+import pytest as PT
+
+from docopt_parser import parse, ParseCache, DocoptError
+from docopt_parser.util.cache import DiskCache, CacheEntry
+
+spec = '''Usage:
+  prog [options] <file>...
+
+Options:
+  -a, --all  All
+'''
+
+
+def test_hits_and_misses():
+  cache = ParseCache()
+  first = parse(spec, cache=cache)
+  second = parse(spec, cache=cache)
+  assert first.dict == second.dict
+  info = cache.info()
+  assert (info.hits, info.misses, info.evictions, info.currsize) == (1, 1, 0, 1)
+
+def test_snapshots_are_isolated():
+  cache = ParseCache()
+  expected = parse(spec).dict
+  root = parse(spec, cache=cache)
+  root.items = []  # type: ignore
+  snapshot = parse(spec, cache=cache)
+  assert snapshot is not root
+  snapshot.items = []  # type: ignore
+  assert parse(spec, cache=cache).dict == expected
+
+def test_warnings_are_replayed(caplog: PT.LogCaptureFixture):
+  cache = ParseCache()
+  text = 'Usage: prog -a\n\nOptions:\n  -a\n  -b  Unused\n'
+  for _ in range(2):
+    caplog.clear()
+    parse(text, cache=cache)
+    assert [r.getMessage().endswith('-b is not referenced from the usage section') for r in caplog.records] == [True]
+  assert cache.info().hits == 1
+
+def test_lru_eviction():
+  cache = ParseCache(maxsize=2)
+  parse('Usage: prog a', cache=cache)
+  parse('Usage: prog b', cache=cache)
+  parse('Usage: prog a', cache=cache)
+  parse('Usage: prog c', cache=cache)
+  assert cache.info().evictions == 1
+  parse('Usage: prog a', cache=cache)
+  parse('Usage: prog b', cache=cache)
+  assert cache.info().hits == 2
+  assert cache.info().misses == 4
+
+def test_errors_are_not_cached():
+  cache = ParseCache()
+  with PT.raises(DocoptError):
+    parse('Usage: prog (a', cache=cache)
+  assert len(cache) == 0
+
+def test_invalid_size():
+  with PT.raises(ValueError):
+    ParseCache(maxsize=0)
+
+def test_disk_cache_round_trip(tmp_path: T.Any):
+  cache = DiskCache(str(tmp_path))
+  assert cache.get(spec) is None
+  cache.put(spec, parse(spec))
+  entry = DiskCache(str(tmp_path)).get(spec)
+  assert entry is not None and entry.root.dict == parse(spec).dict and entry.records == []
+  assert [entry.name for entry in tmp_path.iterdir() if not entry.name.endswith(DiskCache.suffix)] == []
+
+def test_disk_cache_eviction(tmp_path: T.Any):
+  cache = DiskCache(str(tmp_path), max_bytes=1)
+  cache.put('Usage: prog a', parse('Usage: prog a'))
+  cache.put('Usage: prog b', parse('Usage: prog b'))
+  assert len(cache.entries()) == 0
+  cache = DiskCache(str(tmp_path))
+  cache.put('Usage: prog a', parse('Usage: prog a'))
+  # Room for two entries, the compressed sizes vary by a few bytes
+  cache.max_bytes = cache.entries()[0][1] * 2 + 16
+  cache.put('Usage: prog b', parse('Usage: prog b'))
+  os.utime(cache.path('Usage: prog a'), (0, 0))
+  cache.put('Usage: prog c', parse('Usage: prog c'))
+  assert cache.get('Usage: prog a') is None
+  assert cache.get('Usage: prog c') is not None
+
+def test_disk_cache_corrupt_entry(tmp_path: T.Any):
+  cache = DiskCache(str(tmp_path))
+  cache.put(spec, parse(spec))
+  with open(cache.path(spec), 'wb') as fh:
+    fh.write(b'garbage')
+  assert cache.get(spec) is None
+  assert not os.path.exists(cache.path(spec))
+  # Pickles are not loaded
+  with open(cache.path(spec), 'wb') as fh:
+    fh.write(zlib.compress(pickle.dumps((parse(spec), []))))
+  assert cache.get(spec) is None
+
+def test_disk_cache_records(tmp_path: T.Any):
+  cache = DiskCache(str(tmp_path))
+  records = [('docopt_parser', logging.WARNING, '-b is not referenced from the usage section')]
+  cache.put(spec, parse(spec), records)
+  assert T.cast(CacheEntry, cache.get(spec)).records == records
+
+def test_disk_cache_evicts_temporary_files(tmp_path: T.Any):
+  cache = DiskCache(str(tmp_path))
+  cache.put(spec, parse(spec))
+  crashed = tmp_path / (DiskCache.temp_prefix + 'crashed')
+  crashed.write_bytes(b'\0' * 1024)
+  writing = tmp_path / (DiskCache.temp_prefix + 'writing')
+  writing.write_bytes(b'\0' * 1024)
+  os.utime(crashed, (0, 0))
+  assert sorted(path for _, _, path in cache.entries()) == sorted([str(crashed), cache.path(spec)])
+  cache.max_bytes = os.path.getsize(cache.path(spec))
+  cache.evict()
+  assert not crashed.exists() and writing.exists()
+  assert cache.get(spec) is not None
+
+def test_unusable_disk_cache(tmp_path: T.Any, caplog: PT.LogCaptureFixture):
+  (tmp_path / 'file').write_text('')
+  with PT.raises(ValueError, match='Unable to use'):
+    DiskCache(str(tmp_path / 'file' / 'cache'))
+  cache = DiskCache(str(tmp_path / 'cache'))
+  (tmp_path / 'cache').rmdir()
+  # Writing is best-effort
+  cache.put(spec, parse(spec))
+  assert 'Unable to write to the cache directory' in caplog.text
+  assert cache.get(spec) is None
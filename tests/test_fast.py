@@ -0,0 +1,131 @@
+import typing as T
+import pytest as PT
+import unittest
+from hypothesis import given, settings
+
+from tests.compare import assert_identical, describe
+from tests.lang import DocoptAst as DocoptAstGenerator
+from docopt_parser import fast, leaves, parse, DocoptError
+from docopt_parser.util import errors
+
+
+class TestFastEngine(unittest.TestCase):
+  @settings(max_examples=500, deadline=None)
+  @given(DocoptAstGenerator.asts)
+  def test_identical_ast(self, text: str):
+    assert_identical(str(text))
+
+
+@PT.mark.parametrize('usage', [
+  'prog -abc FILE... [--long=<x y>] (cmd | <a> ARG) -- options',
+  'prog --long=F -xF -x F -ax=F',
+  'prog [ ] ( a|b|  ) -f... <a>...',
+  'prog --undocumented=<arg> --other -uvw',
+  'prog [options] (-a | --long) <file> ...',
+  'prog -',
+  'prog --long= x',
+])
+def test_identical_usage(usage: str):
+  assert_identical(f'''Usage:
+  {usage}
+  prog
+
+Options:
+  -x ARG     Description [default: 1]
+  -a, --all  All
+  --long=<x y>
+''')
+
+@PT.mark.parametrize('usage', [
+  'prog optionsx',
+  'prog -a=B',
+  'prog --long',
+  'prog (a',
+  'prog a]',
+  'prog ...',
+  'prog <multi\n  prog line>',
+])
+def test_identical_errors(usage: str):
+  assert_identical(f'''Usage:
+  {usage}
+
+Options:
+  -a, --all
+  --long=ARG
+''')
+
+def describe_options(text: str):
+  def describe_option(o: leaves.Option):
+    return [repr(o.mark), repr(o), o.definition.ident, o.default, o.doc, o.short_alias]
+  try:
+    return list(map(describe_option, fast.documented_options(text))), \
+      list(map(describe_option, leaves.documented_options.parse_strict(text)))  # type: ignore
+  except errors.DocoptParseError as e:
+    with PT.raises(errors.DocoptParseError) as combinator_e:
+      leaves.documented_options.parse_strict(text)  # type: ignore
+    return (e.message, repr(e.mark)), (combinator_e.value.message, repr(combinator_e.value.mark))
+
+@PT.mark.parametrize('section', [
+  '''Options:
+  -a ARG
+  -b
+  --cc=X  foo
+          bar [default: 3]
+  -d, --dd=<y>  [DEFAULT: a b] more
+''',
+  '''Options: -a, --all  doc
+
+More options:
+  --long FILE, -l  [default: ]
+''',
+  'Options:\n  -f\n  -f\n',
+  'Options:\n  -f, -g\n',
+  'Options:\n  -f, --long\n  --long\n',
+])
+def test_identical_options(section: str):
+  scanned, parsed = describe_options(section)
+  assert scanned == parsed
+
+@PT.mark.parametrize('engine', ['combinator', 'fast'])
+def test_untracked_positions(engine: T.Literal['combinator', 'fast']):
+  text = '''Usage:
+  prog -abc FILE... [--long=<x y>] (cmd | <a> ARG) -- options
+
+Options:
+  -x ARG     Description [default: 1]
+  -a, --all  All
+  --long=<x y>
+'''
+  root = parse(text, engine=engine, positions=False)
+  assert root.dict == parse(text, engine=engine).dict
+  assert root.mark.start == root.mark.end
+  with PT.raises(DocoptError) as untracked_e:
+    parse(text + '  -x, -y\n', engine=engine, positions=False)
+  with PT.raises(DocoptError) as e:
+    parse(text + '  -x, -y\n', engine=engine)
+  assert str(untracked_e.value) == str(e.value)
+
+def parse_without_marks(text: str, positions: bool):
+  try:
+    return describe(parse(text, positions=positions), marks=False)
+  except DocoptError as e:
+    return str(e)
+
+class TestUntrackedPositions(unittest.TestCase):
+  @settings(max_examples=300, deadline=None)
+  @given(DocoptAstGenerator.asts)
+  def test_same_ast(self, text: str):
+    assert parse_without_marks(str(text), False) == parse_without_marks(str(text), True)
+
+def test_untracked_option_arguments():
+  # Options with arguments that are alike are only merged when they are the same option in the text
+  text = 'Usage: prog (-x <A> | -yx <A>)\n\nOptions:\n  -x <A>\n  -y\n'
+  assert parse_without_marks(text, False) == parse_without_marks(text, True)
+
+def test_unknown_engine():
+  with PT.raises(ValueError):
+    parse('Usage: prog', engine='unknown')  # type: ignore
+
+
+if __name__ == "__main__":
+  unittest.main()
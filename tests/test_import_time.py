@@ -0,0 +1,42 @@
+import subprocess
+import sys
+import typing as T
+import pytest as PT
+
+# Runs per module, the fastest one counts. Import times of a single run vary a lot with the load of the machine
+runs = 5
+
+
+def import_times(module: str) -> T.Dict[str, int]:
+  # The cumulative import time in microseconds of module and of everything it imported, in a fresh interpreter
+  result = subprocess.run(
+    [sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True, check=True
+  )
+  times: T.Dict[str, int] = {}
+  for line in result.stderr.splitlines():
+    _, cumulative, name = line.split('|')
+    if cumulative.strip().isdigit():
+      times[name.strip()] = int(cumulative)
+  return times
+
+
+@PT.mark.parametrize('module, budget, deferred', [
+  # Importing everything eagerly took ~150ms
+  ('docopt_parser', 50_000, [
+    'parsec', 'docopt_parser.base', 'docopt_parser.util.cache', 'docopt_parser.util.serialize', 'docopt_parser.session'
+  ]),
+  # What the fast engine needs
+  ('docopt_parser.leaves', 100_000, ['docopt_parser.options', 'docopt_parser.usage', 'docopt_parser.fast']),
+  # What computing a cache key needs, parsec is only needed once something is parsed or serialized
+  ('docopt_parser.util.cache', 110_000, ['parsec', 'docopt_parser.util.serialize']),
+  ('docopt_parser.util.version', 50_000, ['parsec']),
+  # The docopt-parser CLI. Importing everything eagerly took ~155ms
+  ('docopt_parser.__main__', 110_000, [
+    'parsec', 'docopt', 'termcolor', 'yaml', 'docopt_parser.util.cache', 'docopt_parser.util.post_processors'
+  ]),
+])
+def test_import_time(module: str, budget: int, deferred: T.List[str]):
+  times = [import_times(module) for _ in range(runs)]
+  assert [name for name in deferred if name in times[0]] == []
+  fastest = min(t[module] for t in times)
+  assert fastest <= budget, f'Importing {module} took {fastest / 1000:.1f}ms, the budget is {budget / 1000:.0f}ms'
@@ -0,0 +1,84 @@
+import io
+import json
+import pathlib
+import typing as T
+import pytest as PT
+
+from docopt_parser.__main__ import Params, docopt_parser
+
+
+def test_batch(tmp_path: pathlib.Path, capsys: PT.CaptureFixture[str]):
+  paths = []
+  for i, text in enumerate(['Usage: prog a', 'Usage: prog (', 'Usage: prog a']):
+    (tmp_path / f'{i}.txt').write_text(text)
+    paths.append(str(tmp_path / f'{i}.txt'))
+  (tmp_path / 'list').write_text('\n'.join(paths[1:]) + '\n')
+  params: Params = {
+    '--yaml': False, '--json': False, '--jsonl': False, '--stats': True, '--packrat': True, '--profile': False,
+    '--speedscope': None, '--cache-dir': None, '--cache-size': '67108864', 'ast': True,
+    'FILE': [paths[0], f'@{tmp_path}/list', 'missing'],
+    'serve': False, '--socket': None, '--workers': '2', '--max-pending': '64'
+  }
+  with PT.raises(SystemExit) as exit:
+    docopt_parser(params)
+  assert exit.value.code == 2
+  results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+  assert [r['file'] for r in results] == paths + ['missing']
+  assert results[0]['ast'] == results[2]['ast'] == {'type': 'command', 'ident': 'a', 'default': False}
+  assert [r.get('exit_code') for r in results] == [None, 1, None, 2]
+  assert results[0]['parse_stats']['phases'][-1]['name'] == 'collapse_groups'
+  assert 'parse_stats' not in results[3]
+
+
+def test_batch_errors(tmp_path: pathlib.Path, capsys: PT.CaptureFixture[str]):
+  (tmp_path / 'deep.txt').write_text('Usage: prog ' + '(' * 400 + 'a' + ')' * 400)
+  (tmp_path / 'latin1.txt').write_bytes('Usage: prog \xe9'.encode('latin-1'))
+  (tmp_path / 'good.txt').write_text('Usage: prog a')
+  paths = [str(tmp_path / name) for name in ('deep.txt', 'latin1.txt', 'good.txt')]
+  params: Params = {
+    '--yaml': False, '--json': False, '--jsonl': False, '--stats': False, '--packrat': False, '--profile': False,
+    '--speedscope': None, '--cache-dir': None, '--cache-size': '67108864', 'ast': True, 'FILE': paths,
+    'serve': False, '--socket': None, '--workers': '2', '--max-pending': '64'
+  }
+  with PT.raises(SystemExit) as exit:
+    docopt_parser(params)
+  assert exit.value.code == 70
+  results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+  assert [r['file'] for r in results] == paths
+  assert [r.get('exit_code') for r in results] == [70, 2, None]
+  assert 'RecursionError' in results[0]['error'] and 'utf-8' in results[1]['error']
+  assert results[2]['ast'] == {'type': 'command', 'ident': 'a', 'default': False}
+
+
+def test_unusable_cache_dir(tmp_path: pathlib.Path, monkeypatch: PT.MonkeyPatch):
+  (tmp_path / 'file').write_text('')
+  monkeypatch.setattr('sys.stdin', io.StringIO('Usage: prog a'))
+  params: Params = {
+    '--yaml': False, '--json': False, '--jsonl': False, '--stats': False, '--packrat': False, '--profile': False,
+    '--speedscope': None, '--cache-dir': str(tmp_path / 'file' / 'cache'), '--cache-size': '67108864', 'ast': True,
+    'FILE': [], 'serve': False, '--socket': None, '--workers': None, '--max-pending': '64'
+  }
+  with PT.raises(SystemExit) as exit:
+    docopt_parser(params)
+  assert exit.value.code == 2
+  # Checked before any worker is started
+  for mode in ({'FILE': ['-'], 'serve': False}, {'ast': False, 'serve': True}):
+    with PT.raises(SystemExit) as exit:
+      docopt_parser(T.cast(Params, {**params, **mode}))
+    assert exit.value.code == 2
+
+
+@PT.mark.parametrize('size', ['-5', 'abc', '0'])
+def test_invalid_cache_size(size: str, tmp_path: pathlib.Path, monkeypatch: PT.MonkeyPatch):
+  monkeypatch.setattr('sys.stdin', io.StringIO('Usage: prog a'))
+  (tmp_path / 'a.txt').write_text('Usage: prog a')
+  params: Params = {
+    '--yaml': False, '--json': False, '--jsonl': False, '--stats': False, '--packrat': False, '--profile': False,
+    '--speedscope': None, '--cache-dir': str(tmp_path / 'cache'), '--cache-size': size, 'ast': True,
+    'FILE': [], 'serve': False, '--socket': None, '--workers': '1', '--max-pending': '64'
+  }
+  # The same in every mode
+  for mode in ({}, {'FILE': [str(tmp_path / 'a.txt')]}, {'ast': False, 'serve': True}):
+    with PT.raises(SystemExit) as exit:
+      docopt_parser(T.cast(Params, {**params, **mode}))
+    assert exit.value.code == 2
@@ -0,0 +1,57 @@
+import copy
+import pickle
+import parsec as P
+from hypothesis import given
+import hypothesis.strategies as HS
+
+from docopt_parser.util import marks
+
+texts = HS.text(alphabet=HS.sampled_from('ab \n'))
+
+
+@given(texts, HS.data())
+def test_source_text_loc_info(text: str, data: HS.DataObject):
+  source = marks.SourceText(text)
+  index = data.draw(HS.integers(min_value=0, max_value=len(text)))
+  loc = source.loc_info(index)
+  assert loc == P.ParseError.loc_info(text, index)  # type: ignore
+  assert source.offset(loc) == index
+  assert marks.Location(loc).to_bytecount(source) == marks.Location(loc).to_bytecount(text)
+  assert marks.ByteCount(index).to_location(source) == marks.ByteCount(index).to_location(text)
+
+def test_source_text_show():
+  text = 'Usage:\n  prog a\n  prog b\n'
+  mark = marks.Range(((1, 7), (2, 8)))
+  assert mark.show(marks.SourceText(text), 'message') == mark.show(text, 'message')
+  assert marks.SourceText(text).lines == text.split('\n')
+
+def test_marks_have_no_dict():
+  mark = marks.Marked(((1, 2), 'elm', (3, 4)))
+  for obj in (mark, mark.start, mark.start.line, marks.Range(((0, 0), (0, 1)))):
+    assert not hasattr(obj, '__dict__')
+  assert copy.deepcopy(mark) == mark
+  assert pickle.loads(pickle.dumps(mark)) == mark
+  assert pickle.loads(pickle.dumps(mark.start)) == mark.start
+  assert type(pickle.loads(pickle.dumps(mark)).start.line) is marks.LineNumber
+
+def test_offset_ranges():
+  source = marks.SourceText('ab\ncd\n')
+  assert 'line_offsets' not in source.__dict__
+  mark = marks.Marked((source.position(1), 'elm', source.position(4)))
+  assert 'line_offsets' not in source.__dict__
+  assert mark == marks.Marked(((0, 1), 'elm', (1, 1)))
+  assert mark.start == marks.Location((0, 1)) and mark.end == marks.Location((1, 1))
+  assert mark.to_range_tuple() == ((0, 1), (1, 1))
+  assert mark.to_bytecount(source) == (1, 4)
+  assert repr(mark) == "Marked(start=1:1, end=2:1, elm='elm')"
+  assert marks.Range((source.position(0), source.position(1))) < mark
+  assert copy.deepcopy(mark).to_range_tuple()[0].source is source  # type: ignore
+  assert pickle.loads(pickle.dumps(mark)) == mark
+
+def test_untracked_positions():
+  source = marks.SourceText('ab\ncd\n', positions=False)
+  assert marks.SourceText.wrap(source) is source
+  assert marks.SourceText.wrap(source, positions=True).positions
+  mark = marks.Range((source.position(1), source.position(4)))
+  assert mark.start is mark.end
+  assert mark.to_range_tuple() == ((0, 0), (0, 0))
@@ -0,0 +1,56 @@
+import copy
+import pickle
+import typing as T
+import pytest as PT
+
+from docopt_parser import parse, Node
+from docopt_parser.util.post_processors import merge_identical_groups
+
+
+def test_memoized_option_parsers_are_not_copied():
+  text = 'Usage: prog -a --all=<x>\n\nOptions:\n  -a\n  --all=<x>\n'
+  root = parse(text)
+  definition = T.cast(T.Any, root).items[0].definition
+  assert definition.atom_parser is definition.atom_parser
+  assert copy.deepcopy(definition)._atom_parser is None
+  assert pickle.loads(pickle.dumps(root)).dict == root.dict
+
+def test_nodes_have_no_dict():
+  root = parse('Usage: prog -a --all=<x> (cmd | ARG)... [options] --\n\nOptions:\n  -a\n  --all=<x>\n  -b\n')
+  nodes: T.List[Node] = []
+  root.walk(lambda node: nodes.append(node))
+  for node in nodes:
+    assert not hasattr(node, '__dict__')
+  assert copy.deepcopy(root).dict == root.dict
+
+def test_memoized_dict():
+  root = T.cast(T.Any, parse('Usage: prog -a [-b] (cmd | ARG)\n\nOptions:\n  -a  All\n  -b\n'))
+  assert root.dict is root.dict
+  option = root.items[0]
+  root.items[2].items[0].set_multiple(True)
+  assert root.dict['item'][2]['item'][0]['default'] == 0
+  root.items = root.items[1:]
+  assert [item['type'] for item in root.dict['item']] == ['optional', 'choice']
+  root.items[0].items[0].definition = option.definition
+  assert root.dict['item'][0]['item'][0]['definition']['ident'] == '-a'
+  assert copy.deepcopy(root).dict == root.dict
+  with PT.raises(AttributeError):
+    root.items.append(option)
+
+def test_memoized_dict_invalidation():
+  text = 'Usage: prog (-a <x> | b) c\n       prog (-a <x> | b) d\n\nOptions:\n  -a <x>  [default: 1 2]\n'
+  root = T.cast(T.Any, merge_identical_groups(parse(text)))
+  other = T.cast(T.Any, parse(text))
+  first, second = root.items
+  # The choice is shared by both lines
+  assert first.items[0] is second.items[0]
+  root_dict, other_dict, second_dict = root.dict, other.dict, second.dict
+  first.items[1].set_multiple(True)
+  assert root.dict is not root_dict and root.dict['item'][0]['item'][1]['default'] == 0
+  assert other.dict is other_dict and second.dict is second_dict
+  first.items[0].items[1].set_multiple(True)
+  assert second.dict is not second_dict and second.dict['item'][0]['item'][1]['default'] == 0
+  # Options pass the changes of their definition on
+  first.items[0].items[0].set_multiple(True)
+  assert root.dict['item'][1]['item'][0]['item'][0]['definition']['default'] == ['1', '2']
+  assert other.dict is other_dict and other_dict['item'][0]['item'][0]['item'][1]['default'] is False
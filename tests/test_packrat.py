@@ -0,0 +1,69 @@
+import typing as T
+import unittest
+import parsec as P
+from hypothesis import given, settings
+
+from tests.lang import DocoptAst as DocoptAstGenerator
+from tests.compare import describe
+from docopt_parser import parse, DocoptError, ParseStats
+from docopt_parser.util import marks, parsers
+
+spec = '''Usage:
+  prog [options] (cmd <file> | FILE | other)...
+  prog --all
+
+Options:
+  -a, --all  All [default: yes]
+  -f FILE    Input file
+'''
+
+
+def parse_with(text: str, packrat: bool) -> T.Any:
+  try:
+    root = parse(text, packrat=packrat)
+    return describe(root), root.dict
+  except DocoptError as e:
+    return str(e)
+
+
+class TestPackrat(unittest.TestCase):
+  @settings(max_examples=300, deadline=None)
+  @given(DocoptAstGenerator.asts)
+  def test_identical_ast(self, text: str):
+    assert parse_with(str(text), True) == parse_with(str(text), False)
+
+
+def test_hit_rates():
+  stats = ParseStats()
+  source = marks.SourceText(spec)
+  parse(source, stats=stats, packrat=True)
+  assert source.packrat is None
+  assert set(stats.packrat) == {'arg_letters', 'next_line', 'option_documentation'}
+  # "cmd" and "other" are looked at as ARG first
+  assert stats.packrat['arg_letters'][0] >= 2
+  # The next usage line is looked for before it is parsed
+  assert stats.packrat['next_line'][0] == 1
+  for hits, calls in stats.packrat.values():
+    assert 0 <= hits < calls
+  assert 'packrat arg_letters' in repr(stats)
+  assert stats.dict['packrat']['next_line'] == {'hits': 1, 'calls': stats.packrat['next_line'][1]}
+  stats = ParseStats()
+  parse(spec, stats=stats)
+  assert stats.packrat == {}
+
+
+def test_memo():
+  calls: T.List[int] = []
+
+  @P.Parser
+  def counted(text: str, index: int) -> P.Value:
+    calls.append(index)
+    return P.Value.success(index + 1, text[index])
+  p = parsers.memo('test', counted)
+  source = marks.SourceText('ab')
+  assert (p + p)(source, 0) == (p + p)(source, 0)
+  assert calls == [0, 1, 0, 1]
+  source.packrat = parsers.Packrat()
+  assert (p + p)(source, 0) == (p + p)(source, 0) == P.Value.success(2, ('a', 'b'))
+  assert calls == [0, 1, 0, 1, 0, 1]
+  assert source.packrat.rates() == {'test': (2, 4)}
@@ -0,0 +1,286 @@
+import copy
+import logging
+import typing as T
+import unittest
+import parsec as P
+import pytest as PT
+from hypothesis import given, settings
+
+from tests.lang import DocoptAst as DocoptAstGenerator
+from tests.compare import describe
+from docopt_parser import base, groups, usage, leaves, parse, DocoptError
+from docopt_parser.util import marks, post_processors
+from docopt_parser.util.marks import Range
+
+TNode = T.TypeVar('TNode', bound=base.Node)
+
+
+# The fixed point implementation collapse_groups replaced, the normalizer must arrive at the same result
+def collapse_groups_fixed_point(root: base.Node) -> base.Node:
+  changed = True
+  root_mark = root.mark
+
+  # A [] B () -> A B
+  def remove_empty_groups(node: TNode) -> "TNode | None":
+    nonlocal changed
+    if isinstance(node, base.Group) and len(node.items) == 0:
+      changed = True
+      return None
+    return node
+
+  # A (B) C -> A B C
+  def remove_intermediate_groups_with_one_item(node: base.Node) -> base.Node:
+    nonlocal changed
+    if isinstance(node, (groups.Choice, groups.Sequence)) and len(node.items) == 1:
+      changed = True
+      node.items[0].mark = node.mark
+      return node.items[0]
+    return node
+
+  # A (B C) -> A B C
+  def merge_nested_sequences(node: base.Node):
+    nonlocal changed
+    if isinstance(node, groups.Sequence):
+      new_items: T.List[base.Node] = []
+      for item in node.items:
+        if isinstance(item, groups.Sequence):
+          changed = True
+          new_items += item.items
+        else:
+          new_items.append(item)
+      node.items = new_items
+
+  # [A [B [C]]] -> [A B C]
+  def merge_nested_optionals(node: base.Node):
+    nonlocal changed
+    if isinstance(node, groups.Optional):
+      new_items: T.List[base.Node] = []
+      for item in node.items:
+        if isinstance(item, groups.Optional):
+          changed = True
+          new_items += item.items
+        else:
+          new_items.append(item)
+      node.items = new_items
+
+  # (A) -> A
+  # Must run after remove_root_sequence_in_optionals so that [(a b c)] does not become [a b c]
+  def dissolve_groups(node: base.Node) -> base.Node:
+    nonlocal changed
+    if isinstance(node, groups.Group):
+      changed = True
+      assert len(node.items) == 1
+      node.items[0].mark = node.mark
+      return node.items[0]
+    return node
+
+  # (A B C) (D E F) -> A B C D E F
+  def merge_neighboring_sequences(node: base.Node):
+    nonlocal changed
+    new_items: T.List[base.Node] = []
+    if isinstance(node, groups.Sequence):
+      new_items: T.List[base.Node] = []
+      # Go through the list pairwise, have each element be "left" once
+      item_list = iter(node.items)
+      left = next(item_list, None)
+      while left is not None:
+        right = next(item_list, None)
+        if isinstance(left, groups.Sequence) and isinstance(right, groups.Sequence):
+          changed = True
+          left.items = list(left.items) + list(right.items)
+          left.mark = Range(((left.mark.start.line, left.mark.start.col), (right.mark.end.line, right.mark.end.col)))
+          # Skip the right Sequence in the next iteration, but repeat for the left Sequence
+          # so we can merge with another potential Sequence
+          right = left
+        new_items.append(left)
+        left = right
+      node.items = new_items
+
+  # A|(B|C) -> A|B|C
+  def merge_nested_choices(node: base.Node):
+    nonlocal changed
+    if isinstance(node, groups.Choice):
+      new_items: T.List[base.Node] = []
+      for item in node.items:
+        if isinstance(item, groups.Choice):
+          changed = True
+          new_items += item.items
+        else:
+          new_items.append(item)
+      node.items = new_items
+
+  # (A...)... -> A...
+  def remove_nested_repeatables(node: base.Node) -> base.Node:
+    nonlocal changed
+    if isinstance(node, (groups.Repeatable)):
+      if isinstance(node.items[0], (groups.Repeatable)):
+        changed = True
+        return node.items[0]
+    return node
+
+  # A|A -> A
+  def remove_same_choice(node: base.Node):
+    nonlocal changed
+    if isinstance(node, (groups.Choice)):
+      new_items: T.List[base.Node] = []
+      for item in node.items:
+        if not any([item == new_item for new_item in new_items]):
+          new_items.append(item)
+        else:
+          changed = True
+      node.items = new_items
+
+  new_root = root.replace(dissolve_groups)
+  if new_root is None:  # type: ignore
+    return groups.Sequence(root_mark << [])  # type: ignore
+  i = 0
+  # Run until nothing can be remove any longer
+  while changed:
+    changed = False
+    new_root = new_root.replace(remove_empty_groups)
+    if new_root is None:
+      return groups.Sequence(root_mark << [])  # type: ignore
+    new_root = new_root.replace(remove_intermediate_groups_with_one_item)
+    if new_root is None:  # type: ignore
+      return groups.Sequence(root_mark << [])  # type: ignore
+    new_root.walk(merge_nested_sequences)
+    new_root.walk(merge_nested_optionals)
+    new_root.walk(merge_neighboring_sequences)
+    new_root.walk(merge_nested_choices)
+    new_root = new_root.replace(remove_nested_repeatables)
+    if new_root is None:  # type: ignore
+      return groups.Sequence(root_mark << [])  # type: ignore
+    new_root.walk(remove_same_choice)
+    i += 1
+    if i > 100:
+      raise Exception(new_root)
+
+  return new_root
+
+
+def uncollapsed_ast(text: str) -> base.Node:
+  # The AST as post_process_ast() passes it to collapse_groups()
+  text = marks.SourceText(text)
+  options = leaves.documented_options.parse_strict(text)  # type: ignore
+  documented_options = options.copy()
+  root = usage.usage(options).parse_strict(text)  # type: ignore
+  post_processors.populate_shortcuts(root, documented_options, text)
+  return post_processors.convert_root_to_optional_on_empty_lines(root)
+
+def merged_ast(text: str) -> base.Node:
+  # The AST as the CLI passes it to collapse_groups(), identical nodes are shared
+  root = post_processors.post_process_ast(uncollapsed_ast(text), [], text)  # type: ignore
+  root = post_processors.merge_identical_leaves(root, ignore_option_args=True)
+  return post_processors.merge_identical_groups(root)
+
+def assert_same_result(root: base.Node):
+  # deepcopy preserves shared nodes
+  expected = collapse_groups_fixed_point(copy.deepcopy(root))
+  actual = post_processors.collapse_groups(copy.deepcopy(root))
+  assert (describe(actual), actual.dict) == (describe(expected), expected.dict)
+
+def assert_same_results(text: str):
+  try:
+    uncollapsed_ast(text)
+  except (DocoptError, P.ParseError):
+    return
+  logging.disable(logging.WARNING)
+  try:
+    assert_same_result(uncollapsed_ast(text))
+    assert_same_result(merged_ast(text))
+  finally:
+    logging.disable(logging.NOTSET)
+
+
+class TestCollapseGroups(unittest.TestCase):
+  @settings(max_examples=300, deadline=None)
+  @given(DocoptAstGenerator.asts)
+  def test_same_as_fixed_point(self, text: str):
+    assert_same_results(str(text))
+
+
+@PT.mark.parametrize('usage', [
+  'prog ((a)) [[b] [c]] ([]) (d | (e | f)) (g...)... [(h)]...',
+  'prog (a | a) (b | (b | b)) ((c | c) | d) [x | x] (y | y)',
+  'prog (a (b (c (d e)))) [[[f] g] h] (i | (j | (k l)))',
+  'prog [options] -a -a | -a',
+  'prog ()\n  prog [()]',
+  'prog (a b | a b) (a b | a b)\n  prog (a b | a b) c',
+  'prog (((-a... | b) | (-a | b)...))...',
+])
+def test_same_as_fixed_point(usage: str):
+  assert_same_results(f'''Usage:
+  {usage}
+
+Options:
+  -a
+''')
+
+def test_nested_sequences():
+  depth = 50
+
+  def command(ident: str):
+    return leaves.Command(((0, 0), ident, (0, 1)))
+  root: base.Node = command('b')
+  for i in range(depth):
+    root = groups.Sequence(((0, i), [command('a'), groups.Group(((0, i), [root], (0, i)))], (0, i)))
+  assert_same_result(root)
+  collapsed = T.cast(base.Group, post_processors.collapse_groups(root))
+  assert [T.cast(base.Leaf, item).ident for item in collapsed.items] == ['a'] * depth + ['b']
+
+def test_merge_identical_groups():
+  root = T.cast(base.Group, post_processors.merge_identical_groups(parse('''Usage:
+  prog (a b | [c]) x
+  prog (a b | [c]) y
+  prog (a b | [d]) [c]
+''')))
+  choices = [T.cast(base.Group, line).items[0] for line in root.items]
+  assert choices[0] is choices[1]
+  assert choices[0] is not choices[2]
+  assert T.cast(base.Group, choices[0]).items[0] is T.cast(base.Group, choices[2]).items[0]
+  assert T.cast(base.Group, choices[0]).items[1] is T.cast(base.Group, root.items[2]).items[1]
+
+def test_merge_identical_leaves(caplog: PT.LogCaptureFixture):
+  with caplog.at_level(logging.DEBUG, logger='docopt_parser'):
+    # parse() merges identical leaves while post processing
+    root = T.cast(base.Group, parse('''Usage:
+  prog -ab b --ab=X
+  prog -a b --ab=Y
+
+Options:
+  -a
+  --ab=ARG
+'''))
+  assert 'Merged 2 identical leaves into 5' in caplog.text
+  first, second = [T.cast(base.Group, line).items for line in root.items]
+  assert second[0] is first[0]
+  # Commands and options with the same ident are kept apart
+  assert isinstance(first[2], leaves.Command) and second[1] is first[2]
+  # Options with different argument names are kept apart unless ignore_option_args is set
+  assert second[2] is not first[3]
+  merged = T.cast(base.Group, post_processors.merge_identical_leaves(root, ignore_option_args=True))
+  first, second = [T.cast(base.Group, line).items for line in merged.items]
+  assert second[2] is first[3]
+
+@PT.mark.parametrize('usage, multiple', [
+  ('prog a a b', {'a'}),
+  ('prog (a | a) b', set()),
+  ('prog (a | b) a', {'a'}),
+  ('prog a... b', {'a'}),
+  ('prog -a [-a] --all', {'-a'}),
+  ('prog [a | b] c\n  prog c', set()),
+  ('prog (a | (b (c | d)))... e d', {'a', 'b', 'c', 'd'}),
+])
+def test_mark_multiple(usage: str, multiple: T.Set[str]):
+  root = parse(f'''Usage:
+  {usage}
+
+Options:
+  -a, --all
+''')
+
+  def get_multiple(memo: T.Set[str], node: base.Node):
+    if isinstance(node, base.Leaf) and node._multiple:  # type: ignore
+      memo.add(node.ident)
+    return memo
+  assert root.reduce(get_multiple, set()) == multiple
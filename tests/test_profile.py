@@ -0,0 +1,70 @@
+import typing as T
+import parsec as P
+import pytest as PT
+
+from docopt_parser import parse, DocoptError, ParserProfile
+
+spec = '''Usage:
+  prog [options] (cmd <file> | FILE)...
+
+Options:
+  -a, --all  All
+'''
+
+
+def test_counts():
+  call = P.Parser.__call__
+  with ParserProfile() as profile:
+    root = parse(spec)
+  assert P.Parser.__call__ is call
+  assert root.dict == parse(spec).dict
+  counts = profile.counts
+  assert {'usage section', 'documented option', 'argument', 'ARG', 'lookahead(<end of line>)'} <= set(counts)
+  for name, c in counts.items():
+    assert c.calls == c.successes + c.failures, name
+    assert 0 <= c.self_seconds <= c.seconds + 1e-6, name
+  assert counts['usage section'].calls == 1
+  # FILE is tried as a <file> first, the name of <file> depends on whether it was built before the profile
+  assert sum(c.calls for name, c in counts.items() if name.endswith(' ^ ARG')) >= 2
+  assert counts['ARG'].failures > 0 and counts['ARG'].backtracked > 0
+
+
+def test_table():
+  with ParserProfile() as profile:
+    parse(spec)
+  lines = profile.table(sort='calls', limit=5).splitlines()
+  assert lines[0].split() == ['parser', 'calls', 'successes', 'failures', 'backtracked', 'total', 'self']
+  calls = [int(line.split()[-6]) for line in lines[1:]]
+  assert len(calls) == 5 and calls == sorted(calls, reverse=True)
+
+
+def test_speedscope():
+  with ParserProfile() as profile:
+    parse(spec)
+  speedscope = profile.speedscope()
+  frames = [frame['name'] for frame in speedscope['shared']['frames']]
+  assert set(frames) == set(profile.counts)
+  events = speedscope['profiles'][0]['events']
+  stack: T.List[int] = []
+  at = 0.0
+  for event in events:
+    assert event['at'] >= at
+    at = event['at']
+    if event['type'] == 'O':
+      stack.append(event['frame'])
+    else:
+      assert stack.pop() == event['frame']
+  assert stack == [] and at <= speedscope['profiles'][0]['endValue']
+
+
+def test_errors():
+  call = P.Parser.__call__
+  with ParserProfile() as profile:
+    with PT.raises(DocoptError):
+      parse('Usage: prog (')
+    with PT.raises(RuntimeError):
+      with ParserProfile():
+        pass
+  assert P.Parser.__call__ is call
+  assert profile.counts['usage section'].calls == 1
+  assert len(profile.speedscope()['profiles'][0]['events']) % 2 == 0
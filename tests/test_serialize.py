@@ -0,0 +1,74 @@
+import io
+import json
+import pickle
+import typing as T
+import unittest
+import pytest as PT
+from hypothesis import given, settings
+
+from tests.lang import DocoptAst as DocoptAstGenerator
+from tests.compare import describe
+from docopt_parser import Command, DocoptError, Sequence, dump_json, dumps_json, dumps_binary, loads_binary, parse
+from docopt_parser.util.pipeline import parse_ast
+
+text = '''Usage:
+  prog -abc FILE... [--long=<x y>] (cmd | <a> ARG) -- options
+  prog [options] "quoted" ünïcode
+
+Options:
+  -x ARG     Description [default: 1]
+  -a, --all  All
+  --long=<x y>
+'''
+
+
+@PT.mark.parametrize('indent', [None, 0, 2])
+def test_dump_json(indent: T.Optional[int]):
+  for root in (parse(text), parse_ast(text)):
+    fp = io.StringIO()
+    dump_json(root, fp, indent=indent)
+    assert fp.getvalue() == json.dumps(root.dict, indent=indent)
+    assert dumps_json(root, indent=indent) == fp.getvalue()
+
+
+def assert_round_trip(text: str, positions: bool = True):
+  try:
+    root = parse(text, positions=positions)
+  except DocoptError:
+    return
+  data = dumps_binary(root)
+  loaded = loads_binary(memoryview(data))
+  assert (describe(loaded), loaded.dict) == (describe(root), root.dict)
+  assert dumps_binary(loaded) == data
+
+
+class TestBinary(unittest.TestCase):
+  @settings(max_examples=100, deadline=None)
+  @given(DocoptAstGenerator.asts)
+  def test_round_trip(self, text: str):
+    assert_round_trip(str(text))
+
+
+@PT.mark.parametrize('positions', [True, False])
+def test_binary(positions: bool):
+  assert_round_trip(text, positions)
+  root = parse_ast(text)
+  data = dumps_binary(root)
+  assert len(data) < len(pickle.dumps(root))
+  assert loads_binary(data).dict == root.dict
+
+
+def test_binary_shared_nodes():
+  # Nodes shared between several parents are stored once and stay shared
+  command = Command(((0, 7), 'a', (0, 8)))
+  root = Sequence(((0, 0), [command, command], (0, 8)))
+  loaded = T.cast(Sequence, loads_binary(dumps_binary(root)))
+  assert loaded.items[0] is loaded.items[1]
+  assert repr(loaded.items[0].mark) == repr(command.mark)
+
+
+def test_binary_errors():
+  data = dumps_binary(parse(text))
+  for corrupt in (b'', data[:-1], b'X' + data[1:], data[:6] + b'\xff' + data[7:]):
+    with PT.raises(ValueError):
+      loads_binary(corrupt)
@@ -0,0 +1,95 @@
+import asyncio
+import concurrent.futures
+import concurrent.futures.process
+import json
+import pathlib
+import typing as T
+import pytest as PT
+
+from docopt_parser import server
+from docopt_parser.server import Server, handle_request, init_worker
+
+text = '''Usage:
+  prog -a <file>
+
+Options:
+  -a  All
+  -b  Unused
+'''
+
+
+def thread_pool() -> concurrent.futures.Executor:
+  return concurrent.futures.ThreadPoolExecutor(2)
+
+
+def serve(
+  *requests: T.Any, make_pool: T.Callable[[], concurrent.futures.Executor] = thread_pool
+) -> T.List[T.Dict[str, T.Any]]:
+  lines = [(r if isinstance(r, str) else json.dumps(r)).encode() + b'\n' for r in requests]
+  responses: T.List[bytes] = []
+
+  async def readline() -> bytes:
+    return lines.pop(0) if lines else b''
+
+  async def write(data: bytes):
+    responses.append(data)
+  server = Server(2, 1, make_pool=make_pool)
+  try:
+    asyncio.run(server.handle(readline, write))
+  finally:
+    server.close()
+  return [json.loads(response) for response in responses]
+
+
+def test_handle_request():
+  response = handle_request({'text': text, 'format': 'repr'})
+  assert response['ast'] == '<Sequence>\n  -a\n  Argument: <file>'
+  assert len(response['warnings']) == 1
+  assert response['warnings'][0].endswith('-b is not referenced from the usage section')
+  assert handle_request({'text': text})['ast']['type'] == 'sequence'
+  assert handle_request({'text': 'Usage: prog ('})['exit_code'] == 1
+  assert handle_request({'text': text, 'format': 'xml'})['exit_code'] == 2
+  assert handle_request({})['exit_code'] == 2
+
+
+def test_serve():
+  responses = serve({'id': 1, 'text': text}, '', 'junk', {'id': 2, 'text': 'Usage: prog ('}, {'id': 3, 'type': 'stats'})
+  assert [r['id'] for r in responses] == [1, None, 2, 3]
+  assert responses[0]['ast']['type'] == 'sequence'
+  assert responses[1]['exit_code'] == 2 and responses[2]['exit_code'] == 1
+  stats = responses[3]['stats']
+  assert (stats['requests'], stats['errors'], stats['in_flight']) == (3, 2, 0)
+  assert 0 < stats['latency']['p50'] <= stats['latency']['max']
+
+
+def test_internal_errors():
+  # Too deeply nested for the recursive descent, the other request must still be answered
+  deep = 'Usage: prog ' + '(' * 400 + 'a' + ')' * 400
+  assert handle_request({'text': deep})['exit_code'] == 70
+  responses = serve({'id': 1, 'text': deep}, {'id': 2, 'text': text})
+  assert [r['id'] for r in responses] == [1, 2]
+  assert responses[0]['exit_code'] == 70 and 'RecursionError' in responses[0]['error']
+  assert responses[1]['ast']['type'] == 'sequence'
+
+
+class BrokenPool(concurrent.futures.ThreadPoolExecutor):
+  def submit(self, *args: T.Any, **kwargs: T.Any) -> T.Any:
+    raise concurrent.futures.process.BrokenProcessPool('A worker died')
+
+
+def test_broken_pool():
+  pools: T.List[concurrent.futures.Executor] = [BrokenPool(1), concurrent.futures.ThreadPoolExecutor(1)]
+  responses = serve({'id': 1, 'text': text}, {'id': 2, 'text': text}, make_pool=lambda: pools.pop(0))
+  assert responses[0]['exit_code'] == 70 and 'died' in responses[0]['error']
+  assert responses[1]['ast']['type'] == 'sequence'
+  assert pools == []
+
+
+def test_worker_without_cache(tmp_path: pathlib.Path, monkeypatch: PT.MonkeyPatch):
+  # init_worker() sets both for the process it runs in
+  monkeypatch.setattr(server, 'worker_cache', None)
+  monkeypatch.setattr(server.log, 'handlers', list(server.log.handlers))
+  (tmp_path / 'file').write_text('')
+  init_worker(str(tmp_path / 'file' / 'cache'), 1024)
+  assert server.worker_cache is None
+  assert handle_request({'text': text})['ast']['type'] == 'sequence'
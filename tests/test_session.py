@@ -0,0 +1,67 @@
+import typing as T
+import random
+import pytest as PT
+
+from tests.compare import parse_with, describe
+from docopt_parser import ParseSession, DocoptError
+
+text = '''Usage:
+  prog -a [--all] <file>
+  prog --undocumented -ac
+  prog -c --long=X
+
+Options:
+  -a, --all  All
+  -b ARG
+  --long=<x>
+'''
+
+def parse_session(session: ParseSession):
+  try:
+    root = session.parse()
+    return describe(root), root.dict
+  except DocoptError as e:
+    return str(e)
+
+
+@PT.mark.parametrize('engine', ['combinator', 'fast'])
+def test_reuses_unchanged_lines(engine: T.Literal['combinator', 'fast']):
+  session = ParseSession(text, engine)
+  session.parse()
+  assert (session.reused_options, session.reused_lines, session.parsed_lines) == (False, 0, 3)
+  pos = text.index('<file>')
+  session.edit((pos, pos + len('<file>')), '<files>...')
+  assert parse_session(session) == parse_with(str(session.text), engine)
+  assert (session.reused_options, session.reused_lines, session.parsed_lines) == (True, 2, 1)
+  session.edit(((2, 7), (2, 7)), '--und ')
+  assert parse_session(session) == parse_with(str(session.text), engine)
+  assert (session.reused_options, session.reused_lines, session.parsed_lines) == (True, 1, 2)
+  session.edit((len(session.text), len(session.text)), '  -c  Documented\n')
+  assert parse_session(session) == parse_with(str(session.text), engine)
+  assert (session.reused_options, session.reused_lines, session.parsed_lines) == (False, 0, 3)
+
+
+def test_errors():
+  session = ParseSession(text)
+  session.parse()
+  session.edit(((1, 7), (1, 7)), "(")
+  with PT.raises(DocoptError) as e:
+    session.parse()
+  assert str(e.value) == parse_with(str(session.text), 'combinator')
+  with PT.raises(ValueError):
+    session.edit((10, 5), '')
+
+
+@PT.mark.parametrize('engine', ['combinator', 'fast'])
+def test_random_edits(engine: T.Literal['combinator', 'fast']):
+  rnd = random.Random(1)
+  snippets = [
+    'a', '-a', '-ab', '--all', '--long=X', '--und', ' ', '|', '(', ')', '[', ']', '...', '<f>', '<f', '>', 'options',
+    '\n  prog ', '\n', '-c', 'usage:', 'options:', '\nOptions:\n  -c ARG\n', ' [default: 2]', '  -d  Doc', ''
+  ]
+  for _ in range(20):
+    session = ParseSession(text, engine)
+    for _ in range(10):
+      start = rnd.randint(0, len(session.text))
+      session.edit((start, min(len(session.text), start + rnd.choice([0, 1, 5]))), rnd.choice(snippets))
+      assert parse_session(session) == parse_with(str(session.text), engine)
@@ -0,0 +1,52 @@
+import pytest as PT
+
+from docopt_parser import parse, ParseCache, ParseStats
+
+spec = '''Usage:
+  prog [options] (cmd <file> | other)...
+  prog
+
+Options:
+  -a, --all  All
+'''
+phases = [
+  'documented_options', 'usage', 'populate_shortcuts', 'convert_root_to_optional_on_empty_lines', 'collapse_groups',
+  'mark_multiple', 'merge_identical_leaves'
+]
+
+
+@PT.mark.parametrize('engine', ['combinator', 'fast'])
+def test_phases(engine: str):
+  stats = ParseStats()
+  root = parse(spec, engine, stats=stats)  # type: ignore
+  assert root.dict == parse(spec, engine).dict  # type: ignore
+  assert (stats.engine, stats.cached) == (engine, False)
+  assert [phase.name for phase in stats.phases] == phases
+  assert all(phase.seconds >= 0 for phase in stats.phases)
+  assert stats.seconds == sum(phase.seconds for phase in stats.phases)
+  options, usage, *post_processors = stats.phases
+  assert (options.nodes_before, options.nodes_after) == (None, None)
+  assert usage.nodes_before is None
+  assert post_processors[0].nodes_before == usage.nodes_after
+  for before, after in zip(post_processors, post_processors[1:]):
+    assert after.nodes_before == before.nodes_after
+  # The empty usage line turns the root into an Optional, collapse_groups removes the nested groups
+  assert post_processors[2].nodes_after < post_processors[2].nodes_before
+
+
+def test_cached():
+  cache = ParseCache()
+  parse(spec, cache=cache)
+  stats = ParseStats()
+  parse(spec, cache=cache, stats=stats)
+  assert (stats.cached, stats.phases, stats.seconds) == (True, [], 0)
+  assert 'cached' in repr(stats)
+
+
+def test_repr():
+  stats = ParseStats()
+  parse(spec, stats=stats)
+  lines = repr(stats).splitlines()
+  assert [line.split()[0] for line in lines[1:-1]] == phases
+  assert lines[-1].startswith('total (combinator engine)')
+  assert stats.dict['phases'][1]['name'] == 'usage'
@@ -1,6 +1,7 @@
+import typing as T
 import warnings
 import pytest as PT
-from docopt_parser import parse, DocoptError
+from docopt_parser import parse, leaves, DocoptError
 import unittest
 import re
 
@@ -74,6 +75,38 @@ def test_repated_option_with_arg():
 Options:
   -f ARG
 ''')
+def test_option_prefix_of_other_option():
+  root = parse('''Usage:
+  prog --abc=F --ab -ab
+
+Options:
+  --ab
+  --abc=<file>
+  -a
+  -b
+''')
+  items = T.cast(T.List[T.Dict[str, T.Any]], root.dict['item'])
+  assert [(item['ident'], item.get('argname')) for item in items[:2]] == [('--abc', 'F'), ('--ab', None)]
+  assert [item['definition']['ident'] for item in items] == ['--abc', '--ab', '-a', '-b']
+
+def test_many_options():
+  count = 1000
+  parse('Usage: prog ' + ' '.join(f'--opt{i}' for i in range(count)) + '''
+
+Options:
+''' + '\n'.join(f'  --opt{i}' for i in range(count)))
+def test_option_registry():
+  options: leaves.OptionRegistry = leaves.documented_options.parse_strict('''Options:
+  -a, --all
+  --all-files=<f>
+''')  # type: ignore
+  assert [o.ident for o in options] == ['--all', '-a', '--all-files']
+  assert getattr(options.get_definition('-a'), 'ident') == '--all'
+  assert getattr(options.get_short_option('a'), 'ident') == '-a'
+  assert getattr(options.match('--all-files=x', 0), 'ident') == '--all-files'
+  assert getattr(options.match('--all ', 0), 'ident') == '--all'
+  assert options.match('--al', 0) is None
+  assert options.copy() is not options and list(options.copy()) == list(options)
 
 if __name__ == "__main__":
   unittest.main()